@@ -36,6 +36,24 @@ class Settings(BaseSettings):
     proxy: str = ""
     proxy_enabled: bool = False
 
+    # 上游会话池配置
+    chatgpt_session_pool_size: int = 500  # 最大会话数 (LRU 淘汰)
+    chatgpt_session_idle_ttl: int = 900  # 会话空闲超时 (秒)
+    chatgpt_members_page_size: int = 100  # 成员列表每页数量
+    chatgpt_members_page_concurrency: int = 4  # 成员列表并发拉取的页数上限
+    chatgpt_invite_coalesce_ms: int = 200  # 同一 Team 邀请合并窗口 (毫秒), 0 表示不合并
+    chatgpt_invite_batch_size: int = 10  # 单次邀请请求最多包含的邮箱数
+
+    # 异步兑换队列配置 (需在系统设置中开启异步兑换)
+    redeem_queue_workers: int = 4  # 同时执行兑换的 worker 数
+    redeem_queue_max_pending: int = 1000  # 排队任务上限, 超出时拒绝兑换
+
+    # 兑换流程耗时追踪 (为空时只在内存中汇总, 不写文件)
+    redeem_trace_file: str = ""
+
+    # 幂等请求配置
+    idempotency_ttl_hours: int = 24  # 幂等响应保存时长 (小时)
+
     # JWT 配置
     jwt_verify_signature: bool = False
 
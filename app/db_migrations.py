@@ -24,6 +24,12 @@ def column_exists(cursor, table_name, column_name):
     return column_name in columns
 
 
+def index_exists(cursor, index_name):
+    """检查是否存在指定索引"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index_name,))
+    return cursor.fetchone() is not None
+
+
 def run_auto_migration():
     """
     自动运行数据库迁移
@@ -101,6 +107,38 @@ def run_auto_migration():
             logger.info("添加 teams.account_role 字段")
             cursor.execute("ALTER TABLE teams ADD COLUMN account_role VARCHAR(50)")
             migrations_applied.append("teams.account_role")
+
+        if not column_exists(cursor, "teams", "access_token_expires_at"):
+            logger.info("添加 teams.access_token_expires_at 字段")
+            cursor.execute("ALTER TABLE teams ADD COLUMN access_token_expires_at DATETIME")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_access_token_expires_at ON teams (access_token_expires_at)"
+            )
+            migrations_applied.append("teams.access_token_expires_at")
+
+        if not column_exists(cursor, "redemption_records", "status"):
+            logger.info("添加 redemption_records.status 字段")
+            cursor.execute("ALTER TABLE redemption_records ADD COLUMN status VARCHAR(20) DEFAULT 'completed'")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_record_status_redeemed_at ON redemption_records (status, redeemed_at)"
+            )
+            migrations_applied.append("redemption_records.status")
+
+        if not column_exists(cursor, "idempotency_keys", "heartbeat_at"):
+            logger.info("添加 idempotency_keys.heartbeat_at 字段")
+            cursor.execute("ALTER TABLE idempotency_keys ADD COLUMN heartbeat_at DATETIME")
+            migrations_applied.append("idempotency_keys.heartbeat_at")
+
+        for table_name, index_name, columns in (
+            ("redemption_records", "idx_record_redeemed_at", "redeemed_at"),
+            ("redemption_records", "idx_record_team_redeemed_at", "team_id, redeemed_at"),
+            ("teams", "idx_team_created_at", "created_at"),
+            ("redemption_codes", "idx_code_created_at", "created_at"),
+        ):
+            if not index_exists(cursor, index_name):
+                logger.info(f"添加 {table_name} 索引 {index_name}")
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+                migrations_applied.append(index_name)
         
         # 提交更改
         conn.commit()
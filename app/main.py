@@ -43,15 +43,49 @@ async def lifespan(app: FastAPI):
         from app.db_migrations import run_auto_migration
         run_auto_migration()
         
-        # 3. 初始化管理员密码（如果不存在）
+        # 3. 创建管理后台搜索索引 (首次创建时从原表填充)
+        from app.services.search_index import search_index_service
+        await search_index_service.ensure()
+
+        # 4. 初始化管理员密码（如果不存在）
         async with AsyncSessionLocal() as session:
             await auth_service.initialize_admin_password(session)
         logger.info("数据库初始化完成")
     except Exception as e:
         logger.error(f"数据库初始化失败: {e}")
+
+    # 5. 启动后台同步调度器
+    from app.services.sync_scheduler import sync_scheduler
+    sync_scheduler.start()
+
+    from app.services.token_refresh_scheduler import token_refresh_scheduler
+    token_refresh_scheduler.start()
+
+    # 6. 构建席位分配索引 (并定期与数据库对账)
+    from app.services.seat_allocator import seat_allocator
+    seat_allocator.start()
+
+    # 7. 启动异步兑换队列 worker
+    from app.services.redeem_queue import redeem_job_queue
+    redeem_job_queue.start()
+
+    # 8. 启动超时兑换占位回收任务
+    from app.services.reservation_reaper import reservation_reaper
+    reservation_reaper.start()
     
     yield
     
+    # 停止后台任务
+    await sync_scheduler.stop()
+    await token_refresh_scheduler.stop()
+    await seat_allocator.stop()
+    await redeem_job_queue.stop()
+    await reservation_reaper.stop()
+
+    # 关闭上游 HTTP 会话
+    from app.services.chatgpt import chatgpt_service
+    await chatgpt_service.close()
+
     # 关闭连接
     await close_db()
     logger.info("系统正在关闭，已释放数据库连接")
@@ -81,6 +115,10 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         content={"detail": exc.detail}
     )
 
+# 配置幂等键中间件 (需在 Session 中间件内层, 以便按登录用户隔离幂等键)
+from app.services.idempotency import IdempotencyMiddleware, idempotency_service
+app.add_middleware(IdempotencyMiddleware, service=idempotency_service)
+
 # 配置 Session 中间件
 app.add_middleware(
     SessionMiddleware,
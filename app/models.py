@@ -16,6 +16,7 @@ class Team(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String(255), nullable=False, comment="Team 管理员邮箱")
     access_token_encrypted = Column(Text, nullable=False, comment="加密存储的 AT")
+    access_token_expires_at = Column(DateTime, comment="AT 过期时间 (写入 AT 时从 JWT exp 解析)")
     refresh_token_encrypted = Column(Text, comment="加密存储的 RT")
     session_token_encrypted = Column(Text, comment="加密存储的 Session Token")
     client_id = Column(String(100), comment="OAuth Client ID")
@@ -40,6 +41,8 @@ class Team(Base):
     # 索引
     __table_args__ = (
         Index("idx_status", "status"),
+        Index("idx_access_token_expires_at", "access_token_expires_at"),
+        Index("idx_team_created_at", "created_at"),
     )
 
 
@@ -85,6 +88,7 @@ class RedemptionCode(Base):
     # 索引
     __table_args__ = (
         Index("idx_code_status", "code", "status"),
+        Index("idx_code_created_at", "created_at"),
     )
 
 
@@ -99,6 +103,7 @@ class RedemptionRecord(Base):
     account_id = Column(String(100), nullable=False, comment="Account ID")
     redeemed_at = Column(DateTime, default=get_now, comment="兑换时间")
     is_warranty_redemption = Column(Boolean, default=False, comment="是否为质保兑换")
+    status = Column(String(20), default="completed", comment="状态: pending(已占位, 邀请未确认)/completed")
 
     # 关系
     team = relationship("Team", back_populates="redemption_records")
@@ -107,6 +112,9 @@ class RedemptionRecord(Base):
     # 索引
     __table_args__ = (
         Index("idx_email", "email"),
+        Index("idx_record_status_redeemed_at", "status", "redeemed_at"),
+        Index("idx_record_redeemed_at", "redeemed_at"),
+        Index("idx_record_team_redeemed_at", "team_id", "redeemed_at"),
     )
 
 
@@ -125,3 +133,23 @@ class Setting(Base):
     __table_args__ = (
         Index("idx_key", "key"),
     )
+
+
+class IdempotencyKey(Base):
+    """幂等键表 (重复请求直接返回首次请求的响应)"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(128), primary_key=True, comment="作用域 + 幂等键")
+    request_hash = Column(String(64), nullable=False, comment="请求体哈希")
+    status = Column(String(20), nullable=False, default="in_progress", comment="状态: in_progress/completed")
+    status_code = Column(Integer, comment="响应状态码")
+    content_type = Column(String(100), comment="响应类型")
+    response_body = Column(Text, comment="响应内容")
+    created_at = Column(DateTime, default=get_now, comment="创建时间")
+    heartbeat_at = Column(DateTime, comment="执行中请求的最近续期时间")
+    expires_at = Column(DateTime, nullable=False, comment="过期时间")
+
+    # 索引
+    __table_args__ = (
+        Index("idx_idempotency_expires_at", "expires_at"),
+    )
@@ -4,7 +4,7 @@
 """
 import logging
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 import json
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,6 +14,8 @@ from app.database import get_db
 from app.dependencies.auth import require_admin
 from app.services.team import TeamService
 from app.services.redemption import RedemptionService
+from app.services.export import export_service
+from app.services.stats import stats_service
 from app.utils.time_utils import get_now
 
 logger = logging.getLogger(__name__)
@@ -90,6 +92,7 @@ async def admin_dashboard(
     page: int = 1,
     per_page: int = 20,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(require_admin)
 ):
@@ -104,21 +107,17 @@ async def admin_dashboard(
         # per_page = 20 (Removed hardcoded value)
         
         # 获取 Team 列表 (分页)
-        teams_result = await team_service.get_all_teams(db, page=page, per_page=per_page, search=search)
+        teams_result = await team_service.get_all_teams(db, page=page, per_page=per_page, search=search, cursor=cursor)
         
-        # 获取统计信息 (可以使用专用统计方法优化)
-        all_teams_result = await team_service.get_all_teams(db, page=1, per_page=10000)
-        all_teams = all_teams_result.get("teams", [])
-        
-        all_codes_result = await redemption_service.get_all_codes(db, page=1, per_page=10000)
-        all_codes = all_codes_result.get("codes", [])
+        # 获取统计信息 (数据库按状态分组统计)
+        team_stats = await stats_service.get_team_stats(db)
+        code_stats = await stats_service.get_code_stats(db)
 
-        # 计算统计数据
         stats = {
-            "total_teams": len(all_teams),
-            "available_teams": len([t for t in all_teams if t.get("status") == "active" and t.get("current_members", 0) < t.get("max_members", 6)]),
-            "total_codes": len(all_codes),
-            "used_codes": len([c for c in all_codes if c.get("status") == "used"])
+            "total_teams": team_stats["total"],
+            "available_teams": team_stats["available"],
+            "total_codes": code_stats["total"],
+            "used_codes": code_stats["by_status"].get("used", 0)
         }
 
         return templates.TemplateResponse(
@@ -134,7 +133,8 @@ async def admin_dashboard(
                     "current_page": teams_result.get("current_page", page),
                     "total_pages": teams_result.get("total_pages", 1),
                     "total": teams_result.get("total", 0),
-                    "per_page": per_page
+                    "per_page": per_page,
+                    "next_cursor": teams_result.get("next_cursor")
                 }
             }
         )
@@ -148,6 +148,27 @@ async def admin_dashboard(
         )
 
 
+@router.get("/teams/export")
+async def export_teams(
+    search: Optional[str] = None,
+    fmt: str = Query("xlsx", alias="format"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    导出 Team 列表 (流式输出)
+
+    Args:
+        search: 搜索关键词
+        fmt: 导出格式 (csv/ndjson/xlsx)
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        Team 列表文件
+    """
+    logger.info(f"管理员导出 Team 列表 ({fmt})")
+    return _export_response("teams", fmt, {"search": search})
+
+
 @router.post("/teams/{team_id}/delete")
 async def delete_team(
     team_id: int,
@@ -169,6 +190,7 @@ async def delete_team(
         logger.info(f"管理员删除 Team: {team_id}")
 
         result = await team_service.delete_team(team_id, db)
+        stats_service.invalidate()
 
         if not result["success"]:
             return JSONResponse(
@@ -515,6 +537,7 @@ async def codes_list_page(
     page: int = 1,
     per_page: int = 50,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(require_admin)
 ):
@@ -526,6 +549,7 @@ async def codes_list_page(
         page: 页码
         per_page: 每页数量
         search: 搜索关键词
+        cursor: 下一页游标 (由上一页生成)
         db: 数据库会话
         current_user: 当前用户（需要登录）
 
@@ -539,23 +563,19 @@ async def codes_list_page(
 
         # 获取兑换码 (分页)
         # per_page = 50 (Removed hardcoded value)
-        codes_result = await redemption_service.get_all_codes(db, page=page, per_page=per_page, search=search)
+        codes_result = await redemption_service.get_all_codes(db, page=page, per_page=per_page, search=search, cursor=cursor)
         codes = codes_result.get("codes", [])
         total_codes = codes_result.get("total", 0)
         total_pages = codes_result.get("total_pages", 1)
         current_page = codes_result.get("current_page", 1)
 
-        # 为了统计数据，我们需要获取所有统计（或者增加统计接口）
-        # 这里暂时获取全部用于统计
-        all_codes_result = await redemption_service.get_all_codes(db, page=1, per_page=10000)
-        all_codes = all_codes_result.get("codes", [])
-
-        # 计算统计数据
+        # 获取统计信息 (数据库按状态分组统计)
+        code_stats = await stats_service.get_code_stats(db)
         stats = {
             "total": total_codes,
-            "unused": len([c for c in all_codes if c["status"] == "unused"]),
-            "used": len([c for c in all_codes if c["status"] == "used"]),
-            "expired": len([c for c in all_codes if c["status"] == "expired"])
+            "unused": code_stats["by_status"].get("unused", 0),
+            "used": code_stats["by_status"].get("used", 0),
+            "expired": code_stats["by_status"].get("expired", 0)
         }
 
         # 格式化日期时间
@@ -584,7 +604,8 @@ async def codes_list_page(
                     "current_page": current_page,
                     "total_pages": total_pages,
                     "total": total_codes,
-                    "per_page": per_page
+                    "per_page": per_page,
+                    "next_cursor": codes_result.get("next_cursor")
                 }
             }
         )
@@ -628,6 +649,7 @@ async def generate_codes(
                 has_warranty=generate_data.has_warranty,
                 warranty_days=generate_data.warranty_days
             )
+            stats_service.invalidate()
 
             if not result["success"]:
                 return JSONResponse(
@@ -648,21 +670,31 @@ async def generate_codes(
                     }
                 )
 
-            result = await redemption_service.generate_code_batch(
-                db_session=db,
-                count=generate_data.count,
-                expires_days=generate_data.expires_days,
-                has_warranty=generate_data.has_warranty,
-                warranty_days=generate_data.warranty_days
-            )
-
-            if not result["success"]:
+            if generate_data.count < 1 or generate_data.count > redemption_service.MAX_BATCH_COUNT:
                 return JSONResponse(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    content=result
+                    content={
+                        "success": False,
+                        "error": f"生成数量必须在 1-{redemption_service.MAX_BATCH_COUNT} 之间"
+                    }
                 )
 
-            return JSONResponse(content=result)
+            # 批量生成使用 StreamingResponse 分块返回进度和兑换码
+            async def progress_generator():
+                async for status_item in redemption_service.generate_code_stream(
+                    db_session=db,
+                    count=generate_data.count,
+                    expires_days=generate_data.expires_days,
+                    has_warranty=generate_data.has_warranty,
+                    warranty_days=generate_data.warranty_days
+                ):
+                    yield json.dumps(status_item, ensure_ascii=False) + "\n"
+                stats_service.invalidate()
+
+            return StreamingResponse(
+                progress_generator(),
+                media_type="application/x-ndjson"
+            )
 
         else:
             return JSONResponse(
@@ -684,6 +716,80 @@ async def generate_codes(
         )
 
 
+@router.post("/codes/import")
+async def import_codes(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format"),
+    expires_days: Optional[int] = None,
+    has_warranty: bool = False,
+    warranty_days: int = 30,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    批量导入外部生成的兑换码 (请求体为 CSV 或 NDJSON 文件内容, 流式读取)
+
+    Args:
+        request: FastAPI Request 对象
+        fmt: 内容格式 (csv/ndjson, 默认按 Content-Type 判断)
+        expires_days: 未指定过期时间的兑换码的有效期天数
+        has_warranty: 未指定质保字段时是否为质保兑换码
+        warranty_days: 未指定质保天数时的质保天数
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        导入结果 (新增、重复、无效数量)
+    """
+    if not fmt:
+        content_type = request.headers.get("content-type", "")
+        fmt = "ndjson" if "ndjson" in content_type or "json" in content_type else "csv"
+    if fmt not in ("csv", "ndjson"):
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "success": False,
+                "error": "导入格式必须为 csv 或 ndjson"
+            }
+        )
+    if not 1 <= warranty_days <= 3650:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "success": False,
+                "error": "质保天数必须在 1-3650 之间"
+            }
+        )
+    if expires_days is not None and not 1 <= expires_days <= 3650:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "success": False,
+                "error": "有效期天数必须在 1-3650 之间"
+            }
+        )
+
+    logger.info(f"管理员批量导入兑换码 ({fmt})")
+    result = await redemption_service.import_codes(
+        db_session=db,
+        chunks=request.stream(),
+        fmt=fmt,
+        expires_days=expires_days,
+        has_warranty=has_warranty,
+        warranty_days=warranty_days
+    )
+    if result["inserted"]:
+        stats_service.invalidate()
+
+    if not result["success"]:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content=result
+        )
+
+    return JSONResponse(content=result)
+
+
 @router.post("/codes/{code}/delete")
 async def delete_code(
     code: str,
@@ -705,6 +811,7 @@ async def delete_code(
         logger.info(f"管理员删除兑换码: {code}")
 
         result = await redemption_service.delete_code(code, db)
+        stats_service.invalidate()
 
         if not result["success"]:
             return JSONResponse(
@@ -725,113 +832,56 @@ async def delete_code(
         )
 
 
+def _export_response(dataset: str, fmt: str, filters: dict):
+    """
+    构建流式导出响应
+
+    Args:
+        dataset: 数据集 (codes/records/teams)
+        fmt: 导出格式 (csv/ndjson/xlsx)
+        filters: 筛选条件
+
+    Returns:
+        StreamingResponse, 格式无效时返回 400
+    """
+    if fmt not in export_service.FORMATS:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "success": False,
+                "error": "导出格式必须为 csv、ndjson 或 xlsx"
+            }
+        )
+
+    filename = export_service.filename(dataset, fmt, get_now())
+    return StreamingResponse(
+        export_service.stream(dataset, fmt, filters),
+        media_type=export_service.media_type(fmt),
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
+
 @router.get("/codes/export")
 async def export_codes(
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    fmt: str = Query("xlsx", alias="format"),
     current_user: dict = Depends(require_admin)
 ):
     """
-    导出兑换码为Excel文件
+    导出兑换码 (流式输出)
 
     Args:
         search: 搜索关键词
-        db: 数据库会话
+        fmt: 导出格式 (csv/ndjson/xlsx)
         current_user: 当前用户（需要登录）
 
     Returns:
-        兑换码Excel文件
+        兑换码文件
     """
-    try:
-        from fastapi.responses import Response
-        from datetime import datetime
-        import xlsxwriter
-        from io import BytesIO
-
-        logger.info("管理员导出兑换码为Excel")
-
-        # 获取所有兑换码 (导出不分页，传入大数量)
-        codes_result = await redemption_service.get_all_codes(db, page=1, per_page=100000, search=search)
-        all_codes = codes_result.get("codes", [])
-        
-        # 结果可能带统计信息，我们只取 codes
-
-        # 创建Excel文件到内存
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('兑换码列表')
-
-        # 定义格式
-        header_format = workbook.add_format({
-            'bold': True,
-            'fg_color': '#4F46E5',
-            'font_color': 'white',
-            'align': 'center',
-            'valign': 'vcenter',
-            'border': 1
-        })
-
-        cell_format = workbook.add_format({
-            'align': 'left',
-            'valign': 'vcenter',
-            'border': 1
-        })
-
-        # 设置列宽
-        worksheet.set_column('A:A', 25)  # 兑换码
-        worksheet.set_column('B:B', 12)  # 状态
-        worksheet.set_column('C:C', 18)  # 创建时间
-        worksheet.set_column('D:D', 18)  # 过期时间
-        worksheet.set_column('E:E', 30)  # 使用者邮箱
-        worksheet.set_column('F:F', 18)  # 使用时间
-        worksheet.set_column('G:G', 12)  # 质保时长
-
-        # 写入表头
-        headers = ['兑换码', '状态', '创建时间', '过期时间', '使用者邮箱', '使用时间', '质保时长(天)']
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-
-        # 写入数据
-        for row, code in enumerate(all_codes, start=1):
-            status_text = {
-                'unused': '未使用',
-                'used': '已使用',
-                'expired': '已过期'
-            }.get(code['status'], code['status'])
-
-            worksheet.write(row, 0, code['code'], cell_format)
-            worksheet.write(row, 1, status_text, cell_format)
-            worksheet.write(row, 2, code.get('created_at', '-'), cell_format)
-            worksheet.write(row, 3, code.get('expires_at', '永久有效'), cell_format)
-            worksheet.write(row, 4, code.get('used_by_email', '-'), cell_format)
-            worksheet.write(row, 5, code.get('used_at', '-'), cell_format)
-            worksheet.write(row, 6, code.get('warranty_days', '-') if code.get('has_warranty') else '-', cell_format)
-
-        # 关闭workbook
-        workbook.close()
-
-        # 获取Excel数据
-        excel_data = output.getvalue()
-        output.close()
-
-        # 生成文件名
-        filename = f"redemption_codes_{get_now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-
-        # 返回Excel文件
-        return Response(
-            content=excel_data,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
-
-    except Exception as e:
-        logger.error(f"导出兑换码失败: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"导出失败: {str(e)}"
-        )
+    logger.info(f"管理员导出兑换码 ({fmt})")
+    return _export_response("codes", fmt, {"search": search})
 
 
 @router.post("/codes/{code}/update")
@@ -888,6 +938,56 @@ async def bulk_update_codes(
         )
 
 
+@router.get("/records/export")
+async def export_records(
+    email: Optional[str] = None,
+    code: Optional[str] = None,
+    team_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    fmt: str = Query("xlsx", alias="format"),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    导出使用记录 (流式输出, 筛选条件与使用记录页面一致)
+
+    Args:
+        email: 邮箱筛选
+        code: 兑换码筛选
+        team_id: Team ID 筛选
+        start_date: 开始日期
+        end_date: 结束日期 (包含当天)
+        fmt: 导出格式 (csv/ndjson/xlsx)
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        使用记录文件
+    """
+    from datetime import datetime, timedelta
+
+    try:
+        actual_team_id = int(team_id) if team_id and team_id.strip() else None
+    except (ValueError, TypeError):
+        actual_team_id = None
+    try:
+        start_time = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+    except ValueError:
+        start_time = None
+    try:
+        end_time = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else None
+    except ValueError:
+        end_time = None
+
+    logger.info(f"管理员导出使用记录 ({fmt})")
+    return _export_response("records", fmt, {
+        "email": email,
+        "code": code,
+        "team_id": actual_team_id,
+        "start_time": start_time,
+        "end_time": end_time
+    })
+
+
 @router.get("/records", response_class=HTMLResponse)
 async def records_page(
     request: Request,
@@ -898,6 +998,7 @@ async def records_page(
     end_date: Optional[str] = None,
     page: Optional[str] = "1",
     per_page: int = 20,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(require_admin)
 ):
@@ -913,6 +1014,7 @@ async def records_page(
         end_date: 结束日期
         page: 页码
         per_page: 每页数量
+        cursor: 下一页游标 (由上一页生成)
         db: 数据库会话
         current_user: 当前用户（需要登录）
 
@@ -922,7 +1024,6 @@ async def records_page(
     try:
         from app.main import templates
         from datetime import datetime, timedelta
-        import math
 
         # 解析参数
         try:
@@ -937,86 +1038,39 @@ async def records_page(
             
         logger.info(f"管理员访问使用记录页面 (page={page_int}, per_page={per_page})")
 
-        # 获取记录 (支持邮箱、兑换码、Team ID 筛选)
+        # 解析日期范围 (结束日期包含当天), 格式无效时忽略
+        try:
+            start_time = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        except ValueError:
+            start_time = None
+        try:
+            end_time = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else None
+        except ValueError:
+            end_time = None
+
+        filters = {
+            "email": email,
+            "code": code,
+            "team_id": actual_team_id,
+            "start_time": start_time,
+            "end_time": end_time
+        }
+
+        # 获取记录 (筛选、分页和 Team 名称关联均在数据库中完成)
         records_result = await redemption_service.get_all_records(
-            db, 
-            email=email, 
-            code=code, 
-            team_id=actual_team_id
+            db,
+            page=page_int,
+            per_page=per_page,
+            cursor=cursor,
+            **filters
         )
-        all_records = records_result.get("records", [])
-
-        # 仅由于日期范围筛选目前还在内存中处理，如果未来记录数极大可以移至数据库
-        filtered_records = []
-        for record in all_records:
-            # 日期范围筛选
-            if start_date or end_date:
-                try:
-                    record_date = datetime.fromisoformat(record["redeemed_at"]).date()
-
-                    if start_date:
-                        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-                        if record_date < start:
-                            continue
-
-                    if end_date:
-                        end = datetime.strptime(end_date, "%Y-%m-%d").date()
-                        if record_date > end:
-                            continue
-                except:
-                    pass
-
-            filtered_records.append(record)
-
-        # 获取Team信息并关联到记录
-        teams_result = await team_service.get_all_teams(db)
-        teams = teams_result.get("teams", [])
-        team_map = {team["id"]: team for team in teams}
-
-        # 为记录添加Team名称
-        for record in filtered_records:
-            team = team_map.get(record["team_id"])
-            record["team_name"] = team["team_name"] if team else None
+        paginated_records = records_result.get("records", [])
+        page_int = records_result.get("current_page", 1)
+        total_pages = records_result.get("total_pages", 1)
+        total_records = records_result.get("total", 0)
 
         # 计算统计数据
-        now = get_now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=today_start.weekday())
-        month_start = today_start.replace(day=1)
-
-        stats = {
-            "total": len(filtered_records),
-            "today": 0,
-            "this_week": 0,
-            "this_month": 0
-        }
-
-        for record in filtered_records:
-            try:
-                record_time = datetime.fromisoformat(record["redeemed_at"])
-                if record_time >= today_start:
-                    stats["today"] += 1
-                if record_time >= week_start:
-                    stats["this_week"] += 1
-                if record_time >= month_start:
-                    stats["this_month"] += 1
-            except:
-                pass
-
-        # 分页
-        # per_page = 20 (Removed hardcoded value)
-        total_records = len(filtered_records)
-        total_pages = math.ceil(total_records / per_page) if total_records > 0 else 1
-
-        # 确保页码有效
-        if page_int < 1:
-            page_int = 1
-        if page_int > total_pages:
-            page_int = total_pages
-
-        start_idx = (page_int - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_records = filtered_records[start_idx:end_idx]
+        stats = await redemption_service.get_record_stats(db, **filters)
 
         # 格式化时间
         for record in paginated_records:
@@ -1045,7 +1099,8 @@ async def records_page(
                     "current_page": page_int,
                     "total_pages": total_pages,
                     "total": total_records,
-                    "per_page": per_page
+                    "per_page": per_page,
+                    "next_cursor": records_result.get("next_cursor")
                 }
             }
         )
@@ -1118,6 +1173,7 @@ async def settings_page(
     try:
         from app.main import templates
         from app.services.settings import settings_service
+        from app.services.team_selection import list_strategies
 
         logger.info("管理员访问系统设置页面")
 
@@ -1136,7 +1192,11 @@ async def settings_page(
                 "log_level": log_level,
                 "webhook_url": await settings_service.get_setting(db, "webhook_url", ""),
                 "low_stock_threshold": await settings_service.get_setting(db, "low_stock_threshold", "10"),
-                "api_key": await settings_service.get_setting(db, "api_key", "")
+                "api_key": await settings_service.get_setting(db, "api_key", ""),
+                "rate_limit": await settings_service.get_rate_limit_config(db),
+                "team_selection_strategy": await settings_service.get_team_selection_strategy(db),
+                "team_selection_strategies": list_strategies(),
+                "redeem_async_enabled": await settings_service.is_redeem_async_enabled(db)
             }
         )
 
@@ -1159,6 +1219,23 @@ class LogLevelRequest(BaseModel):
     level: str = Field(..., description="日志级别")
 
 
+class RateLimitSettingsRequest(BaseModel):
+    """上游请求限流设置请求"""
+    global_per_minute: int = Field(..., ge=0, description="全局每分钟请求数 (0 表示不限制)")
+    proxy_per_minute: int = Field(..., ge=0, description="每个代理出口每分钟请求数 (0 表示不限制)")
+    account_per_minute: int = Field(..., ge=0, description="每个账号每分钟请求数 (0 表示不限制)")
+
+
+class TeamSelectionSettingsRequest(BaseModel):
+    """Team 选择策略设置请求"""
+    strategy: str = Field(..., description="选择策略名称")
+
+
+class RedeemQueueSettingsRequest(BaseModel):
+    """异步兑换设置请求"""
+    async_enabled: bool = Field(..., description="是否开启异步兑换")
+
+
 class WebhookSettingsRequest(BaseModel):
     """Webhook 设置请求"""
     webhook_url: str = Field("", description="Webhook URL")
@@ -1211,6 +1288,7 @@ async def update_proxy_config(
             # 清理 ChatGPT 服务的会话,确保下次请求使用新代理
             from app.services.chatgpt import chatgpt_service
             await chatgpt_service.clear_session()
+            chatgpt_service.reload_rate_limits()
             
             return JSONResponse(content={"success": True, "message": "代理配置已保存"})
         else:
@@ -1304,3 +1382,134 @@ async def update_webhook_settings(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"success": False, "error": f"更新失败: {str(e)}"}
         )
+
+
+@router.post("/settings/rate-limit")
+async def update_rate_limit_settings(
+    rate_limit_data: RateLimitSettingsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    更新上游请求限流设置
+
+    Args:
+        rate_limit_data: 限流配置数据
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        更新结果
+    """
+    try:
+        from app.services.settings import settings_service
+        from app.services.chatgpt import chatgpt_service
+
+        logger.info(
+            f"管理员更新限流配置: global={rate_limit_data.global_per_minute}, "
+            f"proxy={rate_limit_data.proxy_per_minute}, account={rate_limit_data.account_per_minute}"
+        )
+
+        success = await settings_service.update_rate_limit_config(
+            db,
+            rate_limit_data.global_per_minute,
+            rate_limit_data.proxy_per_minute,
+            rate_limit_data.account_per_minute
+        )
+
+        if success:
+            # 立即生效
+            chatgpt_service.reload_rate_limits()
+            return JSONResponse(content={"success": True, "message": "限流配置已保存"})
+        else:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"success": False, "error": "保存失败"}
+            )
+
+    except Exception as e:
+        logger.error(f"更新限流配置失败: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"success": False, "error": f"更新失败: {str(e)}"}
+        )
+
+
+@router.post("/settings/team-selection")
+async def update_team_selection_settings(
+    selection_data: TeamSelectionSettingsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    更新自动分配 Team 的选择策略
+
+    Args:
+        selection_data: 选择策略数据
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        更新结果
+    """
+    try:
+        from app.services.settings import settings_service
+
+        logger.info(f"管理员更新 Team 选择策略: {selection_data.strategy}")
+
+        success = await settings_service.update_team_selection_strategy(db, selection_data.strategy)
+
+        if success:
+            return JSONResponse(content={"success": True, "message": "选择策略已保存"})
+        else:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"success": False, "error": "无效的选择策略"}
+            )
+
+    except Exception as e:
+        logger.error(f"更新 Team 选择策略失败: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"success": False, "error": f"更新失败: {str(e)}"}
+        )
+
+
+@router.post("/settings/redeem-queue")
+async def update_redeem_queue_settings(
+    queue_data: RedeemQueueSettingsRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    更新异步兑换设置
+
+    Args:
+        queue_data: 异步兑换设置数据
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        更新结果
+    """
+    try:
+        from app.services.settings import settings_service
+
+        logger.info(f"管理员更新异步兑换设置: enabled={queue_data.async_enabled}")
+
+        success = await settings_service.update_redeem_async_enabled(db, queue_data.async_enabled)
+
+        if success:
+            return JSONResponse(content={"success": True, "message": "异步兑换设置已保存"})
+        else:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"success": False, "error": "保存失败"}
+            )
+
+    except Exception as e:
+        logger.error(f"更新异步兑换设置失败: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"success": False, "error": f"更新失败: {str(e)}"}
+        )
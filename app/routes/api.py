@@ -3,12 +3,14 @@ API 路由
 处理 AJAX 请求的 API 端点
 """
 import logging
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.dependencies.auth import get_current_user
+from app.services.redemption import RedemptionService
 from app.services.team import TeamService
 
 logger = logging.getLogger(__name__)
@@ -21,6 +23,10 @@ router = APIRouter(
 
 # 服务实例
 team_service = TeamService()
+redemption_service = RedemptionService()
+
+# 列表接口每页数量上限
+MAX_PER_PAGE = 100
 
 
 @router.get("/teams/{team_id}/refresh")
@@ -64,3 +70,224 @@ async def refresh_team(
                 "error": f"刷新 Team 失败: {str(e)}"
             }
         )
+
+
+@router.post("/teams/sync-all")
+async def sync_all_teams(
+    concurrency: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    并发同步所有 Team 信息
+
+    Args:
+        concurrency: 并发 worker 数量 (可选, 默认读取 sync_concurrency 配置)
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        同步结果 (包含每个 Team 的同步结果)
+    """
+    try:
+        logger.info(f"批量同步所有 Team, concurrency={concurrency}")
+
+        result = await team_service.sync_all_teams(db, concurrency=concurrency)
+
+        if not result["success"]:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content=result
+            )
+
+        return JSONResponse(content=result)
+
+    except Exception as e:
+        logger.error(f"批量同步 Team 失败: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "success": False,
+                "error": f"批量同步 Team 失败: {str(e)}"
+            }
+        )
+
+
+@router.get("/upstream/stats")
+async def upstream_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    获取上游 (chatgpt.com) 客户端运行统计
+
+    Args:
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        会话池、限流、熔断、请求合并等统计信息
+    """
+    from app.services.chatgpt import chatgpt_service
+    from app.services.seat_allocator import seat_allocator
+    from app.services.redeem_queue import redeem_job_queue
+    from app.services.idempotency import idempotency_service
+    from app.services.reservation_reaper import reservation_reaper
+
+    return JSONResponse(content={
+        "success": True,
+        "session_pool": chatgpt_service.get_pool_stats(),
+        "rate_limiter": chatgpt_service.get_rate_limit_stats(),
+        "circuit_breaker": chatgpt_service.get_circuit_stats(),
+        "single_flight": chatgpt_service.get_single_flight_stats(),
+        "invite_batcher": chatgpt_service.get_invite_batch_stats(),
+        "token_cache": team_service.get_token_cache_stats(),
+        "seat_allocator": seat_allocator.stats(),
+        "redeem_queue": redeem_job_queue.stats(),
+        "idempotency": idempotency_service.stats(),
+        "reservation_reaper": reservation_reaper.stats()
+    })
+
+
+@router.get("/redeem/timings")
+async def redeem_timings(
+    reset: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    获取兑换流程各阶段耗时统计
+
+    Args:
+        reset: 返回后是否清空统计
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        各阶段的次数、平均值和 p50/p95/p99 (毫秒)
+    """
+    from app.services.redeem_flow import redeem_flow_service
+
+    phases = redeem_flow_service.timings.summary()
+    if reset:
+        redeem_flow_service.timings.reset()
+
+    return JSONResponse(content={
+        "success": True,
+        "phases": phases
+    })
+
+
+@router.get("/teams")
+async def list_teams(
+    cursor: Optional[str] = None,
+    per_page: int = 20,
+    search: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    分页获取 Team 列表 (游标分页)
+
+    Args:
+        cursor: 上一页返回的 next_cursor (为空时返回第一页)
+        per_page: 每页数量
+        search: 搜索关键词
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        结果字典,包含 success, teams, total, next_cursor, error
+    """
+    result = await team_service.get_all_teams(
+        db,
+        per_page=min(max(1, per_page), MAX_PER_PAGE),
+        search=search,
+        cursor=cursor
+    )
+    if not result["success"]:
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=result)
+    return JSONResponse(content=result)
+
+
+@router.get("/codes")
+async def list_codes(
+    cursor: Optional[str] = None,
+    per_page: int = 50,
+    search: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    分页获取兑换码列表 (游标分页)
+
+    Args:
+        cursor: 上一页返回的 next_cursor (为空时返回第一页)
+        per_page: 每页数量
+        search: 搜索关键词 (兑换码或邮箱)
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        结果字典,包含 success, codes, total, next_cursor, error
+    """
+    result = await redemption_service.get_all_codes(
+        db,
+        per_page=min(max(1, per_page), MAX_PER_PAGE),
+        search=search,
+        cursor=cursor
+    )
+    if not result["success"]:
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=result)
+    return JSONResponse(content=result)
+
+
+@router.get("/records")
+async def list_records(
+    cursor: Optional[str] = None,
+    per_page: int = 20,
+    email: Optional[str] = None,
+    code: Optional[str] = None,
+    team_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    分页获取兑换记录 (游标分页)
+
+    Args:
+        cursor: 上一页返回的 next_cursor (为空时返回第一页)
+        per_page: 每页数量
+        email: 邮箱筛选
+        code: 兑换码筛选
+        team_id: Team ID 筛选
+        start_date: 开始日期 (YYYY-MM-DD)
+        end_date: 结束日期 (YYYY-MM-DD, 包含当天)
+        db: 数据库会话
+        current_user: 当前用户（需要登录）
+
+    Returns:
+        结果字典,包含 success, records, total, next_cursor, error
+    """
+    from datetime import datetime, timedelta
+
+    try:
+        start_time = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_time = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else None
+    except ValueError:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"success": False, "error": "日期格式应为 YYYY-MM-DD"}
+        )
+
+    result = await redemption_service.get_all_records(
+        db,
+        email=email,
+        code=code,
+        team_id=team_id,
+        start_time=start_time,
+        end_time=end_time,
+        per_page=min(max(1, per_page), MAX_PER_PAGE),
+        cursor=cursor
+    )
+    if not result["success"]:
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=result)
+    return JSONResponse(content=result)
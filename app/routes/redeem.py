@@ -2,14 +2,19 @@
 兑换路由
 处理用户兑换码验证和加入 Team 的请求
 """
+import asyncio
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.services.redeem_flow import redeem_flow_service
+from app.services.redeem_queue import redeem_job_queue
+from app.services.settings import settings_service
 
 logger = logging.getLogger(__name__)
 
@@ -58,9 +63,16 @@ class RedeemResponse(BaseModel):
     success: bool
     message: Optional[str] = None
     team_info: Optional[Dict[str, Any]] = None
+    job: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
 
+# SSE 单次连接的最长时间 (秒), 超时后客户端会自动重连
+JOB_EVENTS_MAX_SECONDS = 120
+# SSE 无状态变化时的推送间隔 (秒), 用于更新排队位置和保持连接
+JOB_EVENTS_HEARTBEAT_SECONDS = 5
+
+
 @router.post("/verify", response_model=VerifyCodeResponse)
 async def verify_code(
     request: VerifyCodeRequest,
@@ -111,13 +123,16 @@ async def verify_code(
 @router.post("/confirm", response_model=RedeemResponse)
 async def confirm_redeem(
     request: RedeemRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
     """
     确认兑换并加入 Team
+    开启异步兑换时只提交兑换任务并返回 202 和任务信息, 通过 /redeem/jobs/{job_id} 查询结果
 
     Args:
         request: 兑换请求
+        response: 响应对象 (用于设置异步模式的状态码)
         db: 数据库会话
 
     Returns:
@@ -126,6 +141,20 @@ async def confirm_redeem(
     try:
         logger.info(f"兑换请求: {request.email} -> Team {request.team_id} (兑换码: {request.code})")
 
+        if redeem_job_queue.running and await settings_service.is_redeem_async_enabled(db):
+            enqueue_result = redeem_job_queue.enqueue(request.email, request.code, request.team_id)
+            if not enqueue_result["success"]:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail=enqueue_result["error"]
+                )
+            response.status_code = status.HTTP_202_ACCEPTED
+            return RedeemResponse(
+                success=True,
+                message="兑换任务已提交",
+                job=enqueue_result["job"]
+            )
+
         result = await redeem_flow_service.redeem_and_join_team(
             request.email,
             request.code,
@@ -166,3 +195,58 @@ async def confirm_redeem(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"兑换失败: {str(e)}"
         )
+
+
+@router.get("/jobs/{job_id}")
+async def get_redeem_job(job_id: str):
+    """
+    查询异步兑换任务状态
+
+    Args:
+        job_id: 任务 ID
+
+    Returns:
+        任务信息 (status 为 queued/running/succeeded/failed, 结束后 result 为兑换结果)
+    """
+    job = redeem_job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="兑换任务不存在或已过期"
+        )
+    return {"success": True, "job": redeem_job_queue.describe(job)}
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_redeem_job(job_id: str):
+    """
+    以 SSE 推送异步兑换任务进度, 任务结束后关闭连接
+
+    Args:
+        job_id: 任务 ID
+
+    Returns:
+        text/event-stream 响应
+    """
+    job = redeem_job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="兑换任务不存在或已过期"
+        )
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + JOB_EVENTS_MAX_SECONDS
+        while True:
+            version = job.version
+            yield f"data: {json.dumps(redeem_job_queue.describe(job), ensure_ascii=False)}\n\n"
+            if job.done or loop.time() >= deadline:
+                return
+            await job.wait_changed(version, JOB_EVENTS_HEARTBEAT_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -3,13 +3,23 @@ ChatGPT API 服务
 用于调用 ChatGPT 后端 API,实现 Team 成员管理功能
 """
 import asyncio
+import hashlib
 import logging
 import random
+import re
+import time
 from typing import Optional, Dict, Any, List
 from curl_cffi.requests import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
 from app.services.settings import settings_service
 from sqlalchemy.ext.asyncio import AsyncSession as DBAsyncSession
+from app.utils.batcher import KeyedBatcher
+from app.utils.circuit_breaker import CircuitBreakerRegistry
 from app.utils.jwt_parser import JWTParser
+from app.utils.rate_limiter import HierarchicalRateLimiter
+from app.utils.session_pool import SessionPool
+from app.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +33,56 @@ class ChatGPTService:
     MAX_RETRIES = 3
     RETRY_DELAYS = [1, 2, 4]  # 指数退避: 1s, 2s, 4s
 
+    # 限流配置刷新间隔 (秒)
+    RATE_LIMIT_REFRESH_SECONDS = 30
+    # 限流等待超过该秒数时记录日志
+    RATE_LIMIT_LOG_THRESHOLD = 1.0
+
+    # 熔断配置: 连续失败次数阈值及熔断时长 (秒)
+    CIRCUIT_FAILURE_THRESHOLD = 3
+    CIRCUIT_OPEN_SECONDS = 60
+    CIRCUIT_FATAL_OPEN_SECONDS = 600
+    # 命中后立即熔断的错误码 (账号封禁/Token 失效, 重试无意义)
+    CIRCUIT_FATAL_CODES = {
+        "account_deactivated",
+        "token_invalidated",
+        "account_suspended",
+        "account_not_found",
+        "user_not_found"
+    }
+    # 计入熔断的状态码 (0 表示网络异常), 其余 4xx 视为请求本身的问题
+    CIRCUIT_FAILURE_STATUS = {0, 401, 403, 429}
+
+    _ACCOUNT_ID_PATTERN = re.compile(r"/accounts/([^/?]+)")
+
     def __init__(self):
         """初始化 ChatGPT API 服务"""
         self.jwt_parser = JWTParser()
         # 会话池：按标识符（如 Email 或 TeamID）隔离，防止身份泄漏并提高 CF 稳定性
-        self._sessions: Dict[str, AsyncSession] = {}
+        # 限制最大会话数并淘汰空闲会话，防止长期运行时连接和内存泄漏
+        self._sessions = SessionPool(
+            max_size=settings.chatgpt_session_pool_size,
+            idle_ttl=settings.chatgpt_session_idle_ttl
+        )
         self.proxy: Optional[str] = None
+        # 出站请求分层限流 (全局 / 代理 / 账号)
+        self._rate_limiter = HierarchicalRateLimiter()
+        self._rate_limit_loaded_at = 0.0
+        self._rate_limit_lock = asyncio.Lock()
+        # 相同 URL + 身份的并发 GET 请求合并为一次上游请求
+        self._single_flight = SingleFlight()
+        # 按 account_id 熔断, 熔断期间直接失败, 不发起网络请求
+        self._breakers = CircuitBreakerRegistry(
+            failure_threshold=self.CIRCUIT_FAILURE_THRESHOLD,
+            open_seconds=self.CIRCUIT_OPEN_SECONDS,
+            fatal_open_seconds=self.CIRCUIT_FATAL_OPEN_SECONDS,
+            fatal_error_codes=self.CIRCUIT_FATAL_CODES
+        )
+        # 同一 Team 短时间内的多个邀请合并为一次请求 (邀请接口本身支持多个邮箱)
+        self._invite_batcher = KeyedBatcher(
+            window=settings.chatgpt_invite_coalesce_ms / 1000,
+            max_size=settings.chatgpt_invite_batch_size
+        )
 
     async def _get_proxy_config(self, db_session: DBAsyncSession) -> Optional[str]:
         """
@@ -53,14 +107,106 @@ class ChatGPTService:
         )
         return session
 
-    async def _get_session(self, db_session: DBAsyncSession, identifier: str) -> AsyncSession:
+    def _lease_session(self, db_session: DBAsyncSession, identifier: str):
+        """
+        根据标识符租用持久会话 (不存在则创建), 租用期间会话不会被淘汰
+        """
+        return self._sessions.lease(identifier, lambda: self._create_session(db_session))
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取会话池统计信息"""
+        return self._sessions.stats()
+
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """获取限流统计信息"""
+        return self._rate_limiter.stats()
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """获取请求合并统计信息"""
+        return self._single_flight.stats()
+
+    def get_invite_batch_stats(self) -> Dict[str, Any]:
+        """获取邀请合并统计信息"""
+        return self._invite_batcher.stats()
+
+    @property
+    def invite_coalescing_enabled(self) -> bool:
+        """是否启用邀请合并"""
+        return self._invite_batcher.window > 0 and self._invite_batcher.max_size > 1
+
+    def get_circuit_stats(self) -> Dict[str, Any]:
+        """获取熔断器统计信息"""
+        return self._breakers.stats()
+
+    def is_circuit_open(self, account_id: str) -> bool:
+        """判断指定账号是否处于熔断期"""
+        return self._breakers.is_open(account_id)
+
+    def get_open_circuits(self) -> List[str]:
+        """获取处于熔断期的所有 account_id"""
+        return self._breakers.open_keys()
+
+    def reset_circuit(self, account_id: str):
+        """重置指定账号的熔断器 (如 Token 已更新)"""
+        self._breakers.reset(account_id)
+
+    def _record_circuit_result(self, account_id: str, result: Dict[str, Any]):
+        """根据请求结果更新熔断器状态"""
+        if result["success"]:
+            self._breakers.record_success(account_id)
+            return
+
+        status_code = result.get("status_code", 0)
+        error_code = result.get("error_code")
+        if (
+            error_code in self.CIRCUIT_FATAL_CODES
+            or status_code in self.CIRCUIT_FAILURE_STATUS
+            or status_code >= 500
+        ):
+            self._breakers.record_failure(account_id, error_code, str(result.get("error", "")))
+        else:
+            self._breakers.record_ignored(account_id)
+
+    async def _refresh_rate_limits(self):
+        """
+        定期从系统设置加载限流配置和当前代理
+        使用独立的数据库会话, 避免与调用方的会话并发使用
         """
-        根据标识符获取或创建持久会话
+        if time.monotonic() - self._rate_limit_loaded_at < self.RATE_LIMIT_REFRESH_SECONDS:
+            return
+
+        async with self._rate_limit_lock:
+            if time.monotonic() - self._rate_limit_loaded_at < self.RATE_LIMIT_REFRESH_SECONDS:
+                return
+            try:
+                async with AsyncSessionLocal() as db_session:
+                    limits = await settings_service.get_rate_limit_config(db_session)
+                    self.proxy = await self._get_proxy_config(db_session)
+                self._rate_limiter.configure(
+                    limits["global_per_minute"],
+                    limits["proxy_per_minute"],
+                    limits["account_per_minute"]
+                )
+            except Exception as e:
+                logger.error(f"加载限流配置失败: {e}")
+            self._rate_limit_loaded_at = time.monotonic()
+
+    def reload_rate_limits(self):
+        """标记限流配置需要重新加载 (配置变更后调用)"""
+        self._rate_limit_loaded_at = 0.0
+
+    async def _wait_rate_limit(self, identifier: str) -> float:
         """
-        if identifier not in self._sessions:
-            logger.info(f"为标识符 {identifier} 创建新会话")
-            self._sessions[identifier] = await self._create_session(db_session)
-        return self._sessions[identifier]
+        等待限流令牌
+
+        Returns:
+            等待秒数
+        """
+        await self._refresh_rate_limits()
+        waited = await self._rate_limiter.acquire(identifier, self.proxy)
+        if waited >= self.RATE_LIMIT_LOG_THRESHOLD:
+            logger.info(f"[{identifier}] 限流排队等待 {waited:.2f}s")
+        return waited
 
     async def _make_request(
         self,
@@ -73,12 +219,54 @@ class ChatGPTService:
     ) -> Dict[str, Any]:
         """
         发送 HTTP 请求 (使用持久化隔离会话，提高 CF 通过率并防止污染)
+        GET 请求是幂等的, 相同 URL 和身份的并发请求共享同一次上游请求及其结果
+        """
+        if method != "GET":
+            return await self._execute_request(method, url, headers, json_data, db_session, identifier)
+
+        auth = headers.get("Authorization", "")
+        identity = hashlib.sha256(f"{auth}|{headers.get('chatgpt-account-id', '')}|{identifier}".encode()).hexdigest()
+        result = await self._single_flight.do(
+            (url, identity),
+            lambda: self._execute_request(method, url, headers, json_data, db_session, identifier)
+        )
+        # 返回浅拷贝, 避免调用方之间互相修改结果字典
+        return dict(result)
+
+    async def _execute_request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        json_data: Optional[Dict[str, Any]],
+        db_session: Optional[DBAsyncSession],
+        identifier: str
+    ) -> Dict[str, Any]:
         """
+        实际发送 HTTP 请求 (熔断检查、会话租用、限流与重试)
+        """
+        # 熔断按 account_id 计算 (Header 或 URL 中的账号 ID)
+        acc_id = headers.get("chatgpt-account-id")
+        if not acc_id:
+            match = self._ACCOUNT_ID_PATTERN.search(url)
+            if match and match.group(1) != "check":
+                acc_id = match.group(1)
+
+        if acc_id and not self._breakers.allow(acc_id):
+            logger.warning(f"账号 {acc_id} 熔断中, 跳过请求: {method} {url}")
+            return {
+                "success": False,
+                "status_code": 0,
+                "error": "该 Team 账号近期请求连续失败, 已暂时熔断, 请稍后再试",
+                "error_code": "circuit_open",
+                "circuit_open": True,
+                "rate_limit_wait": 0.0
+            }
+
         # 尝试从 Header 或 Token 自动提取标识符，确保身份绝对隔离
         if identifier == "default":
             # 优先从账号 ID 识别，这对 Team 邀请等操作最重要
-            acc_id = headers.get("chatgpt-account-id")
-            if acc_id:
+            if headers.get("chatgpt-account-id"):
                 identifier = f"acc_{acc_id}"
             # 其次从 Token 解析邮箱
             elif "Authorization" in headers:
@@ -87,8 +275,6 @@ class ChatGPTService:
                 if email:
                     identifier = email
 
-        session = await self._get_session(db_session, identifier)
-        
         # 补全基础浏览器请求头
         base_headers = {
             "Accept": "*/*",
@@ -102,6 +288,33 @@ class ChatGPTService:
             if k not in headers:
                 headers[k] = v
 
+        try:
+            async with self._lease_session(db_session, identifier) as session:
+                result = await self._send_with_retry(session, method, url, headers, json_data, identifier)
+        except BaseException:
+            # 取消等异常不代表账号异常, 释放半开状态的探测名额
+            if acc_id:
+                self._breakers.record_ignored(acc_id)
+            raise
+
+        if acc_id:
+            self._record_circuit_result(acc_id, result)
+        return result
+
+    async def _send_with_retry(
+        self,
+        session: AsyncSession,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        json_data: Optional[Dict[str, Any]],
+        identifier: str
+    ) -> Dict[str, Any]:
+        """
+        使用指定会话发送请求 (5xx 及网络异常时按退避策略重试)
+        每次实际发出请求前都需通过限流, 返回结果中的 rate_limit_wait 为累计排队秒数
+        """
+        rate_limit_wait = 0.0
         for attempt in range(self.MAX_RETRIES):
             try:
                 # 随机微小延迟，模拟真实用户行为
@@ -109,6 +322,8 @@ class ChatGPTService:
                     delay = self.RETRY_DELAYS[attempt-1] + random.uniform(0.5, 1.5)
                     await asyncio.sleep(delay)
 
+                rate_limit_wait += await self._wait_rate_limit(identifier)
+
                 logger.info(f"[{identifier}] 发送请求: {method} {url} (尝试 {attempt + 1})")
 
                 if method == "GET":
@@ -128,7 +343,7 @@ class ChatGPTService:
                         data = response.json()
                     except Exception:
                         data = {}
-                    return {"success": True, "status_code": status_code, "data": data, "error": None}
+                    return {"success": True, "status_code": status_code, "data": data, "error": None, "rate_limit_wait": rate_limit_wait}
 
                 if 400 <= status_code < 500:
                     error_msg = response.text
@@ -147,20 +362,20 @@ class ChatGPTService:
                         await self.clear_session(identifier)
                     
                     logger.warning(f"客户端错误 {status_code}: {error_msg}")
-                    return {"success": False, "status_code": status_code, "error": error_msg, "error_code": error_code}
+                    return {"success": False, "status_code": status_code, "error": error_msg, "error_code": error_code, "rate_limit_wait": rate_limit_wait}
 
                 if status_code >= 500:
                     if attempt < self.MAX_RETRIES - 1:
                         continue
-                    return {"success": False, "status_code": status_code, "error": f"服务器错误 {status_code}"}
+                    return {"success": False, "status_code": status_code, "error": f"服务器错误 {status_code}", "rate_limit_wait": rate_limit_wait}
 
             except Exception as e:
                 logger.error(f"请求异常: {e}")
                 if attempt < self.MAX_RETRIES - 1:
                     continue
-                return {"success": False, "status_code": 0, "error": str(e)}
+                return {"success": False, "status_code": 0, "error": str(e), "rate_limit_wait": rate_limit_wait}
 
-        return {"success": False, "status_code": 0, "error": "未知错误"}
+        return {"success": False, "status_code": 0, "error": "未知错误", "rate_limit_wait": rate_limit_wait}
 
     async def send_invite(
         self,
@@ -168,17 +383,103 @@ class ChatGPTService:
         account_id: str,
         email: str,
         db_session: DBAsyncSession,
-        identifier: str = "default"
+        identifier: str = "default",
+        coalesce: bool = False
     ) -> Dict[str, Any]:
-        """发送 Team 邀请"""
+        """
+        发送 Team 邀请
+        coalesce 为 True 时, 同一 Team 在合并窗口内的邀请合并为一次请求, 再按邮箱拆分结果
+        """
+        if not coalesce or not self.invite_coalescing_enabled:
+            url = f"{self.BASE_URL}/accounts/{account_id}/invites"
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {access_token}",
+                "chatgpt-account-id": account_id
+            }
+            json_data = {"email_addresses": [email], "role": "standard-user", "resend_emails": True}
+            return await self._make_request("POST", url, headers, json_data, db_session, identifier)
+
+        token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+
+        # 批次会替同一键的所有提交方执行, 使用独立的数据库会话而不是创建批次的请求的会话
+        # (access_token 由键中的哈希保证与其他提交方一致)
+        async def send_batch(emails: List[str]) -> List[Dict[str, Any]]:
+            async with AsyncSessionLocal() as batch_session:
+                results = await self.send_invites(access_token, account_id, emails, batch_session, identifier)
+            return [results[item.lower()] for item in emails]
+
+        return await self._invite_batcher.submit((account_id, token_hash, identifier), email, send_batch)
+
+    async def send_invites(
+        self,
+        access_token: str,
+        account_id: str,
+        emails: List[str],
+        db_session: DBAsyncSession,
+        identifier: str = "default"
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        一次请求邀请多个邮箱
+
+        Returns:
+            小写邮箱 -> 该邮箱的邀请结果 (格式与 send_invite 相同)
+        """
+        unique_emails = list(dict.fromkeys(email.lower() for email in emails))
         url = f"{self.BASE_URL}/accounts/{account_id}/invites"
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {access_token}",
             "chatgpt-account-id": account_id
         }
-        json_data = {"email_addresses": [email], "role": "standard-user", "resend_emails": True}
-        return await self._make_request("POST", url, headers, json_data, db_session, identifier)
+        json_data = {"email_addresses": unique_emails, "role": "standard-user", "resend_emails": True}
+        result = await self._make_request("POST", url, headers, json_data, db_session, identifier)
+        if len(unique_emails) > 1:
+            logger.info(f"合并发送邀请: {account_id} ({len(unique_emails)} 个邮箱)")
+        return self._split_invite_result(result, unique_emails)
+
+    @staticmethod
+    def _split_invite_result(result: Dict[str, Any], emails: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        将批量邀请结果拆分为每个邮箱的结果
+        请求整体失败时所有邮箱共享同一错误; 成功时 errored_emails 中的邮箱视为失败
+        """
+        if not result["success"]:
+            return {email: dict(result) for email in emails}
+
+        data = result.get("data") if isinstance(result.get("data"), dict) else {}
+
+        errors: Dict[str, str] = {}
+        for item in data.get("errored_emails") or []:
+            if isinstance(item, dict):
+                email = item.get("email") or item.get("email_address") or ""
+                message = item.get("error") or item.get("message") or item.get("detail") or "邀请失败"
+            else:
+                email, message = str(item), "邀请失败"
+            errors[email.lower()] = str(message)
+
+        invites: Dict[str, List[Any]] = {}
+        for invite in data.get("account_invites") or []:
+            if isinstance(invite, dict):
+                invites.setdefault(str(invite.get("email_address", "")).lower(), []).append(invite)
+
+        split = {}
+        for email in emails:
+            if email in errors:
+                split[email] = {
+                    "success": False,
+                    # 请求本身成功, 单个邮箱被拒绝视为客户端错误
+                    "status_code": 400,
+                    "error": errors[email],
+                    "error_code": None,
+                    "rate_limit_wait": result.get("rate_limit_wait", 0.0)
+                }
+            else:
+                split[email] = {
+                    **result,
+                    "data": {**data, "account_invites": invites.get(email, []), "errored_emails": []}
+                }
+        return split
 
     async def get_members(
         self,
@@ -187,23 +488,58 @@ class ChatGPTService:
         db_session: DBAsyncSession,
         identifier: str = "default"
     ) -> Dict[str, Any]:
-        """获取 Team 成员列表"""
-        all_members = []
-        offset = 0
-        limit = 50
-        while True:
+        """
+        获取 Team 成员列表
+        首页返回 total 后, 其余页按并发上限同时拉取, 结果按页序合并
+        """
+        limit = max(1, settings.chatgpt_members_page_size)
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        async def fetch_page(offset: int) -> Dict[str, Any]:
             url = f"{self.BASE_URL}/accounts/{account_id}/users?limit={limit}&offset={offset}"
-            headers = {"Authorization": f"Bearer {access_token}"}
-            result = await self._make_request("GET", url, headers, db_session=db_session, identifier=identifier)
-            if not result["success"]:
-                return {"success": False, "members": [], "total": 0, "error": result["error"]}
-            data = result["data"]
-            items = data.get("items", [])
-            total = data.get("total", 0)
-            all_members.extend(items)
-            if len(all_members) >= total:
-                break
-            offset += limit
+            # 每页使用独立的请求头副本, 避免并发请求共用同一个字典
+            return await self._make_request("GET", url, dict(headers), db_session=db_session, identifier=identifier)
+
+        def failed(result: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                "success": False, "members": [], "total": 0, "error": result["error"],
+                "error_code": result.get("error_code"), "circuit_open": result.get("circuit_open", False)
+            }
+
+        result = await fetch_page(0)
+        if not result["success"]:
+            return failed(result)
+        data = result["data"]
+        pages = [data.get("items", [])]
+        total = data.get("total", 0)
+
+        # 上游可能将每页数量限制在 limit 以下, 以首页实际返回的数量作为步长
+        page_size = min(limit, len(pages[0]))
+        offsets = list(range(page_size, total, page_size)) if page_size else []
+        if offsets:
+            semaphore = asyncio.Semaphore(max(1, settings.chatgpt_members_page_concurrency))
+
+            async def fetch_limited(offset: int) -> Dict[str, Any]:
+                async with semaphore:
+                    return await fetch_page(offset)
+
+            results = await asyncio.gather(*(fetch_limited(offset) for offset in offsets))
+            for page_result in results:
+                if not page_result["success"]:
+                    return failed(page_result)
+                pages.append(page_result["data"].get("items", []))
+
+        # 分页期间成员可能发生变动, 按 id 去重
+        all_members = []
+        seen_ids = set()
+        for items in pages:
+            for member in items:
+                member_id = member.get("id")
+                if member_id is not None:
+                    if member_id in seen_ids:
+                        continue
+                    seen_ids.add(member_id)
+                all_members.append(member)
         return {"success": True, "members": all_members, "total": len(all_members), "error": None}
 
     async def get_invites(
@@ -221,7 +557,10 @@ class ChatGPTService:
         }
         result = await self._make_request("GET", url, headers, db_session=db_session, identifier=identifier)
         if not result["success"]:
-            return {"success": False, "items": [], "total": 0, "error": result["error"]}
+            return {
+                "success": False, "items": [], "total": 0, "error": result["error"],
+                "error_code": result.get("error_code"), "circuit_open": result.get("circuit_open", False)
+            }
         data = result["data"]
         items = data.get("items", [])
         return {"success": True, "items": items, "total": len(items), "error": None}
@@ -313,13 +652,14 @@ class ChatGPTService:
         if identifier == "default":
             identifier = f"st_{session_token[:8]}"
 
-        session = await self._get_session(db_session, identifier)
         try:
             # 手动合并基础头
             headers["Referer"] = "https://chatgpt.com/"
             headers["Connection"] = "keep-alive"
             
-            response = await session.get(url, headers=headers)
+            await self._wait_rate_limit(identifier)
+            async with self._lease_session(db_session, identifier) as session:
+                response = await session.get(url, headers=headers)
             if response.status_code == 200:
                 data = response.json()
                 at = data.get("accessToken")
@@ -363,23 +703,16 @@ class ChatGPTService:
             }
         return result
 
-    async def clear_session(self, identifier: str):
-        """清理指定身份的会话"""
-        if identifier in self._sessions:
-            try:
-                await self._sessions[identifier].close()
-            except:
-                pass
-            del self._sessions[identifier]
+    async def clear_session(self, identifier: Optional[str] = None):
+        """清理指定身份的会话 (未指定时清理全部会话)"""
+        if identifier is None:
+            await self._sessions.clear()
+        else:
+            await self._sessions.remove(identifier)
 
     async def close(self):
         """关闭所有会话"""
-        for session in self._sessions.values():
-            try:
-                await session.close()
-            except:
-                pass
-        self._sessions.clear()
+        await self._sessions.clear()
 
 
 # 创建全局实例
@@ -0,0 +1,355 @@
+"""
+数据导出服务
+按 (时间, id) 游标分块读取兑换码、使用记录和 Team, 逐块写出 CSV / NDJSON,
+或在工作线程中以 xlsxwriter constant_memory 模式写入临时文件后分块返回, 内存占用不随导出行数增长
+"""
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Callable, AsyncGenerator
+
+from sqlalchemy import select, or_, cast, String
+
+from app.database import AsyncSessionLocal
+from app.models import Team, RedemptionCode, RedemptionRecord
+from app.services.redemption import redemption_service
+from app.services.search_index import search_index_service
+from app.utils.pagination import keyset_condition
+
+logger = logging.getLogger(__name__)
+
+
+CODE_STATUS_TEXT = {
+    "unused": "未使用",
+    "used": "已使用",
+    "expired": "已过期",
+    "warranty_active": "质保中"
+}
+
+RECORD_STATUS_TEXT = {
+    "completed": "已完成",
+    "pending": "邀请处理中"
+}
+
+
+def _format_time(value: Optional[datetime], default: str = "-") -> str:
+    return value.strftime("%Y-%m-%d %H:%M") if value else default
+
+
+class ExportColumn:
+    """导出列定义"""
+
+    def __init__(self, key: str, title: str, width: int, value: Callable[[Any], Any]):
+        """
+        Args:
+            key: NDJSON 字段名
+            title: CSV / Excel 表头
+            width: Excel 列宽
+            value: 从查询行取值的函数
+        """
+        self.key = key
+        self.title = title
+        self.width = width
+        self.value = value
+
+
+class _JoinedRow:
+    """关联查询的行: 优先读取附加列 (如 team_name), 其余属性从实体读取"""
+
+    __slots__ = ("_entity", "_extra")
+
+    def __init__(self, entity, mapping):
+        self._entity = entity
+        self._extra = mapping
+
+    def __getattr__(self, name):
+        if name in self._extra:
+            return self._extra[name]
+        return getattr(self._entity, name)
+
+
+class ExportService:
+    """流式数据导出服务"""
+
+    # 每次从数据库读取的行数
+    CHUNK_SIZE = 2000
+    # XLSX 单个工作表的最大行数 (含表头)
+    XLSX_MAX_ROWS = 1048576
+    # 读取 Excel 临时文件时每块的字节数
+    FILE_CHUNK_BYTES = 256 * 1024
+    # 支持的导出格式 -> (Content-Type, 文件扩展名)
+    FORMATS = {
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "ndjson": ("application/x-ndjson", "ndjson"),
+        "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx")
+    }
+    # 数据集 -> (Excel 工作表名, 文件名前缀)
+    DATASETS = {
+        "codes": ("兑换码列表", "redemption_codes"),
+        "records": ("使用记录", "redemption_records"),
+        "teams": ("Team 列表", "teams")
+    }
+
+    CODE_COLUMNS = [
+        ExportColumn("code", "兑换码", 25, lambda row: row.code),
+        ExportColumn("status", "状态", 12, lambda row: CODE_STATUS_TEXT.get(row.status, row.status)),
+        ExportColumn("created_at", "创建时间", 18, lambda row: _format_time(row.created_at)),
+        ExportColumn("expires_at", "过期时间", 18, lambda row: _format_time(row.expires_at, "永久有效")),
+        ExportColumn("used_by_email", "使用者邮箱", 30, lambda row: row.used_by_email or "-"),
+        ExportColumn("used_at", "使用时间", 18, lambda row: _format_time(row.used_at)),
+        ExportColumn("warranty_days", "质保时长(天)", 12, lambda row: row.warranty_days if row.has_warranty else "-")
+    ]
+
+    RECORD_COLUMNS = [
+        ExportColumn("id", "ID", 10, lambda row: row.id),
+        ExportColumn("email", "邮箱", 30, lambda row: row.email),
+        ExportColumn("code", "兑换码", 25, lambda row: row.code),
+        ExportColumn("team_id", "Team ID", 10, lambda row: row.team_id),
+        ExportColumn("team_name", "Team 名称", 20, lambda row: row.team_name or "-"),
+        ExportColumn("account_id", "Account ID", 38, lambda row: row.account_id),
+        ExportColumn("status", "状态", 12, lambda row: RECORD_STATUS_TEXT.get(row.status, row.status)),
+        ExportColumn("is_warranty_redemption", "质保兑换", 10, lambda row: "是" if row.is_warranty_redemption else "否"),
+        ExportColumn("redeemed_at", "兑换时间", 18, lambda row: _format_time(row.redeemed_at))
+    ]
+
+    TEAM_COLUMNS = [
+        ExportColumn("id", "ID", 8, lambda row: row.id),
+        ExportColumn("email", "邮箱", 30, lambda row: row.email),
+        ExportColumn("account_id", "Account ID", 38, lambda row: row.account_id),
+        ExportColumn("team_name", "Team 名称", 20, lambda row: row.team_name or "-"),
+        ExportColumn("status", "状态", 10, lambda row: row.status),
+        ExportColumn("current_members", "当前成员", 10, lambda row: row.current_members),
+        ExportColumn("max_members", "最大成员", 10, lambda row: row.max_members),
+        ExportColumn("subscription_plan", "订阅计划", 16, lambda row: row.subscription_plan or "-"),
+        ExportColumn("expires_at", "到期时间", 18, lambda row: _format_time(row.expires_at)),
+        ExportColumn("created_at", "创建时间", 18, lambda row: _format_time(row.created_at))
+    ]
+
+    def _dataset_query(self, dataset: str, filters: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+        """
+        构建数据集查询
+
+        Returns:
+            (查询语句, 排序时间列, ID 列)
+        """
+        if dataset == "codes":
+            stmt = select(RedemptionCode)
+            search = filters.get("search")
+            if search:
+                condition = search_index_service.match("codes", RedemptionCode.id, search)
+                if condition is None:
+                    condition = or_(
+                        RedemptionCode.code.ilike(f"%{search}%"),
+                        RedemptionCode.used_by_email.ilike(f"%{search}%")
+                    )
+                stmt = stmt.where(condition)
+            return stmt, RedemptionCode.created_at, RedemptionCode.id
+
+        if dataset == "records":
+            stmt = (
+                select(RedemptionRecord, Team.team_name)
+                .outerjoin(Team, Team.id == RedemptionRecord.team_id)
+            )
+            conditions = redemption_service._record_filters(
+                filters.get("email"),
+                filters.get("code"),
+                filters.get("team_id"),
+                filters.get("start_time"),
+                filters.get("end_time")
+            )
+            if conditions:
+                stmt = stmt.where(*conditions)
+            return stmt, RedemptionRecord.redeemed_at, RedemptionRecord.id
+
+        if dataset == "teams":
+            stmt = select(Team)
+            search = filters.get("search")
+            if search:
+                condition = search_index_service.match("teams", Team.id, search)
+                if condition is None:
+                    search_filter = f"%{search}%"
+                    condition = or_(
+                        Team.email.ilike(search_filter),
+                        Team.account_id.ilike(search_filter),
+                        Team.team_name.ilike(search_filter),
+                        cast(Team.id, String).ilike(search_filter)
+                    )
+                stmt = stmt.where(condition)
+            return stmt, Team.created_at, Team.id
+
+        raise ValueError(f"不支持的导出数据: {dataset}")
+
+    async def iter_rows(self, dataset: str, filters: Dict[str, Any]) -> AsyncGenerator[List[List[Any]], None]:
+        """
+        按游标分块读取数据集
+
+        Args:
+            dataset: 数据集 (codes/records/teams)
+            filters: 筛选条件
+
+        Yields:
+            每块的行列表 (每行为按导出列取出的值)
+        """
+        stmt, sort_column, id_column = self._dataset_query(dataset, filters)
+        columns = self._columns(dataset)
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc()).limit(self.CHUNK_SIZE)
+
+        position = None
+        while True:
+            # 每块使用新的会话, 避免长时间占用连接和累积已加载的对象
+            async with AsyncSessionLocal() as db_session:
+                chunk_stmt = stmt if position is None else stmt.where(keyset_condition(sort_column, id_column, position))
+                result = await db_session.execute(chunk_stmt)
+                rows = result.all()
+
+            if not rows:
+                return
+
+            chunk = []
+            for row in rows:
+                # ORM 实体行直接取实体, 关联查询的行附加额外列
+                item = row[0]
+                if len(row) > 1:
+                    item = _JoinedRow(item, row._mapping)
+                chunk.append([column.value(item) for column in columns])
+            yield chunk
+
+            last = rows[-1][0]
+            position = (getattr(last, sort_column.key), getattr(last, id_column.key))
+            if len(rows) < self.CHUNK_SIZE:
+                return
+
+    async def _stream_csv(self, dataset: str, filters: Dict[str, Any]) -> AsyncGenerator[bytes, None]:
+        columns = self._columns(dataset)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # 带 BOM, Excel 打开中文表头不会乱码
+        buffer.write("\ufeff")
+        writer.writerow([column.title for column in columns])
+        async for chunk in self.iter_rows(dataset, filters):
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    async def _stream_ndjson(self, dataset: str, filters: Dict[str, Any]) -> AsyncGenerator[bytes, None]:
+        keys = [column.key for column in self._columns(dataset)]
+        async for chunk in self.iter_rows(dataset, filters):
+            yield "".join(
+                json.dumps(dict(zip(keys, values)), ensure_ascii=False, default=str) + "\n"
+                for values in chunk
+            ).encode("utf-8")
+
+    async def _stream_xlsx(self, dataset: str, filters: Dict[str, Any]) -> AsyncGenerator[bytes, None]:
+        import xlsxwriter
+
+        columns = self._columns(dataset)
+        sheet_name = self.DATASETS[dataset][0]
+
+        with tempfile.TemporaryDirectory(prefix="export_") as tmpdir:
+            path = os.path.join(tmpdir, "export.xlsx")
+
+            def open_workbook():
+                # constant_memory 模式逐行落盘, 只保留当前行在内存中
+                workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tmpdir})
+                header_format = workbook.add_format({
+                    'bold': True,
+                    'fg_color': '#4F46E5',
+                    'font_color': 'white',
+                    'align': 'center',
+                    'valign': 'vcenter',
+                    'border': 1
+                })
+                cell_format = workbook.add_format({
+                    'align': 'left',
+                    'valign': 'vcenter',
+                    'border': 1
+                })
+                return workbook, header_format, cell_format
+
+            workbook, header_format, cell_format = await asyncio.to_thread(open_workbook)
+            # 当前工作表及下一行行号; 超过单个工作表的行数上限时换到新工作表 (重复表头)
+            state = {"sheets": 0, "worksheet": None, "row": self.XLSX_MAX_ROWS}
+
+            def add_worksheet():
+                state["sheets"] += 1
+                name = sheet_name if state["sheets"] == 1 else f"{sheet_name} ({state['sheets']})"
+                worksheet = workbook.add_worksheet(name)
+                for index, column in enumerate(columns):
+                    worksheet.set_column(index, index, column.width)
+                worksheet.write_row(0, 0, [column.title for column in columns], header_format)
+                state["worksheet"] = worksheet
+                state["row"] = 1
+
+            def write_chunk(chunk: List[List[Any]]):
+                for values in chunk:
+                    if state["row"] >= self.XLSX_MAX_ROWS:
+                        add_worksheet()
+                    state["worksheet"].write_row(state["row"], 0, values, cell_format)
+                    state["row"] += 1
+
+            try:
+                async for chunk in self.iter_rows(dataset, filters):
+                    await asyncio.to_thread(write_chunk, chunk)
+                if state["worksheet"] is None:
+                    # 没有数据时仍输出只有表头的工作表
+                    await asyncio.to_thread(add_worksheet)
+            finally:
+                await asyncio.to_thread(workbook.close)
+
+            with open(path, "rb") as f:
+                while True:
+                    data = await asyncio.to_thread(f.read, self.FILE_CHUNK_BYTES)
+                    if not data:
+                        break
+                    yield data
+
+    def _columns(self, dataset: str) -> List[ExportColumn]:
+        return {
+            "codes": self.CODE_COLUMNS,
+            "records": self.RECORD_COLUMNS,
+            "teams": self.TEAM_COLUMNS
+        }[dataset]
+
+    def stream(self, dataset: str, fmt: str, filters: Optional[Dict[str, Any]] = None) -> AsyncGenerator[bytes, None]:
+        """
+        流式导出数据集
+
+        Args:
+            dataset: 数据集 (codes/records/teams)
+            fmt: 导出格式 (csv/ndjson/xlsx)
+            filters: 筛选条件 (codes/teams: search; records: email, code, team_id, start_time, end_time)
+
+        Returns:
+            文件内容的字节块异步生成器
+        """
+        if dataset not in self.DATASETS:
+            raise ValueError(f"不支持的导出数据: {dataset}")
+        streams = {
+            "csv": self._stream_csv,
+            "ndjson": self._stream_ndjson,
+            "xlsx": self._stream_xlsx
+        }
+        if fmt not in streams:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        logger.info(f"开始导出 {dataset} ({fmt})")
+        return streams[fmt](dataset, filters or {})
+
+    def media_type(self, fmt: str) -> str:
+        """获取导出格式对应的 Content-Type"""
+        return self.FORMATS[fmt][0]
+
+    def filename(self, dataset: str, fmt: str, now: datetime) -> str:
+        """生成导出文件名"""
+        return f"{self.DATASETS[dataset][1]}_{now.strftime('%Y%m%d_%H%M%S')}.{self.FORMATS[fmt][1]}"
+
+
+# 创建全局实例
+export_service = ExportService()
@@ -0,0 +1,364 @@
+"""
+幂等请求服务
+带 Idempotency-Key 的写请求只执行一次: 执行中的重复请求等待首次请求的结果,
+执行完成后的重复请求直接返回保存的响应 (持久化到 idempotency_keys 表, 按 TTL 过期)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import IdempotencyKey
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+# (状态码, Content-Type, 响应内容)
+StoredResponse = Tuple[int, str, bytes]
+
+
+def _json_response(status_code: int, detail: str) -> StoredResponse:
+    return status_code, "application/json", json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+
+
+class IdempotencyService:
+    """幂等键存储与请求去重"""
+
+    # 执行中的请求定期续期; 持久化的执行中记录超过超时时间未续期时视为已中断 (如进程重启), 允许重新执行
+    HEARTBEAT_SECONDS = 30
+    IN_PROGRESS_TIMEOUT_SECONDS = 120
+    # 清理过期记录的间隔 (秒)
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(self, ttl_hours: int = 24):
+        """
+        初始化幂等请求服务
+
+        Args:
+            ttl_hours: 响应保存时长 (小时)
+        """
+        self.ttl = timedelta(hours=max(1, ttl_hours))
+        # 本进程内执行中的请求: key -> (请求哈希, 结果 Future)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._last_purge = 0.0
+        self.executed = 0
+        self.attached = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    async def _purge_expired(self, db_session):
+        """定期清理过期记录"""
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+        result = await db_session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= get_now()))
+        await db_session.commit()
+        if result.rowcount:
+            logger.info(f"已清理 {result.rowcount} 条过期幂等记录")
+
+    async def _claim(self, key: str, request_hash: str, ttl: timedelta) -> Optional[StoredResponse]:
+        """
+        登记执行中的请求
+
+        Returns:
+            已有可返回的响应时返回该响应, 否则返回 None 表示由当前请求执行
+        """
+        async with AsyncSessionLocal() as db_session:
+            await self._purge_expired(db_session)
+
+            now = get_now()
+            record = await db_session.get(IdempotencyKey, key)
+            if record and record.expires_at <= now:
+                await db_session.delete(record)
+                await db_session.flush()
+                record = None
+
+            if record:
+                if record.request_hash != request_hash:
+                    self.conflicts += 1
+                    return _json_response(422, "Idempotency-Key 已用于内容不同的请求")
+                if record.status == "completed":
+                    self.replayed += 1
+                    return record.status_code, record.content_type or "application/json", (record.response_body or "").encode("utf-8")
+                lease_at = record.heartbeat_at or record.created_at
+                if lease_at and lease_at > now - timedelta(seconds=self.IN_PROGRESS_TIMEOUT_SECONDS):
+                    self.conflicts += 1
+                    return _json_response(409, "相同的请求正在处理中，请稍后再试")
+                # 执行中记录已超时未续期 (原请求已中断), 由当前请求接管
+                record.created_at = now
+                record.heartbeat_at = now
+                record.expires_at = now + ttl
+            else:
+                db_session.add(IdempotencyKey(
+                    key=key,
+                    request_hash=request_hash,
+                    status="in_progress",
+                    created_at=now,
+                    heartbeat_at=now,
+                    expires_at=now + ttl
+                ))
+
+            try:
+                await db_session.commit()
+            except IntegrityError:
+                # 其他进程刚刚登记了相同的键
+                await db_session.rollback()
+                self.conflicts += 1
+                return _json_response(409, "相同的请求正在处理中，请稍后再试")
+        return None
+
+    async def _heartbeat(self, key: str):
+        """请求执行期间定期续期执行中记录, 长时间运行的请求 (如批量生成) 不会被重复请求接管"""
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db_session:
+                    await db_session.execute(
+                        update(IdempotencyKey).where(
+                            IdempotencyKey.key == key,
+                            IdempotencyKey.status == "in_progress"
+                        ).values(heartbeat_at=get_now())
+                    )
+                    await db_session.commit()
+            except Exception as e:
+                logger.warning(f"幂等记录续期失败: {e}")
+
+    async def _complete(self, key: str, response: Optional[StoredResponse], store: bool):
+        """保存响应 (不保存时删除记录, 允许之后重新执行)"""
+        async with AsyncSessionLocal() as db_session:
+            record = await db_session.get(IdempotencyKey, key)
+            if not record:
+                return
+            if store and response is not None:
+                status_code, content_type, body = response
+                record.status = "completed"
+                record.status_code = status_code
+                record.content_type = content_type
+                record.response_body = body.decode("utf-8", errors="replace")
+            else:
+                await db_session.delete(record)
+            await db_session.commit()
+
+    async def run(
+        self,
+        key: str,
+        request_hash: str,
+        fn: Callable[[], Awaitable[StoredResponse]],
+        store_errors: bool = True,
+        ttl: Optional[timedelta] = None
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        按幂等键执行请求
+
+        Args:
+            key: 幂等键 (已包含作用域)
+            request_hash: 请求内容哈希, 相同键但内容不同的请求会被拒绝
+            fn: 实际执行请求的函数
+            store_errors: 是否保存 4xx 响应 (否则只保存成功响应, 失败后允许重试)
+            ttl: 响应保存时长 (默认使用全局配置)
+
+        Returns:
+            (响应, 是否为重复请求)
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            inflight_hash, future = inflight
+            if inflight_hash != request_hash:
+                self.conflicts += 1
+                return _json_response(422, "Idempotency-Key 已用于内容不同的请求"), True
+            self.attached += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request_hash, future)
+        try:
+            stored = await self._claim(key, request_hash, ttl or self.ttl)
+            if stored is not None:
+                future.set_result(stored)
+                return stored, True
+
+            self.executed += 1
+            response: Optional[StoredResponse] = None
+            heartbeat = asyncio.create_task(self._heartbeat(key))
+            try:
+                response = await fn()
+            finally:
+                heartbeat.cancel()
+                status_code = response[0] if response else 500
+                store = status_code < 400 or (store_errors and status_code < 500)
+                try:
+                    await self._complete(key, response, store)
+                except Exception as e:
+                    logger.error(f"保存幂等响应失败: {e}")
+                if not future.done():
+                    future.set_result(response or _json_response(500, "请求处理失败，请重试"))
+            return response, False
+        finally:
+            if not future.done():
+                future.set_result(_json_response(500, "请求处理失败，请重试"))
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取幂等请求统计信息"""
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "attached": self.attached,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts
+        }
+
+
+class IdempotencyMiddleware:
+    """
+    对写请求启用幂等键的 ASGI 中间件
+    管理接口需显式携带 Idempotency-Key; 兑换接口未携带时按 (邮箱, 兑换码) 生成, 且只保存成功响应
+    流式响应直接转发给客户端, 不缓存也不保存响应内容, 重复请求只返回已执行的提示
+    """
+
+    HEADER = b"idempotency-key"
+    # 需显式携带幂等键的路径前缀
+    PREFIXES = ("/admin/", "/api/")
+    # 未携带时按请求内容生成幂等键的路径 -> 参与生成的字段
+    DERIVED_PATHS = {"/redeem/confirm": ("email", "code")}
+    # 生成的幂等键只用于合并重复点击和超时重试, 保存时间较短 (质保码之后仍可用同一邮箱重新兑换)
+    DERIVED_TTL = timedelta(minutes=5)
+    # 请求体流式读取的路径, 不经过幂等处理 (兑换码导入使用 INSERT OR IGNORE, 重复提交本身不会重复写入)
+    STREAMED_REQUEST_PATHS = ("/admin/codes/import",)
+    # 流式响应的类型
+    STREAMED_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+    def __init__(self, app, service: "IdempotencyService"):
+        self.app = app
+        self.service = service
+
+    @staticmethod
+    def _identity(scope) -> str:
+        """请求方身份 (管理接口按登录用户或 API Key 隔离幂等键)"""
+        user = (scope.get("session") or {}).get("user")
+        if user:
+            return f"user:{user.get('username')}"
+        for name, value in scope.get("headers", []):
+            if name == b"x-api-key":
+                return "key:" + hashlib.sha256(value).hexdigest()[:16]
+        return "anonymous"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        derived_fields = self.DERIVED_PATHS.get(path)
+        if path in self.STREAMED_REQUEST_PATHS or (derived_fields is None and not path.startswith(self.PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        header_key = None
+        for name, value in scope.get("headers", []):
+            if name == self.HEADER:
+                header_key = value.decode("latin-1").strip()[:100]
+                break
+        if not header_key and derived_fields is None:
+            await self.app(scope, receive, send)
+            return
+
+        # 读取完整请求体 (之后重放给下游应用)
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if body_sent:
+                # 请求体已读完, 之后只可能收到断开连接消息
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        request_hash = hashlib.sha256(body).hexdigest()
+        if header_key:
+            key = f"{self._identity(scope)}:{path}:{header_key}"
+            store_errors = True
+            ttl = None
+        else:
+            try:
+                payload = json.loads(body or b"{}")
+                parts = [str(payload.get(field, "")).strip().lower() for field in derived_fields]
+            except Exception:
+                parts = []
+            if not parts or not all(parts):
+                await self.app(scope, replay_receive, send)
+                return
+            request_hash = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+            key = f"derived:{path}:{request_hash}"
+            store_errors = False
+            ttl = self.DERIVED_TTL
+
+        # 首次执行时原样返回下游响应头, 重复请求只返回保存的 Content-Type
+        original_headers = []
+        streamed = False
+
+        async def execute() -> StoredResponse:
+            nonlocal streamed
+            captured = {"status": 500, "content_type": "application/json", "body": b""}
+
+            async def capture_send(message):
+                nonlocal streamed
+                if message["type"] == "http.response.start":
+                    captured["status"] = message["status"]
+                    original_headers.extend(message.get("headers", []))
+                    for name, value in message.get("headers", []):
+                        if name == b"content-type":
+                            captured["content_type"] = value.decode("latin-1")
+                    if captured["content_type"].split(";")[0].strip() in self.STREAMED_MEDIA_TYPES:
+                        streamed = True
+                        await send(message)
+                elif message["type"] == "http.response.body":
+                    if streamed:
+                        await send(message)
+                    else:
+                        captured["body"] += message.get("body", b"")
+
+            await self.app(scope, replay_receive, capture_send)
+            if streamed:
+                if captured["status"] >= 400:
+                    return _json_response(captured["status"], "请求处理失败，请重试")
+                return _json_response(409, "该请求已执行完成 (流式响应不保存)，请勿重复提交")
+            return captured["status"], captured["content_type"], captured["body"]
+
+        (status_code, content_type, response_body), duplicated = await self.service.run(
+            key, request_hash, execute, store_errors, ttl
+        )
+        if streamed and not duplicated:
+            # 响应已在执行过程中直接发送
+            return
+        if duplicated:
+            headers = [
+                (b"content-type", content_type.encode("latin-1")),
+                (b"content-length", str(len(response_body)).encode("latin-1")),
+                (b"idempotent-replayed", b"true")
+            ]
+        else:
+            headers = original_headers
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response_body})
+
+
+# 创建全局实例
+idempotency_service = IdempotencyService(ttl_hours=settings.idempotency_ttl_hours)
@@ -3,11 +3,14 @@
 协调用户兑换流程，包括验证、Team选择、邀请发送、事务处理和并发控制
 """
 import logging
-from typing import Optional, Dict, Any
+import uuid
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List, Callable, AsyncContextManager
 from datetime import datetime, timedelta
-from sqlalchemy import select, and_
+from sqlalchemy import select, update, delete, and_, case
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models import Team, RedemptionCode, RedemptionRecord
 from app.services.redemption import RedemptionService
 from app.services.warranty import WarrantyService
@@ -15,7 +18,11 @@ from app.services.team import TeamService
 from app.services.chatgpt import ChatGPTService
 from app.services.encryption import encryption_service
 from app.services.notification import notification_service
+from app.services.seat_allocator import seat_allocator
+from app.services.settings import settings_service
+from app.services.team_selection import get_strategy
 from app.utils.time_utils import get_now
+from app.utils.timing import TimingRegistry, RequestTrace
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +30,9 @@ logger = logging.getLogger(__name__)
 class RedeemFlowService:
     """兑换流程服务类"""
 
+    # 自动选择 Team 时, 席位被并发抢占后最多尝试的候选 Team 数
+    MAX_SEAT_CLAIM_CANDIDATES = 5
+
     def __init__(self):
         """初始化兑换流程服务"""
         from app.services.chatgpt import chatgpt_service
@@ -30,6 +40,8 @@ class RedeemFlowService:
         self.warranty_service = WarrantyService()
         self.team_service = TeamService()
         self.chatgpt_service = chatgpt_service
+        # 兑换流程各阶段耗时
+        self.timings = TimingRegistry()
 
     async def verify_code_and_get_teams(
         self,
@@ -105,47 +117,38 @@ class RedeemFlowService:
     async def select_team_auto(
         self,
         db_session: AsyncSession,
-        email: Optional[str] = None
+        email: Optional[str] = None,
+        exclude_team_ids: Optional[List[int]] = None
     ) -> Dict[str, Any]:
         """
-        自动选择 Team (选择过期时间最早的)
+        自动选择 Team (按系统设置的选择策略, 默认选择过期时间最早的)
         如果提供了 email，则自动排除该用户已经加入过的 Team
+        基于内存席位索引选择, 通常无需查询数据库
 
         Args:
             db_session: 数据库会话
             email: 用户邮箱 (用于排除已加入的 Team)
+            exclude_team_ids: 额外排除的 Team ID (如席位刚被抢占的 Team)
 
         Returns:
             结果字典,包含 success, team_id, error
         """
         try:
-            # 1. 查找用户已经加入过的 Team ID
-            exclude_team_ids = []
-            if email:
-                stmt = select(RedemptionRecord.team_id).where(RedemptionRecord.email == email)
-                result = await db_session.execute(stmt)
-                exclude_team_ids = result.scalars().all()
-                if exclude_team_ids:
-                    logger.info(f"自动选择 Team: 排除用户 {email} 已加入的 Team IDs: {exclude_team_ids}")
-
-            # 2. 查询可用 Team，按过期时间升序排序
-            stmt = select(Team).where(
-                Team.status == "active",
-                Team.current_members < Team.max_members
+            strategy_name = await settings_service.get_team_selection_strategy(db_session)
+
+            # 从内存席位索引中选择 (已排除用户加入过的 Team 和处于熔断期的 Team)
+            pick_result = await seat_allocator.pick(
+                db_session,
+                email=email,
+                exclude_team_ids=exclude_team_ids,
+                exclude_account_ids=self.chatgpt_service.get_open_circuits(),
+                strategy=get_strategy(strategy_name)
             )
-            
-            # 排除已加入的 Team
-            if exclude_team_ids:
-                stmt = stmt.where(Team.id.not_in(exclude_team_ids))
-            
-            stmt = stmt.order_by(Team.expires_at.asc()).limit(1)
-
-            result = await db_session.execute(stmt)
-            team = result.scalar_one_or_none()
+            team_id = pick_result["team_id"]
 
-            if not team:
+            if not team_id:
                 reason = "没有可用的 Team"
-                if exclude_team_ids:
+                if pick_result["excluded_by_email"]:
                     reason = "您已加入所有可用 Team"
                 return {
                     "success": False,
@@ -153,11 +156,11 @@ class RedeemFlowService:
                     "error": reason
                 }
 
-            logger.info(f"自动选择 Team: {team.id} (过期时间: {team.expires_at})")
+            logger.info(f"自动选择 Team: {team_id}")
 
             return {
                 "success": True,
-                "team_id": team.id,
+                "team_id": team_id,
                 "error": None
             }
 
@@ -169,17 +172,145 @@ class RedeemFlowService:
                 "error": f"自动选择 Team 失败: {str(e)}"
             }
 
+    async def _claim_seat(
+        self,
+        db_session: AsyncSession,
+        email: str,
+        team_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        原子占用一个 Team 席位 (仅在 Team 为 active 且仍有空位时成功, 占满时同时标记为 full)
+        未指定 Team 时自动选择, 候选 Team 的席位被并发抢占则换下一个
+        调用方负责提交或回滚事务
+
+        Args:
+            db_session: 数据库会话
+            email: 用户邮箱
+            team_id: 指定的 Team ID (None 表示自动选择)
+
+        Returns:
+            结果字典,包含 success, team_id, error
+        """
+        claimed_elsewhere = []
+        for _ in range(self.MAX_SEAT_CLAIM_CANDIDATES):
+            if team_id is None:
+                select_result = await self.select_team_auto(
+                    db_session, email=email, exclude_team_ids=claimed_elsewhere
+                )
+                if not select_result["success"]:
+                    return select_result
+                candidate_id = select_result["team_id"]
+            else:
+                error = await self._check_team_available(db_session, team_id)
+                if error:
+                    return {"success": False, "team_id": None, "error": error}
+                candidate_id = team_id
+
+            # 结束读事务, 使条件 UPDATE 从新的写事务开始
+            if db_session.in_transaction():
+                await db_session.commit()
+
+            seat_claim = await db_session.execute(
+                update(Team).where(
+                    Team.id == candidate_id,
+                    Team.status == "active",
+                    Team.current_members < Team.max_members
+                ).values(
+                    current_members=Team.current_members + 1,
+                    status=case(
+                        (Team.current_members + 1 >= Team.max_members, "full"),
+                        else_=Team.status
+                    )
+                ).execution_options(synchronize_session=False)
+            )
+            if seat_claim.rowcount == 1:
+                # 立即更新索引, 减少并发请求选中同一个已满 Team (事务回滚时由调用方标记刷新)
+                seat_allocator.on_claimed(candidate_id, email)
+                return {"success": True, "team_id": candidate_id, "error": None}
+
+            await db_session.rollback()
+            # 索引与数据库不一致 (或席位被并发抢占), 下次选择前重新加载该 Team
+            seat_allocator.invalidate(candidate_id)
+            if team_id is not None:
+                error = await self._check_team_available(db_session, team_id)
+                return {"success": False, "team_id": None, "error": error or "Team 已满，请选择其他 Team"}
+
+            logger.warning(f"选择的 Team {candidate_id} 席位已被抢占, 尝试下一个 Team")
+            claimed_elsewhere.append(candidate_id)
+
+        return {"success": False, "team_id": None, "error": "当前兑换人数较多，请稍后重试"}
+
+    async def _check_team_available(self, db_session: AsyncSession, team_id: int) -> Optional[str]:
+        """
+        检查指定 Team 是否可加入
+
+        Returns:
+            不可加入的原因, 可加入时返回 None
+        """
+        result = await db_session.execute(
+            select(Team.status, Team.current_members, Team.max_members, Team.account_id).where(Team.id == team_id)
+        )
+        row = result.one_or_none()
+        if not row:
+            return f"Team {team_id} 不存在"
+        team_status, current_members, max_members, account_id = row
+        if current_members >= max_members:
+            return "Team 已满，请选择其他 Team"
+        if team_status != "active":
+            return f"Team 状态异常: {team_status}"
+        if self.chatgpt_service.is_circuit_open(account_id):
+            return "该 Team 暂时不可用，请稍后再试或选择其他 Team"
+        return None
+
     async def redeem_and_join_team(
         self,
         email: str,
         code: str,
         team_id: Optional[int],
-        db_session: AsyncSession
+        db_session: AsyncSession,
+        progress: Optional[Callable[[str], None]] = None,
+        team_lock: Optional[Callable[[int], AsyncContextManager]] = None,
+        request_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         完整的兑换流程 (带事务和并发控制)
         优化版本: 将网络请求移出写事务,避免 SQLite 锁定
+        各阶段耗时计入 self.timings, 配置 REDEEM_TRACE_FILE 时按请求写入追踪文件
+
+        Args:
+            email: 用户邮箱
+            code: 兑换码
+            team_id: Team ID (可选，不提供则自动选择)
+            db_session: 数据库会话
+            progress: 进度回调, 参数为当前阶段 (异步兑换队列用于上报进度)
+            team_lock: 按 Team 获取锁的函数, 撤回原邀请和发送邀请 (未开启合并时) 时持有 (异步兑换队列用于按 Team 串行)
+            request_id: 请求 ID (用于关联日志和追踪记录, 默认随机生成)
         """
+        trace = RequestTrace(self.timings, request_id or uuid.uuid4().hex[:12], settings.redeem_trace_file or None)
+        result = None
+        outcome = "error"
+        try:
+            result = await self._redeem_attempts(email, code, team_id, db_session, progress, team_lock, trace)
+            outcome = "success" if result and result.get("success") else "failed"
+            return result
+        finally:
+            trace.finish(outcome, attempts=trace.attempts, error=(result or {}).get("error"))
+
+    async def _redeem_attempts(
+        self,
+        email: str,
+        code: str,
+        team_id: Optional[int],
+        db_session: AsyncSession,
+        progress: Optional[Callable[[str], None]],
+        team_lock: Optional[Callable[[int], AsyncContextManager]],
+        trace: RequestTrace
+    ) -> Dict[str, Any]:
+        """兑换流程主体 (失败时最多更换 Team 重试 3 次)"""
+        def report(stage: str):
+            if progress:
+                progress(stage)
+
         max_retries = 3
         current_target_team_id = team_id
         last_error = "未知错误"
@@ -194,14 +325,18 @@ class RedeemFlowService:
             # 确保每次尝试都从数据库读取最新数据, 避免 identity map 缓存了上一次尝试修改后的状态
             db_session.expire_all()
             
-            logger.info(f"正在尝试兑换 (第 {attempt + 1}/{max_retries} 次尝试): email={email}, code={code}")
+            trace.attempts = attempt + 1
+            logger.info(f"[{trace.request_id}] 正在尝试兑换 (第 {attempt + 1}/{max_retries} 次尝试): email={email}, code={code}")
             team_id_final = None
+            claimed_team_id = None
             revoke_team_id = None
             try:
                 # --- 阶段 1: 验证并占位 ---
                 
                 # 1. 基础验证（不带锁）
+                report("validating")
                 validate_result = await self.redemption_service.validate_code(code, db_session)
+                trace.lap("phase1.validate_code")
                 if not validate_result["success"]:
                     return {"success": False, "error": validate_result["error"]}
                 if not validate_result["valid"]:
@@ -212,6 +347,7 @@ class RedeemFlowService:
                 stmt = select(RedemptionCode).where(RedemptionCode.code == code)
                 res = await db_session.execute(stmt)
                 temp_code_obj = res.scalar_one_or_none()
+                trace.lap("phase1.load_code")
                 
                 if not temp_code_obj:
                     return {"success": False, "error": "兑换码记录丢失"}
@@ -223,112 +359,99 @@ class RedeemFlowService:
                     warranty_check = await self.warranty_service.validate_warranty_reuse(
                         db_session, code, email
                     )
+                    trace.lap("phase1.warranty_check")
                     if not warranty_check["success"] or not warranty_check["can_reuse"]:
                         return {"success": False, "error": warranty_check.get("reason", "兑换码质保验证未通过")}
                     revoke_team_id = warranty_check.get("revoke_team_id")
                 elif not is_warranty_code and not is_first_use:
                     return {"success": False, "error": "兑换码已被占用"}
 
-                # 3. 进入核心占位事务（短事务，带锁）
-                async with db_session.begin_nested(): # 使用子事务，更安全
-                    # 重新验证并锁定 (带锁锁定，防止并发)
-                    stmt = select(RedemptionCode).where(RedemptionCode.code == code).with_for_update()
-                    result = await db_session.execute(stmt)
-                    redemption_code = result.scalar_one_or_none()
-                    
-                    if not redemption_code:
-                        return {"success": False, "error": "兑换码记录丢失"}
+                # 3. 原子占位
+                # SQLite 会忽略 SELECT ... FOR UPDATE, 因此通过条件 UPDATE 的影响行数判断是否抢占成功
+                observed_status = temp_code_obj.status
+                observed_used_at = temp_code_obj.used_at
+                warranty_days = temp_code_obj.warranty_days or 30
 
-                    # 检查状态是否依然有效 (可能在循环间隙被别人捷足先登)
-                    allowed_statuses = ["unused", "warranty_active"]
-                    if redemption_code.has_warranty:
-                        allowed_statuses.append("used")
+                # 检查状态是否依然有效 (可能在循环间隙被别人捷足先登)
+                allowed_statuses = ["unused", "warranty_active"]
+                if is_warranty_code:
+                    allowed_statuses.append("used")
+                if observed_status not in allowed_statuses:
+                    return {"success": False, "error": "兑换码已被使用"}
 
-                    if redemption_code.status not in allowed_statuses:
-                        return {"success": False, "error": "兑换码已被使用"}
+                # 结束读事务, 让占位写入从新事务开始 (WAL 模式下读快照过期的事务无法升级为写事务)
+                await db_session.rollback()
+                trace.lap("phase1.end_read_txn")
 
-                    # 2. 选择 Team
-                    if current_target_team_id is None:
-                        select_result = await self.select_team_auto(db_session, email=email)
-                        if not select_result["success"]:
-                            return {"success": False, "error": select_result["error"]}
-                        team_id_final = select_result["team_id"]
-                    else:
-                        team_id_final = current_target_team_id
-
-                    # 3. 锁定并检查 Team
-                    stmt = select(Team).where(Team.id == team_id_final).with_for_update()
-                    result = await db_session.execute(stmt)
-                    team = result.scalar_one_or_none()
-
-                    if not team:
-                        if current_target_team_id is None and attempt < max_retries - 1:
-                            logger.warning(f"选择的 Team {team_id_final} 消失了, 尝试下一次循环")
-                            raise Exception("retry_loop") # 触发 retry 逻辑
-                        return {"success": False, "error": f"Team {team_id_final} 不存在"}
-                    
-                    if team.current_members >= team.max_members:
-                        if current_target_team_id is None and attempt < max_retries - 1:
-                            logger.warning(f"选择的 Team {team_id_final} 已满, 尝试下一次循环")
-                            raise Exception("retry_loop")
-                        return {"success": False, "error": "Team 已满，请选择其他 Team"}
-                    
-                    if team.status != "active":
-                        if current_target_team_id is None and attempt < max_retries - 1:
-                            logger.warning(f"选择的 Team {team_id_final} 状态异常 ({team.status}), 尝试下一次循环")
-                            raise Exception("retry_loop")
-                        return {"success": False, "error": f"Team 状态异常: {team.status}"}
-
-                    # 获取最终参数
-                    final_is_warranty = is_warranty_code
-
-                    # 4. 更新状态执行占位
-                    if is_warranty_code:
-                        redemption_code.status = "warranty_active"
-                        if is_first_use:
-                            warranty_days = redemption_code.warranty_days or 30
-                            redemption_code.warranty_expires_at = get_now() + timedelta(days=warranty_days)
-                    else:
-                        redemption_code.status = "used"
-                    
-                    redemption_code.used_by_email = email
-                    redemption_code.used_team_id = team_id_final
-                    redemption_code.used_at = get_now()
-
-                    # 增加 Team 成员数占位
-                    team.current_members += 1
-                    if team.current_members >= team.max_members:
-                        team.status = "full"
-                    
-                    # 记录信息供 Phase 2 使用
-                    final_team_account_id = team.account_id
-                    final_team_name = team.team_name
-                    final_team_expires_at = team.expires_at
-                    final_access_token_encrypted = team.access_token_encrypted
-                    final_is_warranty = is_warranty_code
-                    
-                    # 5. 创建兑换记录 (移入 Phase 1 事务，防止并发首兑竞态漏洞)
-                    redemption_record = RedemptionRecord(
-                        email=email,
-                        code=code,
-                        team_id=team_id_final,
-                        account_id=final_team_account_id,
-                        is_warranty_redemption=final_is_warranty
-                    )
-                    db_session.add(redemption_record)
-                    await db_session.flush()
-                    current_record_id = redemption_record.id
+                # 3.1 占用 Team 席位 (未指定 Team 时自动选择, 席位被抢占则换下一个)
+                report("claiming")
+                seat_result = await self._claim_seat(db_session, email, current_target_team_id)
+                trace.lap("phase1.claim_seat")
+                if not seat_result["success"]:
+                    await db_session.rollback()
+                    return {"success": False, "error": seat_result["error"]}
+                claimed_team_id = seat_result["team_id"]
+
+                # 3.2 占用兑换码 (以读取时的状态和使用时间作为版本条件, 防止同一兑换码被并发兑换)
+                now = get_now()
+                code_values = {
+                    "status": "warranty_active" if is_warranty_code else "used",
+                    "used_by_email": email,
+                    "used_team_id": claimed_team_id,
+                    "used_at": now
+                }
+                if is_warranty_code and is_first_use:
+                    code_values["warranty_expires_at"] = now + timedelta(days=warranty_days)
+
+                code_conditions = [
+                    RedemptionCode.code == code,
+                    RedemptionCode.status == observed_status,
+                    RedemptionCode.used_at == observed_used_at if observed_used_at else RedemptionCode.used_at.is_(None)
+                ]
+                code_claim = await db_session.execute(
+                    update(RedemptionCode).where(*code_conditions).values(**code_values)
+                    .execution_options(synchronize_session=False)
+                )
+                if code_claim.rowcount != 1:
+                    # 回滚同一事务中的席位占用
+                    await db_session.rollback()
+                    seat_allocator.invalidate(claimed_team_id)
+                    return {"success": False, "error": "兑换码已被使用"}
+
+                # 记录信息供 Phase 2 使用
+                res = await db_session.execute(
+                    select(Team.account_id, Team.team_name, Team.expires_at).where(Team.id == claimed_team_id)
+                )
+                final_team_account_id, final_team_name, final_team_expires_at = res.one()
+
+                # 3.3 创建兑换记录 (与占位在同一事务中提交，防止并发首兑竞态漏洞)
+                redemption_record = RedemptionRecord(
+                    email=email,
+                    code=code,
+                    team_id=claimed_team_id,
+                    account_id=final_team_account_id,
+                    is_warranty_redemption=is_warranty_code,
+                    # 邀请发送成功前为占位状态, 进程中断时由占位回收任务处理
+                    status="pending"
+                )
+                db_session.add(redemption_record)
+                await db_session.flush()
 
                 # 提交 Phase 1 的修改
                 await db_session.commit()
+                trace.lap("phase1.claim_code_commit")
+                team_id_final = claimed_team_id
+                current_record_id = redemption_record.id
                 # --- 阶段 2: 网络请求 ---
                 # 获取该 Team 的最新数据以确保 Token 也是最新的 (可能被其他进程同步过)
-                stmt = select(Team).where(Team.id == team_id_final)
+                stmt = select(Team).where(Team.id == team_id_final).execution_options(populate_existing=True)
                 res = await db_session.execute(stmt)
                 target_team = res.scalar_one_or_none()
+                trace.lap("phase2.load_team")
                 
                 if not target_team:
-                    await self._rollback_redemption(db_session, code, team_id_final)
+                    await self._rollback_redemption(db_session, code, team_id_final, current_record_id)
+                    current_record_id = None
                     if attempt < max_retries - 1:
                         current_target_team_id = None
                         continue
@@ -338,10 +461,13 @@ class RedeemFlowService:
                 target_team_email = target_team.email
 
                 # 确保 Access Token 有效 (过期则尝试使用 RT/ST 刷新)
+                report("token")
                 access_token = await self.team_service.ensure_access_token(target_team, db_session)
+                trace.lap("phase2.ensure_token")
                 if not access_token:
                     logger.warning(f"无法获取有效的 Access Token (Team {team_id_final})")
-                    await self._rollback_redemption(db_session, code, team_id_final)
+                    await self._rollback_redemption(db_session, code, team_id_final, current_record_id)
+                    current_record_id = None
                     if attempt < max_retries - 1:
                         current_target_team_id = None
                         continue
@@ -356,18 +482,26 @@ class RedeemFlowService:
                 if revoke_team_id:
                     logger.info(f"自助质保: 正在撤销原 Team {revoke_team_id} 中的待加入邀请")
                     # 调用 team_service 撤回邀请，它会处理 Token 刷新并更新数据库计数
-                    revoke_res = await self.team_service.revoke_team_invite(revoke_team_id, email, db_session)
+                    # 撤回不参与邀请合并, 始终持有原 Team 的锁, 与该 Team 的其他上游写操作串行
+                    async with (team_lock(revoke_team_id) if team_lock else nullcontext()):
+                        revoke_res = await self.team_service.revoke_team_invite(revoke_team_id, email, db_session)
+                    trace.lap("phase2.revoke_invite")
                     if not revoke_res["success"]:
                         logger.warning(f"自助质保: 撤销原邀请失败 (可能已失效): {revoke_res.get('error')}")
                         # 除非是账号封禁等严重错误，否则继续执行（可能邀请本身已经在 ChatGPT 端被清理了）
                         if any(kw in str(revoke_res.get("error", "")).lower() for kw in ["token", "auth", "deactivated", "banned"]):
-                            await self._rollback_redemption(db_session, code, team_id_final)
+                            await self._rollback_redemption(db_session, code, team_id_final, current_record_id)
                             return {"success": False, "error": f"撤回原邀请失败 (账号异常): {revoke_res.get('error')}"}
 
-                invite_result = await self.chatgpt_service.send_invite(
-                    access_token, final_team_account_id, email, db_session,
-                    identifier=target_team_email
-                )
+                report("inviting")
+                # 开启邀请合并时同一 Team 的邀请已按批串行发送, 仅此处的 send_invite 无需再持有 Team 锁
+                hold_team_lock = team_lock and not self.chatgpt_service.invite_coalescing_enabled
+                async with (team_lock(team_id_final) if hold_team_lock else nullcontext()):
+                    invite_result = await self.chatgpt_service.send_invite(
+                        access_token, final_team_account_id, email, db_session,
+                        identifier=target_team_email, coalesce=True
+                    )
+                trace.lap("phase2.send_invite")
                 
                 # 网络请求后重置事务状态，确保进入 Phase 3 时 session 是干净的
                 if db_session.in_transaction():
@@ -375,8 +509,19 @@ class RedeemFlowService:
 
                 # --- 阶段 3: 最终化 ---
                 if invite_result["success"]:
-                    # 由于记录已在 Phase 1 写入，此处只需处理后续逻辑
+                    # 由于记录已在 Phase 1 写入，此处只需将占位标记为已完成
                     # 我们已经在上面通过 rollback 确保了 session 状态
+                    # (邀请已发出, 标记失败时不回退, 由占位回收任务按上游邀请列表确认)
+                    try:
+                        await db_session.execute(
+                            update(RedemptionRecord).where(RedemptionRecord.id == current_record_id)
+                            .values(status="completed").execution_options(synchronize_session=False)
+                        )
+                        await db_session.commit()
+                    except Exception as e:
+                        await db_session.rollback()
+                        logger.warning(f"标记兑换记录完成失败 (record_id={current_record_id}): {e}")
+                    trace.lap("phase3.finalize")
                     logger.info(f"兑换成功: {email} 加入 Team {team_id_final}")
 
                     # 检查库存并发送通知 (异步不阻塞)
@@ -402,7 +547,7 @@ class RedeemFlowService:
                     error_msg = invite_result.get("error", "未知错误")
                     
                     # 重新查询 Team 以获取最新状态（尤其是错误计数和状态）
-                    stmt = select(Team).where(Team.id == team_id_final)
+                    stmt = select(Team).where(Team.id == team_id_final).execution_options(populate_existing=True)
                     res = await db_session.execute(stmt)
                     target_team = res.scalar_one_or_none()
                     
@@ -411,7 +556,9 @@ class RedeemFlowService:
                         await self.team_service._handle_api_error(invite_result, target_team, db_session)
                         
                         # 根据最新状态调整给用户的错误信息
-                        if target_team.status == "banned":
+                        if invite_result.get("circuit_open"):
+                            error_msg = "Team 账号暂时不可用"
+                        elif target_team.status == "banned":
                             error_msg = "Team 账号被封禁"
                         elif target_team.status == "full":
                             error_msg = "Team 席位已满"
@@ -419,6 +566,7 @@ class RedeemFlowService:
                             error_msg = "Team 账号连续出错，已标记异常"
                     
                     last_error = error_msg
+                    trace.lap("phase3.rollback")
                     
                     # 只要还有重试机会，就尝试更换 Team (符合用户要求：报错就尝试下一个)
                     if attempt < max_retries - 1:
@@ -430,6 +578,9 @@ class RedeemFlowService:
 
             except Exception as e:
                 logger.error(f"兑换尝试异常 (第 {attempt + 1} 次): {e}")
+                if claimed_team_id and not team_id_final:
+                    # 占位事务未提交, 席位索引需按数据库重新加载
+                    seat_allocator.invalidate(claimed_team_id)
                 if team_id_final:
                     try:
                         await self._rollback_redemption(db_session, code, team_id_final, current_record_id)
@@ -445,9 +596,15 @@ class RedeemFlowService:
         db_session: AsyncSession,
         code: str,
         team_id: int,
-        record_id: Optional[int] = None
+        record_id: Optional[int] = None,
+        restore_seat: bool = True
     ):
-        """回退兑换占位"""
+        """
+        回退兑换占位
+
+        Args:
+            restore_seat: 是否回退 Team 席位计数 (调用方按上游成员数重新计算时传 False)
+        """
         try:
             # 彻底确保会话处于干净状态
             if db_session.in_transaction():
@@ -461,7 +618,7 @@ class RedeemFlowService:
                     await db_session.execute(stmt)
 
                 # 1. 回退兑换码状态
-                stmt = select(RedemptionCode).where(RedemptionCode.code == code).with_for_update()
+                stmt = select(RedemptionCode).where(RedemptionCode.code == code)
                 result = await db_session.execute(stmt)
                 redemption_code = result.scalar_one_or_none()
                 if redemption_code:
@@ -494,15 +651,21 @@ class RedeemFlowService:
                         redemption_code.used_team_id = None
                         redemption_code.used_at = None
 
-                # 回退 Team 计数
-                stmt = select(Team).where(Team.id == team_id).with_for_update()
-                result = await db_session.execute(stmt)
-                team = result.scalar_one_or_none()
-                if team:
-                    if team.current_members > 0:
-                        team.current_members -= 1
-                    if team.status == "full" and team.current_members < team.max_members:
-                        team.status = "active"
+                # 回退 Team 计数 (原子更新, 避免与并发占位互相覆盖)
+                if restore_seat:
+                    await db_session.execute(
+                        update(Team).where(
+                            Team.id == team_id,
+                            Team.current_members > 0
+                        ).values(
+                            current_members=Team.current_members - 1,
+                            status=case(
+                                (and_(Team.status == "full", Team.current_members - 1 < Team.max_members), "active"),
+                                else_=Team.status
+                            )
+                        ).execution_options(synchronize_session=False)
+                    )
+            seat_allocator.invalidate(team_id)
             logger.info(f"已回退兑换占位: code={code}, team_id={team_id}")
         except Exception as e:
             logger.error(f"回退兑换占位失败: {e}")
@@ -0,0 +1,287 @@
+"""
+异步兑换队列服务
+开启后 /redeem/confirm 只负责入队并返回任务 ID, 由固定数量的后台 worker 执行兑换流程,
+客户端通过轮询或 SSE 获取进度, 避免上游请求较慢时长时间占用 HTTP 连接
+"""
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.services.redeem_flow import redeem_flow_service
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+
+class RedeemJob:
+    """兑换任务"""
+
+    def __init__(self, email: str, code: str, team_id: Optional[int]):
+        self.id = uuid.uuid4().hex
+        self.email = email
+        self.code = code
+        self.team_id = team_id
+        # queued / running / succeeded / failed
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = get_now()
+        self.updated_at = self.created_at
+        self.finished_monotonic: Optional[float] = None
+        self.version = 0
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def touch(self):
+        """标记任务状态已变化并唤醒等待者"""
+        self.updated_at = get_now()
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_changed(self, version: int, timeout: float) -> bool:
+        """
+        等待任务状态变化
+
+        Args:
+            version: 调用方已看到的版本号
+            timeout: 最长等待时间 (秒)
+
+        Returns:
+            超时前是否有新状态
+        """
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.version != version
+
+    def to_dict(self, position: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "position": position,
+            "result": self.result,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat()
+        }
+
+
+class RedeemJobQueue:
+    """有界 worker 池执行的兑换任务队列"""
+
+    # 已结束任务的保留时间 (秒), 供客户端查询结果
+    JOB_TTL_SECONDS = 600
+
+    def __init__(self, workers: int = 4, max_pending: int = 1000):
+        """
+        初始化兑换任务队列
+
+        Args:
+            workers: 并发执行的 worker 数
+            max_pending: 等待中的任务上限, 超出时拒绝入队
+        """
+        self.worker_count = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, RedeemJob] = {}
+        # 兑换码 -> 未结束的任务 ID (同一兑换码重复提交时返回已有任务)
+        self._active_codes: Dict[str, str] = {}
+        self._pending: List[str] = []
+        # 按 Team 串行发送邀请
+        self._team_locks: Dict[int, asyncio.Lock] = {}
+        self._team_waiters: Dict[int, int] = {}
+        self.enqueued = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """启动 worker"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker_loop(i)) for i in range(self.worker_count)]
+        logger.info(f"异步兑换队列已启动 (worker: {self.worker_count})")
+
+    async def stop(self):
+        """停止 worker (未执行的任务标记为失败)"""
+        if not self._workers:
+            return
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job_id in list(self._pending):
+            job = self._jobs.get(job_id)
+            if job and not job.done:
+                self._finish(job, {"success": False, "error": "服务正在重启，请重新提交兑换"})
+        self._pending.clear()
+        logger.info("异步兑换队列已停止")
+
+    def enqueue(self, email: str, code: str, team_id: Optional[int]) -> Dict[str, Any]:
+        """
+        提交兑换任务
+
+        Args:
+            email: 用户邮箱
+            code: 兑换码
+            team_id: Team ID (可选)
+
+        Returns:
+            结果字典,包含 success, job (任务信息), error
+        """
+        self._cleanup()
+
+        existing_id = self._active_codes.get(code)
+        if existing_id and existing_id in self._jobs:
+            job = self._jobs[existing_id]
+            if job.email == email:
+                return {"success": True, "job": self.describe(job), "error": None}
+            return {"success": False, "job": None, "error": "兑换码正在兑换中"}
+
+        if not self._workers:
+            return {"success": False, "job": None, "error": "异步兑换队列未启动"}
+        if len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return {"success": False, "job": None, "error": "当前兑换人数过多，请稍后再试"}
+
+        job = RedeemJob(email, code, team_id)
+        self._jobs[job.id] = job
+        self._active_codes[code] = job.id
+        self._pending.append(job.id)
+        self._queue.put_nowait(job.id)
+        self.enqueued += 1
+        logger.info(f"兑换任务已入队: {job.id} ({email}, 排队: {len(self._pending)})")
+        return {"success": True, "job": self.describe(job), "error": None}
+
+    def get_job(self, job_id: str) -> Optional[RedeemJob]:
+        """获取任务"""
+        return self._jobs.get(job_id)
+
+    def describe(self, job: RedeemJob) -> Dict[str, Any]:
+        """获取任务信息 (排队中的任务附带排队位置)"""
+        position = None
+        if job.status == "queued" and job.id in self._pending:
+            position = self._pending.index(job.id) + 1
+        return job.to_dict(position)
+
+    @asynccontextmanager
+    async def team_lock(self, team_id: int):
+        """同一 Team 的邀请串行执行, 避免并发邀请超出席位或触发上游限流"""
+        lock = self._team_locks.get(team_id)
+        if lock is None:
+            lock = self._team_locks[team_id] = asyncio.Lock()
+        self._team_waiters[team_id] = self._team_waiters.get(team_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._team_waiters[team_id] -= 1
+            if self._team_waiters[team_id] == 0:
+                del self._team_waiters[team_id]
+                self._team_locks.pop(team_id, None)
+
+    def _finish(self, job: RedeemJob, result: Dict[str, Any]):
+        job.result = result
+        job.status = "succeeded" if result.get("success") else "failed"
+        job.stage = None
+        job.finished_monotonic = time.monotonic()
+        if self._active_codes.get(job.code) == job.id:
+            del self._active_codes[job.code]
+        if job.status == "succeeded":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        job.touch()
+
+    def _cleanup(self):
+        """清理过期的已结束任务"""
+        deadline = time.monotonic() - self.JOB_TTL_SECONDS
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_monotonic is not None and job.finished_monotonic < deadline
+        ]:
+            del self._jobs[job_id]
+
+    async def _worker_loop(self, index: int):
+        """worker 主循环"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if job_id in self._pending:
+                    self._pending.remove(job_id)
+                job = self._jobs.get(job_id)
+                if job and not job.done:
+                    await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"兑换 worker {index} 执行任务 {job_id} 失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: RedeemJob):
+        """执行单个兑换任务"""
+        job.status = "running"
+        job.touch()
+
+        def on_progress(stage: str):
+            job.stage = stage
+            job.touch()
+
+        try:
+            async with AsyncSessionLocal() as db_session:
+                result = await redeem_flow_service.redeem_and_join_team(
+                    job.email,
+                    job.code,
+                    job.team_id,
+                    db_session,
+                    progress=on_progress,
+                    team_lock=self.team_lock,
+                    request_id=job.id[:12]
+                )
+        except Exception as e:
+            logger.error(f"兑换任务 {job.id} 异常: {e}")
+            result = {"success": False, "error": f"兑换系统异常: {str(e)}"}
+
+        self._finish(job, result or {"success": False, "error": "未知错误"})
+        logger.info(f"兑换任务已结束: {job.id} ({job.status})")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        return {
+            "running": self.running,
+            "workers": self.worker_count,
+            "pending": len(self._pending),
+            "active": len(self._active_codes),
+            "jobs": len(self._jobs),
+            "locked_teams": len(self._team_locks),
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed
+        }
+
+
+# 创建全局实例
+redeem_job_queue = RedeemJobQueue(
+    workers=settings.redeem_queue_workers,
+    max_pending=settings.redeem_queue_max_pending
+)
@@ -2,27 +2,52 @@
 兑换码管理服务
 用于管理兑换码的生成、验证、使用和查询
 """
+import codecs
+import csv
+import json
 import logging
+import re
 import secrets
 import string
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncGenerator, AsyncIterator, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy import select, update, delete, and_, or_, func
+from sqlalchemy import select, insert, update, delete, and_, or_, func, case
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models import RedemptionCode, RedemptionRecord, Team
-from app.utils.time_utils import get_now
+from app.services.search_index import search_index_service
+from app.utils.pagination import CountCache, decode_cursor, encode_cursor, keyset_condition
+from app.utils.time_utils import get_now, from_timestamp
 
 logger = logging.getLogger(__name__)
 
+# 兑换码字符集: 大写字母和数字, 排除容易混淆的字符 (0, O, I, 1), 共 32 个
+CODE_ALPHABET = "".join(c for c in string.ascii_uppercase + string.digits if c not in "0OI1")
+# 随机字节 -> 字符的映射表 (256 是 32 的整数倍, 取低 5 位不会产生偏差)
+_CODE_TRANSLATION = bytes(ord(CODE_ALPHABET[i % len(CODE_ALPHABET)]) for i in range(256))
+
 
 class RedemptionService:
     """兑换码管理服务类"""
 
+    # 单次批量生成的数量上限
+    MAX_BATCH_COUNT = 200000
+    # 批量生成时每个事务插入的数量
+    GENERATE_CHUNK_SIZE = 5000
+    # 批量导入时每个事务插入的数量
+    IMPORT_CHUNK_SIZE = 5000
+    # 导入结果中最多返回的错误行数
+    IMPORT_MAX_ERRORS = 100
+    # 导入兑换码允许的格式 (与兑换码列长度一致)
+    IMPORT_CODE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{4,32}$")
+    # 兑换记录列表和导出包含的状态 (expired 为已回收的占位, 不代表实际兑换)
+    LISTED_RECORD_STATUSES = ("completed", "pending")
+
     def __init__(self):
         """初始化兑换码管理服务"""
-        pass
+        # 列表总数缓存 (游标翻页时使用)
+        self._count_cache = CountCache()
 
     def _generate_random_code(self, length: int = 16) -> str:
         """
@@ -34,18 +59,27 @@ class RedemptionService:
         Returns:
             随机兑换码字符串
         """
-        # 使用大写字母和数字,排除容易混淆的字符 (0, O, I, 1)
-        alphabet = string.ascii_uppercase + string.digits
-        alphabet = alphabet.replace('0', '').replace('O', '').replace('I', '').replace('1', '')
+        return self._generate_random_codes(1, length)[0]
+
+    def _generate_random_codes(self, count: int, length: int = 16) -> List[str]:
+        """
+        一次性生成多个随机兑换码 (批量读取随机字节后映射到字符集)
+
+        Args:
+            count: 生成数量
+            length: 兑换码长度
 
-        # 生成随机码
-        code = ''.join(secrets.choice(alphabet) for _ in range(length))
+        Returns:
+            随机兑换码列表 (可能重复, 由调用方去重)
+        """
+        raw = secrets.token_bytes(count * length).translate(_CODE_TRANSLATION).decode("ascii")
+        codes = [raw[i:i + length] for i in range(0, count * length, length)]
 
         # 格式化为 XXXX-XXXX-XXXX-XXXX
         if length == 16:
-            code = f"{code[0:4]}-{code[4:8]}-{code[8:12]}-{code[12:16]}"
+            codes = [f"{code[0:4]}-{code[4:8]}-{code[8:12]}-{code[12:16]}" for code in codes]
 
-        return code
+        return codes
 
     async def generate_code_single(
         self,
@@ -139,6 +173,117 @@ class RedemptionService:
                 "error": f"生成兑换码失败: {str(e)}"
             }
 
+    async def generate_code_stream(
+        self,
+        db_session: AsyncSession,
+        count: int,
+        expires_days: Optional[int] = None,
+        has_warranty: bool = False,
+        warranty_days: int = 30
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        批量生成兑换码 (分块写入, 流式返回进度)
+        每块先用一次 IN 查询排除已存在的兑换码, 再以 INSERT OR IGNORE 批量写入并提交,
+        与其他请求并发生成时被忽略的兑换码在下一轮重新生成
+
+        Args:
+            db_session: 数据库会话
+            count: 生成数量
+            expires_days: 有效期天数 (可选)
+            has_warranty: 是否为质保兑换码 (默认 False)
+            warranty_days: 质保天数
+
+        Yields:
+            进度字典: start (total), progress (current, total, codes 为本块生成的兑换码), finish, error
+        """
+        if count <= 0 or count > self.MAX_BATCH_COUNT:
+            yield {
+                "type": "error",
+                "error": f"生成数量必须在 1-{self.MAX_BATCH_COUNT} 之间"
+            }
+            return
+
+        # 计算过期时间
+        expires_at = None
+        if expires_days:
+            expires_at = get_now() + timedelta(days=expires_days)
+
+        yield {
+            "type": "start",
+            "total": count
+        }
+
+        generated = 0
+        # 连续未能生成新兑换码的轮数 (字符空间足够大, 正常情况下不会发生)
+        stalled_rounds = 0
+        insert_stmt = insert(RedemptionCode.__table__).prefix_with("OR IGNORE")
+
+        try:
+            while generated < count and stalled_rounds < 10:
+                chunk_size = min(self.GENERATE_CHUNK_SIZE, count - generated)
+                candidates = list(dict.fromkeys(self._generate_random_codes(chunk_size)))
+
+                # 一次查询排除已存在的兑换码
+                result = await db_session.execute(
+                    select(RedemptionCode.code).where(RedemptionCode.code.in_(candidates))
+                )
+                existing = set(result.scalars().all())
+                fresh = [code for code in candidates if code not in existing]
+                if not fresh:
+                    stalled_rounds += 1
+                    continue
+
+                created_at = get_now()
+                result = await db_session.execute(insert_stmt, [
+                    {
+                        "code": code,
+                        "status": "unused",
+                        "created_at": created_at,
+                        "expires_at": expires_at,
+                        "has_warranty": has_warranty,
+                        "warranty_days": warranty_days
+                    }
+                    for code in fresh
+                ])
+                await db_session.commit()
+
+                if result.rowcount != len(fresh):
+                    # 与并发写入冲突, 只保留本次实际插入的兑换码
+                    result = await db_session.execute(
+                        select(RedemptionCode.code).where(
+                            RedemptionCode.code.in_(fresh),
+                            RedemptionCode.created_at == created_at
+                        )
+                    )
+                    inserted = set(result.scalars().all())
+                    fresh = [code for code in fresh if code in inserted]
+
+                stalled_rounds = 0 if fresh else stalled_rounds + 1
+                generated += len(fresh)
+                yield {
+                    "type": "progress",
+                    "current": generated,
+                    "total": count,
+                    "codes": fresh
+                }
+
+            logger.info(f"批量生成兑换码完成: {generated}/{count} 个")
+
+            yield {
+                "type": "finish",
+                "total": count,
+                "success_count": generated,
+                "failed_count": count - generated
+            }
+
+        except Exception as e:
+            await db_session.rollback()
+            logger.error(f"批量生成兑换码失败: {e}")
+            yield {
+                "type": "error",
+                "error": f"批量生成兑换码失败: {str(e)}"
+            }
+
     async def generate_code_batch(
         self,
         db_session: AsyncSession,
@@ -148,86 +293,222 @@ class RedemptionService:
         warranty_days: int = 30
     ) -> Dict[str, Any]:
         """
-        批量生成兑换码
+        批量生成兑换码 (一次性返回全部结果)
 
         Args:
             db_session: 数据库会话
             count: 生成数量
             expires_days: 有效期天数 (可选)
             has_warranty: 是否为质保兑换码 (默认 False)
+            warranty_days: 质保天数
 
         Returns:
             结果字典,包含 success, codes, total, message, error
         """
-        try:
-            if count <= 0 or count > 1000:
+        codes = []
+        async for item in self.generate_code_stream(db_session, count, expires_days, has_warranty, warranty_days):
+            if item["type"] == "progress":
+                codes.extend(item["codes"])
+            elif item["type"] == "error":
+                # 出错前已提交的兑换码仍然有效
                 return {
                     "success": False,
-                    "codes": [],
-                    "total": 0,
+                    "codes": codes,
+                    "total": len(codes),
                     "message": None,
-                    "error": "生成数量必须在 1-1000 之间"
+                    "error": item["error"]
                 }
 
-            # 计算过期时间
-            expires_at = None
-            if expires_days:
-                expires_at = get_now() + timedelta(days=expires_days)
+        return {
+            "success": True,
+            "codes": codes,
+            "total": len(codes),
+            "message": f"成功生成 {len(codes)} 个兑换码",
+            "error": None
+        }
 
-            # 批量生成兑换码
-            codes = []
-            for i in range(count):
-                # 生成唯一兑换码
-                max_attempts = 10
-                for _ in range(max_attempts):
-                    code = self._generate_random_code()
+    def _parse_import_row(
+        self,
+        row: Dict[str, Any],
+        defaults: Dict[str, Any],
+        now: datetime
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        校验并转换一行导入数据
 
-                    # 检查是否已存在 (包括本次批量生成的)
-                    if code not in codes:
-                        stmt = select(RedemptionCode).where(RedemptionCode.code == code)
-                        result = await db_session.execute(stmt)
-                        existing = result.scalar_one_or_none()
+        Args:
+            row: 原始字段 (code, expires_at, expires_days, has_warranty, warranty_days)
+            defaults: 未提供字段时使用的默认值
+            now: 当前时间 (计算 expires_days)
 
-                        if not existing:
-                            codes.append(code)
-                            break
-                else:
-                    logger.warning(f"生成第 {i+1} 个兑换码失败")
-                    continue
+        Returns:
+            (插入参数, 错误信息), 校验失败时插入参数为 None
+        """
+        code = str(row.get("code") or "").strip()
+        if not self.IMPORT_CODE_PATTERN.match(code):
+            return None, f"兑换码格式无效: {code[:40] or '(空)'}"
 
-            # 批量插入数据库
-            for code in codes:
-                redemption_code = RedemptionCode(
-                    code=code,
-                    status="unused",
-                    expires_at=expires_at,
-                    has_warranty=has_warranty,
-                    warranty_days=warranty_days
-                )
-                db_session.add(redemption_code)
+        expires_at = defaults["expires_at"]
+        expires_at_text = str(row.get("expires_at") or "").strip()
+        expires_days_text = str(row.get("expires_days") or "").strip()
+        try:
+            if expires_at_text:
+                expires_at = datetime.fromisoformat(expires_at_text)
+                if expires_at.tzinfo is not None:
+                    # 与 get_now() 一致, 统一存储为当前时区不带时区信息的时间
+                    expires_at = from_timestamp(expires_at.timestamp())
+            elif expires_days_text:
+                expires_days = int(expires_days_text)
+                if expires_days < 1 or expires_days > 3650:
+                    return None, f"{code}: 有效期天数必须在 1-3650 之间"
+                expires_at = now + timedelta(days=expires_days)
+        except ValueError:
+            return None, f"{code}: 过期时间格式无效"
+
+        has_warranty = defaults["has_warranty"]
+        warranty_text = str(row.get("has_warranty") if row.get("has_warranty") is not None else "").strip().lower()
+        if warranty_text:
+            if warranty_text not in ("1", "0", "true", "false", "yes", "no", "是", "否"):
+                return None, f"{code}: 质保字段无效"
+            has_warranty = warranty_text in ("1", "true", "yes", "是")
+
+        warranty_days = defaults["warranty_days"]
+        warranty_days_text = str(row.get("warranty_days") or "").strip()
+        if warranty_days_text:
+            try:
+                warranty_days = int(warranty_days_text)
+            except ValueError:
+                return None, f"{code}: 质保天数无效"
+            if warranty_days < 1 or warranty_days > 3650:
+                return None, f"{code}: 质保天数必须在 1-3650 之间"
+
+        return {
+            "code": code,
+            "status": "unused",
+            "created_at": now,
+            "expires_at": expires_at,
+            "has_warranty": has_warranty,
+            "warranty_days": warranty_days
+        }, None
+
+    async def _iter_import_lines(self, chunks: AsyncIterator[bytes]) -> AsyncGenerator[str, None]:
+        """将上传的字节流按行切分 (兼容 UTF-8 BOM 和 CRLF)"""
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        pending = ""
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending.rstrip("\r")
+
+    async def import_codes(
+        self,
+        db_session: AsyncSession,
+        chunks: AsyncIterator[bytes],
+        fmt: str = "csv",
+        expires_days: Optional[int] = None,
+        has_warranty: bool = False,
+        warranty_days: int = 30
+    ) -> Dict[str, Any]:
+        """
+        批量导入外部生成的兑换码 (流式读取, 分块 INSERT OR IGNORE)
+
+        CSV: 首行为表头时按列名读取 code, expires_at, expires_days, has_warranty, warranty_days,
+        否则每行第一列为兑换码; NDJSON: 每行一个 JSON 对象 (字段同上) 或兑换码字符串
+
+        Args:
+            db_session: 数据库会话
+            chunks: 上传内容的字节块
+            fmt: 内容格式 (csv/ndjson)
+            expires_days: 未指定过期时间的兑换码的有效期天数 (可选)
+            has_warranty: 未指定质保字段时是否为质保兑换码
+            warranty_days: 未指定质保天数时的质保天数
 
+        Returns:
+            结果字典,包含 success, total, inserted, duplicates, invalid, errors, error
+        """
+        now = get_now()
+        defaults = {
+            "expires_at": now + timedelta(days=expires_days) if expires_days else None,
+            "has_warranty": has_warranty,
+            "warranty_days": warranty_days
+        }
+        summary = {"total": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+        errors: List[str] = []
+        insert_stmt = insert(RedemptionCode.__table__).prefix_with("OR IGNORE")
+        batch: Dict[str, Dict[str, Any]] = {}
+
+        async def flush():
+            if not batch:
+                return
+            result = await db_session.execute(insert_stmt, list(batch.values()))
             await db_session.commit()
+            summary["inserted"] += result.rowcount
+            summary["duplicates"] += len(batch) - result.rowcount
+            batch.clear()
 
-            logger.info(f"批量生成兑换码成功: {len(codes)} 个")
+        def reject(line_no: int, message: str):
+            summary["invalid"] += 1
+            if len(errors) < self.IMPORT_MAX_ERRORS:
+                errors.append(f"第 {line_no} 行: {message}")
 
-            return {
-                "success": True,
-                "codes": codes,
-                "total": len(codes),
-                "message": f"成功生成 {len(codes)} 个兑换码",
-                "error": None
-            }
+        try:
+            header: Optional[List[str]] = None
+            # 表头只可能出现在第一个有内容的行 (前面可以有空行和 # 注释行)
+            first_row = True
+            line_no = 0
+            async for line in self._iter_import_lines(chunks):
+                line_no += 1
+                if not line.strip():
+                    continue
+
+                if fmt == "ndjson":
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        reject(line_no, "JSON 格式无效")
+                        summary["total"] += 1
+                        continue
+                    row = item if isinstance(item, dict) else {"code": item}
+                else:
+                    if line.lstrip().startswith("#"):
+                        continue
+                    values = next(csv.reader([line]))
+                    is_first_row, first_row = first_row, False
+                    if is_first_row and "code" in [value.strip().lower() for value in values]:
+                        header = [value.strip().lower() for value in values]
+                        continue
+                    row = dict(zip(header, values)) if header else {"code": values[0] if values else ""}
+
+                summary["total"] += 1
+                params, error = self._parse_import_row(row, defaults, now)
+                if error:
+                    reject(line_no, error)
+                    continue
+                if params["code"] in batch:
+                    summary["duplicates"] += 1
+                    continue
+                batch[params["code"]] = params
+                if len(batch) >= self.IMPORT_CHUNK_SIZE:
+                    await flush()
+
+            await flush()
+
+            logger.info(
+                f"批量导入兑换码完成: 共 {summary['total']} 行, 新增 {summary['inserted']}, "
+                f"重复 {summary['duplicates']}, 无效 {summary['invalid']}"
+            )
+            return {"success": True, **summary, "errors": errors, "error": None}
 
         except Exception as e:
             await db_session.rollback()
-            logger.error(f"批量生成兑换码失败: {e}")
-            return {
-                "success": False,
-                "codes": [],
-                "total": 0,
-                "message": None,
-                "error": f"批量生成兑换码失败: {str(e)}"
-            }
+            logger.error(f"批量导入兑换码失败: {e}")
+            # 已提交的分块保留, 返回到目前为止的统计
+            return {"success": False, **summary, "errors": errors, "error": f"批量导入兑换码失败: {str(e)}"}
 
     async def validate_code(
         self,
@@ -398,37 +679,49 @@ class RedemptionService:
         db_session: AsyncSession,
         page: int = 1,
         per_page: int = 50,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取所有兑换码
 
         Args:
             db_session: 数据库会话
-            page: 页码
+            page: 页码 (提供游标时仅用于显示)
             per_page: 每页数量
             search: 搜索关键词 (兑换码或邮箱)
+            cursor: 上一页返回的 next_cursor, 提供时从该位置继续查询 (不使用 OFFSET)
 
         Returns:
-            结果字典,包含 success, codes, total, total_pages, current_page, error
+            结果字典,包含 success, codes, total, total_pages, current_page, next_cursor, error
         """
         try:
             # 1. 构建基础查询
             count_stmt = select(func.count(RedemptionCode.id))
-            stmt = select(RedemptionCode).order_by(RedemptionCode.created_at.desc())
+            stmt = select(RedemptionCode).order_by(RedemptionCode.created_at.desc(), RedemptionCode.id.desc())
 
             # 2. 如果提供了搜索关键词,添加过滤条件
             if search:
-                search_filter = or_(
-                    RedemptionCode.code.ilike(f"%{search}%"),
-                    RedemptionCode.used_by_email.ilike(f"%{search}%")
-                )
+                # 优先使用全文搜索索引, 不可用或关键词过短时回退到 LIKE
+                search_filter = search_index_service.match("codes", RedemptionCode.id, search)
+                if search_filter is None:
+                    search_filter = or_(
+                        RedemptionCode.code.ilike(f"%{search}%"),
+                        RedemptionCode.used_by_email.ilike(f"%{search}%")
+                    )
                 count_stmt = count_stmt.where(search_filter)
                 stmt = stmt.where(search_filter)
 
-            # 3. 获取总数
-            count_result = await db_session.execute(count_stmt)
-            total = count_result.scalar() or 0
+            # 3. 获取总数 (游标翻页时使用缓存的总数)
+            async def count_total() -> int:
+                count_result = await db_session.execute(count_stmt)
+                return count_result.scalar() or 0
+
+            position = decode_cursor(cursor)
+            if position:
+                total = await self._count_cache.get_or_count(("codes", search or ""), count_total)
+            else:
+                total = await count_total()
 
             # 4. 计算分页
             import math
@@ -437,13 +730,17 @@ class RedemptionService:
                 page = 1
             if page > total_pages and total_pages > 0:
                 page = total_pages
-            
-            offset = (page - 1) * per_page
 
-            # 5. 查询分页数据
-            stmt = stmt.limit(per_page).offset(offset)
+            # 5. 查询分页数据 (多取一行用于判断是否有下一页)
+            stmt = stmt.limit(per_page + 1)
+            if position:
+                stmt = stmt.where(keyset_condition(RedemptionCode.created_at, RedemptionCode.id, position))
+            else:
+                stmt = stmt.offset((page - 1) * per_page)
             result = await db_session.execute(stmt)
             codes = result.scalars().all()
+            next_cursor = encode_cursor(codes[per_page - 1].created_at, codes[per_page - 1].id) if len(codes) > per_page else None
+            codes = codes[:per_page]
 
             # 构建返回数据
             code_list = []
@@ -470,6 +767,7 @@ class RedemptionService:
                 "total": total,
                 "total_pages": total_pages,
                 "current_page": page,
+                "next_cursor": next_cursor,
                 "error": None
             }
 
@@ -597,63 +895,138 @@ class RedemptionService:
                 "error": f"获取未使用兑换码失败: {str(e)}"
             }
 
+    def _record_filters(
+        self,
+        email: Optional[str] = None,
+        code: Optional[str] = None,
+        team_id: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        statuses: Tuple[str, ...] = LISTED_RECORD_STATUSES
+    ) -> List[Any]:
+        """
+        构建兑换记录筛选条件 (时间范围为 [start_time, end_time))
+
+        Args:
+            statuses: 包含的记录状态 (默认排除已回收的 expired 占位)
+        """
+        filters = [RedemptionRecord.status.in_(statuses)]
+        # 优先使用全文搜索索引, 不可用或关键词过短时回退到 LIKE
+        if email:
+            email_filter = search_index_service.match("records", RedemptionRecord.id, email, ["email"])
+            filters.append(email_filter if email_filter is not None else RedemptionRecord.email.ilike(f"%{email}%"))
+        if code:
+            code_filter = search_index_service.match("records", RedemptionRecord.id, code, ["code"])
+            filters.append(code_filter if code_filter is not None else RedemptionRecord.code.ilike(f"%{code}%"))
+        if team_id:
+            filters.append(RedemptionRecord.team_id == team_id)
+        if start_time:
+            filters.append(RedemptionRecord.redeemed_at >= start_time)
+        if end_time:
+            filters.append(RedemptionRecord.redeemed_at < end_time)
+        return filters
+
     async def get_all_records(
         self,
         db_session: AsyncSession,
         email: Optional[str] = None,
         code: Optional[str] = None,
-        team_id: Optional[int] = None
+        team_id: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        page: int = 1,
+        per_page: int = 20,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        获取所有兑换记录 (支持筛选)
+        分页获取兑换记录 (支持筛选, 附带 Team 名称)
 
         Args:
             db_session: 数据库会话
             email: 邮箱模糊搜索
             code: 兑换码模糊搜索
             team_id: Team ID 筛选
+            start_time: 兑换时间下限 (包含)
+            end_time: 兑换时间上限 (不包含)
+            page: 页码 (提供游标时仅用于显示)
+            per_page: 每页数量
+            cursor: 上一页返回的 next_cursor, 提供时从该位置继续查询 (不使用 OFFSET)
 
         Returns:
-            结果字典,包含 success, records, total, error
+            结果字典,包含 success, records, total, total_pages, current_page, next_cursor, error
         """
         try:
-            stmt = select(RedemptionRecord)
-            
-            # 添加筛选条件
-            filters = []
-            if email:
-                filters.append(RedemptionRecord.email.ilike(f"%{email}%"))
-            if code:
-                filters.append(RedemptionRecord.code.ilike(f"%{code}%"))
-            if team_id:
-                filters.append(RedemptionRecord.team_id == team_id)
-                
+            filters = self._record_filters(email, code, team_id, start_time, end_time)
+
+            # 1. 获取总数 (游标翻页时使用缓存的总数)
+            count_stmt = select(func.count(RedemptionRecord.id))
+            if filters:
+                count_stmt = count_stmt.where(and_(*filters))
+
+            async def count_total() -> int:
+                count_result = await db_session.execute(count_stmt)
+                return count_result.scalar() or 0
+
+            position = decode_cursor(cursor)
+            if position:
+                cache_key = ("records", email or "", code or "", team_id, start_time, end_time)
+                total = await self._count_cache.get_or_count(cache_key, count_total)
+            else:
+                total = await count_total()
+
+            # 2. 计算分页
+            import math
+            per_page = max(1, per_page)
+            total_pages = math.ceil(total / per_page) if total > 0 else 1
+            if page < 1:
+                page = 1
+            if page > total_pages:
+                page = total_pages
+
+            # 3. 查询分页数据 (关联 Team 名称, 多取一行用于判断是否有下一页)
+            stmt = (
+                select(RedemptionRecord, Team.team_name)
+                .outerjoin(Team, Team.id == RedemptionRecord.team_id)
+                .order_by(RedemptionRecord.redeemed_at.desc(), RedemptionRecord.id.desc())
+                .limit(per_page + 1)
+            )
             if filters:
                 stmt = stmt.where(and_(*filters))
-                
-            stmt = stmt.order_by(RedemptionRecord.redeemed_at.desc())
-            
+            if position:
+                stmt = stmt.where(keyset_condition(RedemptionRecord.redeemed_at, RedemptionRecord.id, position))
+            else:
+                stmt = stmt.offset((page - 1) * per_page)
             result = await db_session.execute(stmt)
-            records = result.scalars().all()
+            rows = result.all()
+            next_cursor = None
+            if len(rows) > per_page:
+                last_record = rows[per_page - 1][0]
+                next_cursor = encode_cursor(last_record.redeemed_at, last_record.id)
+                rows = rows[:per_page]
 
             # 构建返回数据
             record_list = []
-            for record in records:
+            for record, team_name in rows:
                 record_list.append({
                     "id": record.id,
                     "email": record.email,
                     "code": record.code,
                     "team_id": record.team_id,
+                    "team_name": team_name,
                     "account_id": record.account_id,
+                    "status": record.status,
                     "redeemed_at": record.redeemed_at.isoformat() if record.redeemed_at else None
                 })
 
-            logger.info(f"获取所有兑换记录成功: 共 {len(record_list)} 条")
+            logger.info(f"获取兑换记录成功: 第 {page} 页, 共 {len(record_list)} 条 / 总数 {total}")
 
             return {
                 "success": True,
                 "records": record_list,
-                "total": len(record_list),
+                "total": total,
+                "total_pages": total_pages,
+                "current_page": page,
+                "next_cursor": next_cursor,
                 "error": None
             }
 
@@ -663,9 +1036,63 @@ class RedemptionService:
                 "success": False,
                 "records": [],
                 "total": 0,
+                "total_pages": 1,
+                "current_page": 1,
+                "next_cursor": None,
                 "error": f"获取所有兑换记录失败: {str(e)}"
             }
 
+    async def get_record_stats(
+        self,
+        db_session: AsyncSession,
+        email: Optional[str] = None,
+        code: Optional[str] = None,
+        team_id: Optional[int] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """
+        统计符合筛选条件的兑换记录数量
+
+        Args:
+            db_session: 数据库会话
+            email: 邮箱模糊搜索
+            code: 兑换码模糊搜索
+            team_id: Team ID 筛选
+            start_time: 兑换时间下限 (包含)
+            end_time: 兑换时间上限 (不包含)
+
+        Returns:
+            统计字典,包含 total, today, this_week, this_month (仅已完成的兑换)
+        """
+        now = get_now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=today_start.weekday())
+        month_start = today_start.replace(day=1)
+
+        def count_since(since: datetime):
+            return func.coalesce(func.sum(case((RedemptionRecord.redeemed_at >= since, 1), else_=0)), 0)
+
+        stmt = select(
+            func.count(RedemptionRecord.id),
+            count_since(today_start),
+            count_since(week_start),
+            count_since(month_start)
+        )
+        # 统计只计入已完成的兑换 (pending 占位的邀请尚未确认)
+        filters = self._record_filters(email, code, team_id, start_time, end_time, statuses=("completed",))
+        if filters:
+            stmt = stmt.where(and_(*filters))
+
+        result = await db_session.execute(stmt)
+        total, today, this_week, this_month = result.one()
+        return {
+            "total": total or 0,
+            "today": today,
+            "this_week": this_week,
+            "this_month": this_month
+        }
+
     async def delete_code(
         self,
         code: str,
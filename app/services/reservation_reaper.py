@@ -0,0 +1,256 @@
+"""
+兑换占位回收服务
+兑换流程在发送邀请前先提交占位 (席位计数、兑换码状态和 pending 状态的兑换记录),
+进程退出或协程被取消时占位会一直保留。本服务定期处理超时的占位:
+上游已有该邮箱的邀请或成员时确认为完成, 否则回退占位以释放席位和兑换码
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import select, update, func, case, and_
+
+from app.database import AsyncSessionLocal
+from app.models import Team, RedemptionRecord
+from app.services.chatgpt import chatgpt_service
+from app.services.redeem_flow import redeem_flow_service
+from app.services.seat_allocator import seat_allocator
+from app.services.settings import settings_service
+from app.services.team import team_service
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationReaper:
+    """超时占位回收任务"""
+
+    # 调度循环间隔 (秒)
+    TICK_SECONDS = 60
+    # 默认占位超时时间 (分钟), 需大于单次兑换尝试的最长耗时
+    DEFAULT_TIMEOUT_MINUTES = 10
+    # 每轮最多处理的占位数
+    BATCH_SIZE = 200
+    # 同时向上游确认的 Team 数
+    CONCURRENCY = 3
+
+    def __init__(self):
+        """初始化占位回收任务"""
+        self._task: Optional[asyncio.Task] = None
+        self.confirmed = 0
+        self.released = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """启动调度循环"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info("兑换占位回收任务已启动")
+
+    async def stop(self):
+        """停止调度循环"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("兑换占位回收任务已停止")
+
+    async def _run_loop(self):
+        """调度主循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"兑换占位回收执行失败: {e}")
+            await asyncio.sleep(self.TICK_SECONDS)
+
+    async def _fetch_upstream_emails(self, team_id: int) -> Optional[Tuple[set, Optional[int]]]:
+        """
+        获取 Team 在上游的成员和待接受邀请邮箱
+
+        Returns:
+            (小写邮箱集合, 上游成员数 + 待接受邀请数);
+            Team 已不可用时返回 (空集合, None) (占位全部回退); 暂时无法确认时返回 None
+        """
+        async with AsyncSessionLocal() as db_session:
+            result = await db_session.execute(select(Team).where(Team.id == team_id))
+            team = result.scalar_one_or_none()
+            if not team or team.status in ("banned", "expired"):
+                return set(), None
+
+            access_token = await team_service.ensure_access_token(team, db_session)
+            if not access_token:
+                return None
+
+            members_result, invites_result = await asyncio.gather(
+                chatgpt_service.get_members(access_token, team.account_id, db_session, identifier=team.email),
+                chatgpt_service.get_invites(access_token, team.account_id, db_session, identifier=team.email)
+            )
+            if not members_result["success"] or not invites_result["success"]:
+                return None
+
+        emails = {str(member.get("email") or "").lower() for member in members_result["members"]}
+        emails |= {str(invite.get("email_address") or "").lower() for invite in invites_result["items"]}
+        return emails, members_result["total"] + invites_result["total"]
+
+    async def _resync_members(self, db_session, team_id: int, emails: set, upstream_total: int) -> None:
+        """
+        按上游成员数重新计算席位计数
+        直接减一会与期间执行过的同步 (已按上游重算计数) 叠加导致计数偏低、Team 超员,
+        仍处于占位中且邀请尚未出现在上游的兑换需要一并计入 (已出现的已包含在上游总数中)
+        """
+        result = await db_session.execute(
+            select(RedemptionRecord.email).where(
+                RedemptionRecord.team_id == team_id,
+                RedemptionRecord.status == "pending"
+            )
+        )
+        pending = sum(1 for email in result.scalars() if (email or "").lower() not in emails)
+        current_members = upstream_total + pending
+        await db_session.execute(
+            update(Team).where(Team.id == team_id).values(
+                current_members=current_members,
+                status=case(
+                    (and_(Team.status == "active", Team.max_members <= current_members), "full"),
+                    (and_(Team.status == "full", Team.max_members > current_members), "active"),
+                    else_=Team.status
+                )
+            ).execution_options(synchronize_session=False)
+        )
+        await db_session.commit()
+
+    async def _reap_team(self, team_id: int, records: List[tuple]) -> Dict[str, int]:
+        """
+        处理单个 Team 的超时占位
+
+        Args:
+            team_id: Team ID
+            records: (记录 ID, 邮箱, 兑换码) 列表
+
+        Returns:
+            确认完成和回退的数量
+        """
+        upstream = await self._fetch_upstream_emails(team_id)
+        if upstream is None:
+            logger.warning(f"暂时无法确认 Team {team_id} 的邀请状态, 下一轮重试 ({len(records)} 个占位)")
+            return {"confirmed": 0, "released": 0}
+        emails, upstream_total = upstream
+
+        confirm_ids = [record_id for record_id, email, code in records if email.lower() in emails]
+        release = [(record_id, code) for record_id, email, code in records if email.lower() not in emails]
+
+        released = 0
+        async with AsyncSessionLocal() as db_session:
+            confirmed = 0
+            if confirm_ids:
+                result = await db_session.execute(
+                    update(RedemptionRecord).where(
+                        RedemptionRecord.id.in_(confirm_ids),
+                        RedemptionRecord.status == "pending"
+                    ).values(status="completed").execution_options(synchronize_session=False)
+                )
+                await db_session.commit()
+                confirmed = result.rowcount
+
+            for record_id, code in release:
+                # 先将占位标记为过期, 与刚好完成的兑换流程竞争时以状态更新结果为准
+                result = await db_session.execute(
+                    update(RedemptionRecord).where(
+                        RedemptionRecord.id == record_id,
+                        RedemptionRecord.status == "pending"
+                    ).values(status="expired").execution_options(synchronize_session=False)
+                )
+                await db_session.commit()
+                if result.rowcount != 1:
+                    continue
+                await redeem_flow_service._rollback_redemption(
+                    db_session, code, team_id, record_id, restore_seat=upstream_total is None
+                )
+                released += 1
+
+            if released and upstream_total is not None:
+                await self._resync_members(db_session, team_id, emails, upstream_total)
+                seat_allocator.invalidate(team_id)
+
+        if confirmed or released:
+            logger.info(f"Team {team_id} 占位回收: 确认 {confirmed} 个, 回退 {released} 个")
+        return {"confirmed": confirmed, "released": released}
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        执行一轮占位回收
+
+        Returns:
+            结果字典,包含 success, selected, confirmed, released, error
+        """
+        async with AsyncSessionLocal() as db_session:
+            timeout_minutes = await settings_service.get_int_setting(
+                db_session, "reservation_timeout_minutes", self.DEFAULT_TIMEOUT_MINUTES
+            )
+            deadline = get_now() - timedelta(minutes=max(1, timeout_minutes))
+            result = await db_session.execute(
+                select(RedemptionRecord.id, RedemptionRecord.team_id, RedemptionRecord.email, RedemptionRecord.code)
+                .where(
+                    RedemptionRecord.status == "pending",
+                    RedemptionRecord.redeemed_at < deadline
+                )
+                .order_by(RedemptionRecord.redeemed_at.asc())
+                .limit(self.BATCH_SIZE)
+            )
+            rows = result.all()
+
+        if not rows:
+            return {"success": True, "selected": 0, "confirmed": 0, "released": 0, "error": None}
+
+        # 按 Team 分组, 每个 Team 只向上游查询一次
+        by_team: Dict[int, List[tuple]] = {}
+        for record_id, team_id, email, code in rows:
+            by_team.setdefault(team_id, []).append((record_id, email, code))
+        logger.info(f"兑换占位回收: 发现 {len(rows)} 个超时占位, 涉及 {len(by_team)} 个 Team")
+
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def reap(team_id: int, records: List[tuple]) -> Dict[str, int]:
+            async with semaphore:
+                try:
+                    return await self._reap_team(team_id, records)
+                except Exception as e:
+                    logger.error(f"回收 Team {team_id} 占位失败: {e}")
+                    return {"confirmed": 0, "released": 0}
+
+        results = await asyncio.gather(*(reap(team_id, records) for team_id, records in by_team.items()))
+        confirmed = sum(item["confirmed"] for item in results)
+        released = sum(item["released"] for item in results)
+        self.confirmed += confirmed
+        self.released += released
+
+        self.last_run = {
+            "success": True,
+            "selected": len(rows),
+            "confirmed": confirmed,
+            "released": released,
+            "finished_at": get_now().isoformat(),
+            "error": None
+        }
+        return self.last_run
+
+    def stats(self) -> Dict[str, Any]:
+        """获取回收统计信息"""
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "confirmed": self.confirmed,
+            "released": self.released,
+            "last_run": self.last_run
+        }
+
+
+# 创建全局实例
+reservation_reaper = ReservationReaper()
@@ -0,0 +1,183 @@
+"""
+全文搜索索引服务
+为管理后台的搜索框维护 SQLite FTS5 (trigram 分词) 影子表, 由触发器与原表保持同步,
+子串搜索可以走索引而不必对原表执行 LIKE '%...%' 全表扫描
+
+用法:
+    python -m app.services.search_index --rebuild
+"""
+import argparse
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import select, text, table, column
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+# 索引名 -> (原表, 参与索引的列 (FTS 列名, 原表 SQL 表达式, {row} 为行前缀))
+INDEXES: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {
+    "teams": ("teams", [
+        ("email", "{row}email"),
+        ("account_id", "{row}account_id"),
+        ("team_name", "{row}team_name"),
+        ("team_id", "CAST({row}id AS TEXT)")
+    ]),
+    "codes": ("redemption_codes", [
+        ("code", "{row}code"),
+        ("used_by_email", "{row}used_by_email")
+    ]),
+    "records": ("redemption_records", [
+        ("email", "{row}email"),
+        ("code", "{row}code")
+    ])
+}
+
+
+class SearchIndexService:
+    """FTS5 搜索索引"""
+
+    # trigram 分词至少需要 3 个字符, 更短的关键词仍使用 LIKE
+    MIN_TERM_LENGTH = 3
+
+    def __init__(self):
+        """初始化搜索索引服务"""
+        # 影子表创建成功后才启用索引搜索
+        self.available = False
+
+    @staticmethod
+    def _fts_table(name: str) -> str:
+        return f"{INDEXES[name][0]}_fts"
+
+    def _ddl(self, name: str) -> List[str]:
+        """生成影子表和同步触发器的建表语句"""
+        source, columns = INDEXES[name]
+        fts = self._fts_table(name)
+        fts_columns = ", ".join(fts_column for fts_column, _ in columns)
+        new_values = ", ".join(expression.format(row="new.") for _, expression in columns)
+        # 只在被索引的原表列变化时同步 (ID 不会变化)
+        watched = ", ".join(fts_column for fts_column, expression in columns if expression == "{row}" + fts_column)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({fts_columns}, tokenize='trigram')",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN
+                INSERT INTO {fts}(rowid, {fts_columns}) VALUES (new.id, {new_values});
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {watched} ON {source} BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+                INSERT INTO {fts}(rowid, {fts_columns}) VALUES (new.id, {new_values});
+            END"""
+        ]
+
+    async def ensure(self) -> bool:
+        """
+        创建影子表和触发器 (已存在时跳过), 新建的影子表会从原表填充
+
+        Returns:
+            索引是否可用
+        """
+        if not settings.database_url.startswith("sqlite"):
+            self.available = False
+            return False
+
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+                existing = {row[0] for row in result.all()}
+                created = []
+                for name in INDEXES:
+                    if self._fts_table(name) not in existing:
+                        created.append(name)
+                    for statement in self._ddl(name):
+                        await conn.execute(text(statement))
+                for name in created:
+                    count = await self._rebuild_index(conn, name)
+                    logger.info(f"已创建搜索索引 {self._fts_table(name)} ({count} 行)")
+        except OperationalError as e:
+            # SQLite 未编译 FTS5 或版本过低 (trigram 需要 3.34+)
+            logger.warning(f"搜索索引不可用, 将使用 LIKE 搜索: {e}")
+            self.available = False
+            return False
+
+        self.available = True
+        return True
+
+    async def _rebuild_index(self, conn, name: str) -> int:
+        """从原表重新填充单个影子表"""
+        source, columns = INDEXES[name]
+        fts = self._fts_table(name)
+        fts_columns = ", ".join(fts_column for fts_column, _ in columns)
+        expressions = ", ".join(expression.format(row="") for _, expression in columns)
+        await conn.execute(text(f"DELETE FROM {fts}"))
+        await conn.execute(text(f"INSERT INTO {fts}(rowid, {fts_columns}) SELECT id, {expressions} FROM {source}"))
+        await conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('optimize')"))
+        result = await conn.execute(text(f"SELECT count(*) FROM {fts}"))
+        return result.scalar() or 0
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """
+        重建全部搜索索引 (用于已有数据库或索引与原表不一致时)
+
+        Returns:
+            结果字典,包含 success, counts (各影子表行数), error
+        """
+        if not await self.ensure():
+            return {"success": False, "counts": {}, "error": "当前数据库不支持 FTS5 搜索索引"}
+
+        counts = {}
+        async with engine.begin() as conn:
+            for name in INDEXES:
+                counts[self._fts_table(name)] = await self._rebuild_index(conn, name)
+        logger.info(f"搜索索引重建完成: {counts}")
+        return {"success": True, "counts": counts, "error": None}
+
+    def match(self, name: str, id_column, term: Optional[str], columns: Optional[List[str]] = None):
+        """
+        生成通过影子表筛选的条件
+
+        Args:
+            name: 索引名 (teams/codes/records)
+            id_column: 原表 ID 列
+            term: 搜索关键词 (子串匹配, 不区分大小写)
+            columns: 只在指定列中搜索 (默认全部列)
+
+        Returns:
+            SQLAlchemy 条件表达式; 索引不可用或关键词过短时返回 None, 调用方应回退到 LIKE
+        """
+        term = (term or "").strip()
+        if not self.available or len(term) < self.MIN_TERM_LENGTH:
+            return None
+
+        fts = self._fts_table(name)
+        query = '"' + term.replace('"', '""') + '"'
+        if columns:
+            query = "{" + " ".join(columns) + "} : " + query
+        fts_table = table(fts, column("rowid"), column(fts))
+        return id_column.in_(select(fts_table.c.rowid).where(fts_table.c[fts].op("MATCH")(query)))
+
+
+# 创建全局实例
+search_index_service = SearchIndexService()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="管理后台搜索索引")
+    parser.add_argument("--rebuild", action="store_true", help="从原表重建全部搜索索引")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if args.rebuild:
+        result = asyncio.run(search_index_service.rebuild())
+        print(result["counts"] if result["success"] else result["error"])
+    else:
+        parser.print_help()
@@ -0,0 +1,360 @@
+"""
+席位分配索引服务
+在内存中维护 "active 且有空位" 的 Team 有序索引, 自动选择 Team 时无需查询数据库
+启动时从数据库构建, 通过 Team 变更事件和兑换流程增量更新, 并定期与数据库对账
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Set, Iterable
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal
+from app.models import Team, RedemptionRecord
+from app.services.team_selection import TeamCandidate, SelectionStrategy, get_strategy
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+
+class _TeamSlot:
+    """索引中的单个 Team"""
+
+    __slots__ = ("sort_key", "candidate", "account_id", "emails", "version")
+
+    def __init__(
+        self,
+        sort_key: tuple,
+        candidate: TeamCandidate,
+        account_id: Optional[str],
+        emails: Set[str],
+        version: int
+    ):
+        self.sort_key = sort_key
+        self.candidate = candidate
+        self.account_id = account_id
+        self.emails = emails
+        # 每次变更递增, 堆中版本不一致的条目即为过期条目
+        self.version = version
+
+    @property
+    def free(self) -> int:
+        return self.candidate.free
+
+
+class SeatAllocator:
+    """
+    可分配席位索引
+
+    每个可索引的选择策略 (SelectionStrategy.indexed) 按其排序键维护一个最小堆, 首次按该策略选择时构建;
+    Team 变更时向各堆压入新条目, 旧条目通过版本号惰性删除, 过期条目过多时整体重建堆.
+    选择时依次弹出堆顶, 只需跳过被排除的 Team, 开销为 O((k + 过期条目) log n), k 为被排除的 Team 数;
+    不可索引的策略 (如加权随机) 需要遍历全部候选, 开销为 O(n log n)
+    """
+
+    # 定期对账间隔 (秒)
+    RECONCILE_SECONDS = 300
+
+    def __init__(self):
+        """初始化席位分配索引"""
+        self._slots: Dict[int, _TeamSlot] = {}
+        # 策略名称 -> 最小堆: (排序键, 版本号, team_id)
+        self._heaps: Dict[str, List[tuple]] = {}
+        self._versions = itertools.count()
+        # 状态已变更、需要从数据库重新加载的 Team
+        self._dirty: Set[int] = set()
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.picks = 0
+        self.refreshes = 0
+        self.last_reconcile: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _sort_key(team_id: int, expires_at: Optional[datetime]) -> tuple:
+        # SQLite 升序排序时 NULL 在最前
+        return (expires_at or datetime.min, team_id)
+
+    def _remove(self, team_id: int):
+        # 堆中的条目因找不到对应 Team 而在弹出时丢弃
+        self._slots.pop(team_id, None)
+
+    def _push(self, team_id: int, slot: _TeamSlot):
+        """Team 变更后向所有已构建的堆压入新条目"""
+        slot.version = next(self._versions)
+        for name, heap in self._heaps.items():
+            if len(heap) >= 2 * len(self._slots) + 64:
+                # 过期条目过多, 直接重建 (新版本已包含在内)
+                self._build_heap(get_strategy(name))
+                continue
+            heapq.heappush(heap, (get_strategy(name).index_key(slot.candidate), slot.version, team_id))
+
+    def _build_heap(self, strategy: SelectionStrategy) -> List[tuple]:
+        heap = [
+            (strategy.index_key(slot.candidate), slot.version, team_id)
+            for team_id, slot in self._slots.items()
+        ]
+        heapq.heapify(heap)
+        self._heaps[strategy.name] = heap
+        return heap
+
+    def _put(self, team_id: int, candidate: TeamCandidate, account_id: Optional[str], emails: Set[str]):
+        self._remove(team_id)
+        if candidate.free <= 0:
+            return
+        slot = _TeamSlot(self._sort_key(team_id, candidate.expires_at), candidate, account_id, emails, 0)
+        self._slots[team_id] = slot
+        self._push(team_id, slot)
+
+    async def _load(self, db_session: AsyncSession, team_ids: Optional[Iterable[int]] = None) -> Dict[int, tuple]:
+        """
+        从数据库加载可分配的 Team 及其已兑换邮箱
+
+        Returns:
+            team_id -> (候选 Team 快照, account_id, 邮箱集合)
+        """
+        stmt = select(
+            Team.id, Team.expires_at, Team.current_members, Team.max_members, Team.account_id, Team.error_count
+        ).where(
+            Team.status == "active",
+            Team.current_members < Team.max_members
+        )
+        if team_ids is not None:
+            stmt = stmt.where(Team.id.in_(list(team_ids)))
+        result = await db_session.execute(stmt)
+
+        loaded = {}
+        for team_id, expires_at, current_members, max_members, account_id, error_count in result.all():
+            candidate = TeamCandidate(
+                team_id, expires_at, (max_members or 0) - (current_members or 0), max_members or 0, error_count or 0
+            )
+            loaded[team_id] = (candidate, account_id, set())
+
+        if loaded:
+            stmt = select(RedemptionRecord.team_id, RedemptionRecord.email).where(
+                RedemptionRecord.team_id.in_(list(loaded.keys()))
+            )
+            result = await db_session.execute(stmt)
+            for team_id, email in result.all():
+                loaded[team_id][2].add(email)
+        return loaded
+
+    async def rebuild(self, db_session: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        """
+        从数据库全量重建索引 (同时用于对账)
+
+        Returns:
+            结果字典,包含 teams, drift (与重建前不一致的 Team 数)
+        """
+        if db_session is None:
+            async with AsyncSessionLocal() as own_session:
+                return await self.rebuild(own_session)
+
+        async with self._lock:
+            dirty_before = set(self._dirty)
+            loaded = await self._load(db_session)
+
+            drift = 0
+            if self._loaded:
+                for team_id in set(loaded) | set(self._slots):
+                    if team_id in dirty_before:
+                        continue
+                    slot = self._slots.get(team_id)
+                    fresh = loaded.get(team_id)
+                    if slot is None or fresh is None or slot.free != fresh[0].free or slot.emails != fresh[2]:
+                        drift += 1
+
+            self._slots.clear()
+            self._heaps.clear()
+            for team_id, (candidate, account_id, emails) in loaded.items():
+                self._put(team_id, candidate, account_id, emails)
+            self._dirty -= dirty_before
+            self._loaded = True
+
+        if drift:
+            logger.warning(f"席位索引对账发现 {drift} 个 Team 与数据库不一致, 已按数据库修正")
+        self.last_reconcile = {"teams": len(self._slots), "drift": drift}
+        return self.last_reconcile
+
+    async def _refresh_dirty(self, db_session: AsyncSession):
+        """重新加载状态已变更的 Team"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            team_ids = set(self._dirty)
+            self._dirty -= team_ids
+            loaded = await self._load(db_session, team_ids)
+            for team_id in team_ids:
+                fresh = loaded.get(team_id)
+                if fresh is None:
+                    self._remove(team_id)
+                else:
+                    self._put(team_id, *fresh)
+            self.refreshes += 1
+
+    async def pick(
+        self,
+        db_session: AsyncSession,
+        email: Optional[str] = None,
+        exclude_team_ids: Optional[Iterable[int]] = None,
+        exclude_account_ids: Optional[Iterable[str]] = None,
+        strategy: Optional[SelectionStrategy] = None
+    ) -> Dict[str, Any]:
+        """
+        按选择策略从有空位且该邮箱未加入过的 Team 中选择一个
+
+        Args:
+            db_session: 数据库会话 (仅在索引未构建或有待刷新的 Team 时使用)
+            email: 用户邮箱 (排除已加入的 Team)
+            exclude_team_ids: 额外排除的 Team ID
+            exclude_account_ids: 排除的 account_id (如处于熔断期的账号)
+            strategy: 选择策略 (默认过期时间最早优先)
+
+        Returns:
+            结果字典,包含 team_id, excluded_by_email (是否有 Team 因已加入而被排除)
+        """
+        if not self._loaded:
+            await self.rebuild(db_session)
+        if self._dirty:
+            await self._refresh_dirty(db_session)
+
+        self.picks += 1
+        strategy = strategy or get_strategy(None)
+        excluded_ids = set(exclude_team_ids or [])
+        excluded_accounts = set(exclude_account_ids or [])
+        excluded_by_email = False
+
+        def is_eligible(team_id: int, slot: _TeamSlot) -> bool:
+            nonlocal excluded_by_email
+            if team_id in excluded_ids:
+                return False
+            if email and email in slot.emails:
+                excluded_by_email = True
+                return False
+            return slot.account_id not in excluded_accounts
+
+        if not strategy.indexed:
+            # 不可索引的策略按过期时间升序传入全部候选
+            slots = sorted(self._slots.items(), key=lambda item: item[1].sort_key)
+            chosen = strategy.choose(
+                (slot.candidate for team_id, slot in slots if is_eligible(team_id, slot)), get_now()
+            )
+            return {"team_id": chosen.team_id if chosen else None, "excluded_by_email": excluded_by_email}
+
+        heap = self._heaps.get(strategy.name)
+        if heap is None:
+            heap = self._build_heap(strategy)
+
+        chosen_id = None
+        popped = []
+        while heap:
+            entry = heapq.heappop(heap)
+            _, version, team_id = entry
+            slot = self._slots.get(team_id)
+            if slot is None or slot.version != version:
+                # 过期条目直接丢弃
+                continue
+            popped.append(entry)
+            if is_eligible(team_id, slot):
+                chosen_id = team_id
+                break
+
+        # 被排除和选中的 Team 仍然有效, 放回堆中
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        return {"team_id": chosen_id, "excluded_by_email": excluded_by_email}
+
+    def on_claimed(self, team_id: int, email: str):
+        """兑换占位成功后更新索引 (空位减一并记录邮箱)"""
+        slot = self._slots.get(team_id)
+        if slot is None:
+            return
+        slot.emails.add(email)
+        slot.candidate.free -= 1
+        if slot.free <= 0:
+            self._remove(team_id)
+        else:
+            # 空位数变化会影响部分策略的排序键
+            self._push(team_id, slot)
+
+    def invalidate(self, team_id: Optional[int]):
+        """标记 Team 状态已变更, 下次选择前从数据库重新加载"""
+        if team_id is not None:
+            self._dirty.add(team_id)
+
+    def start(self):
+        """启动定期对账任务"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        """停止定期对账任务"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _reconcile_loop(self):
+        """定期全量对账 (首次执行即为启动时构建)"""
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"席位索引对账失败: {e}")
+            await asyncio.sleep(self.RECONCILE_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            "loaded": self._loaded,
+            "teams": len(self._slots),
+            "free_seats": sum(slot.free for slot in self._slots.values()),
+            "dirty": len(self._dirty),
+            "picks": self.picks,
+            "refreshes": self.refreshes,
+            "last_reconcile": self.last_reconcile
+        }
+
+
+# 创建全局实例
+seat_allocator = SeatAllocator()
+
+
+# 会话中已写入但尚未提交的 Team ID
+_PENDING_KEY = "seat_allocator_changed_teams"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_teams(session: Session, flush_context):
+    """记录通过 ORM 修改的 Team (覆盖同步、导入、编辑、成员管理等所有路径)"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Team):
+            session.info.setdefault(_PENDING_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_teams(session: Session):
+    """
+    事务提交后再标记索引需要刷新
+    在 flush 时标记会让并发的刷新读到提交前的数据并清除标记, 索引直到下次全量对账前都是旧的
+    """
+    for team_id in session.info.pop(_PENDING_KEY, ()):
+        seat_allocator.invalidate(team_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_teams(session: Session):
+    """事务回滚后数据库未变化, 丢弃记录"""
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,241 @@
+"""
+Team 选择策略离线模拟
+在合成的 Team 池上回放兑换请求序列, 对比各选择策略的成功率、失败数和换 Team 次数
+
+用法:
+    python -m app.services.selection_simulator --teams 50 --requests 2000 --days 30
+    python -m app.services.selection_simulator --trace trace.json
+
+trace.json 为兑换请求列表, 每项包含 at (ISO 时间) 和 email
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from app.services.team_selection import (
+    TeamCandidate,
+    SelectionStrategy,
+    STRATEGY_CLASSES,
+    WeightedHealthStrategy
+)
+
+
+class SimulatedTeam:
+    """模拟 Team"""
+
+    def __init__(self, team_id: int, expires_at: datetime, max_members: int, failure_rate: float):
+        self.team_id = team_id
+        self.expires_at = expires_at
+        self.max_members = max_members
+        self.failure_rate = failure_rate
+        self.members = 0
+        self.error_count = 0
+        self.status = "active"
+        self.emails = set()
+
+
+class SelectionSimulator:
+    """选择策略模拟器"""
+
+    # 与兑换流程一致: 单次兑换最多尝试的 Team 数
+    MAX_ATTEMPTS = 3
+    # 与 TeamService 一致: 连续出错次数达到后标记为 error
+    ERROR_THRESHOLD = 3
+
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+
+    def generate_pool(
+        self,
+        team_count: int,
+        start: datetime,
+        days: int,
+        rng: random.Random
+    ) -> List[Dict[str, Any]]:
+        """生成合成 Team 池 (过期时间、席位数和失败率随机分布)"""
+        pool = []
+        for team_id in range(1, team_count + 1):
+            pool.append({
+                "team_id": team_id,
+                "expires_at": start + timedelta(hours=rng.uniform(6, days * 24 * 2)),
+                "max_members": rng.choice([5, 6, 6, 6, 10, 20]),
+                # 大部分 Team 健康, 少量 Team 频繁出错
+                "failure_rate": rng.betavariate(1, 12) if rng.random() > 0.1 else rng.uniform(0.3, 0.9)
+            })
+        return pool
+
+    def generate_trace(
+        self,
+        request_count: int,
+        start: datetime,
+        days: int,
+        rng: random.Random,
+        repeat_ratio: float = 0.1
+    ) -> List[Dict[str, Any]]:
+        """生成合成兑换请求序列 (按时间排序, 部分用户会再次兑换)"""
+        trace = []
+        emails = []
+        for i in range(request_count):
+            if emails and rng.random() < repeat_ratio:
+                email = rng.choice(emails)
+            else:
+                email = f"user{i}@example.com"
+                emails.append(email)
+            trace.append({"at": start + timedelta(hours=rng.uniform(0, days * 24)), "email": email})
+        trace.sort(key=lambda item: item["at"])
+        return trace
+
+    def run_strategy(
+        self,
+        strategy: SelectionStrategy,
+        pool: List[Dict[str, Any]],
+        trace: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        在 Team 池上回放请求序列
+
+        Returns:
+            统计结果字典
+        """
+        rng = random.Random(self.seed)
+        if isinstance(strategy, WeightedHealthStrategy):
+            strategy.rng = random.Random(self.seed)
+
+        teams = [
+            SimulatedTeam(item["team_id"], item["expires_at"], item["max_members"], item["failure_rate"])
+            for item in pool
+        ]
+        capacity = sum(team.max_members for team in teams)
+
+        success = 0
+        failures = 0
+        reassignments = 0
+        lifetime_days = 0.0
+
+        for request in trace:
+            now = request["at"]
+            email = request["email"]
+            excluded = set()
+            served = False
+
+            for attempt in range(self.MAX_ATTEMPTS):
+                candidates = [
+                    TeamCandidate(team.team_id, team.expires_at, team.max_members - team.members,
+                                  team.max_members, team.error_count)
+                    for team in sorted(teams, key=lambda t: (t.expires_at, t.team_id))
+                    if team.status == "active"
+                    and team.expires_at > now
+                    and team.members < team.max_members
+                    and email not in team.emails
+                    and team.team_id not in excluded
+                ]
+                chosen = strategy.choose(iter(candidates), now)
+                if chosen is None:
+                    break
+
+                team = teams[chosen.team_id - 1]
+                if attempt > 0:
+                    reassignments += 1
+
+                if rng.random() < team.failure_rate:
+                    team.error_count += 1
+                    if team.error_count >= self.ERROR_THRESHOLD:
+                        team.status = "error"
+                    excluded.add(team.team_id)
+                    continue
+
+                team.members += 1
+                team.error_count = 0
+                team.emails.add(email)
+                lifetime_days += (team.expires_at - now).total_seconds() / 86400
+                success += 1
+                served = True
+                break
+
+            if not served:
+                failures += 1
+
+        used = sum(team.members for team in teams)
+        return {
+            "strategy": strategy.name,
+            "requests": len(trace),
+            "success": success,
+            "failures": failures,
+            "reassignments": reassignments,
+            "success_rate": round(success / len(trace), 4) if trace else 0.0,
+            "fill_rate": round(used / capacity, 4) if capacity else 0.0,
+            "avg_lifetime_days": round(lifetime_days / success, 2) if success else 0.0,
+            "error_teams": sum(1 for team in teams if team.status == "error")
+        }
+
+    def run(
+        self,
+        team_count: int = 50,
+        request_count: int = 2000,
+        days: int = 30,
+        trace: Optional[List[Dict[str, Any]]] = None,
+        strategies: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        对每个策略执行一次模拟 (使用相同的 Team 池和请求序列)
+
+        Returns:
+            各策略的统计结果列表
+        """
+        rng = random.Random(self.seed)
+        start = trace[0]["at"] if trace else datetime(2025, 1, 1)
+        pool = self.generate_pool(team_count, start, days, rng)
+        if trace is None:
+            trace = self.generate_trace(request_count, start, days, rng)
+
+        results = []
+        for name in strategies or list(STRATEGY_CLASSES.keys()):
+            results.append(self.run_strategy(STRATEGY_CLASSES[name](), pool, trace))
+        return results
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """从 JSON 文件加载兑换请求序列"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    trace = [{"at": datetime.fromisoformat(item["at"]), "email": item["email"]} for item in items]
+    trace.sort(key=lambda item: item["at"])
+    return trace
+
+
+def print_results(results: List[Dict[str, Any]]):
+    """以表格形式输出模拟结果"""
+    columns = [
+        ("strategy", "策略"),
+        ("success_rate", "成功率"),
+        ("fill_rate", "席位填充率"),
+        ("failures", "失败数"),
+        ("reassignments", "换 Team 次数"),
+        ("avg_lifetime_days", "平均剩余天数"),
+        ("error_teams", "异常 Team 数")
+    ]
+    print(" | ".join(title for _, title in columns))
+    for result in results:
+        print(" | ".join(str(result[key]) for key, _ in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Team 选择策略离线模拟")
+    parser.add_argument("--teams", type=int, default=50, help="合成 Team 数量")
+    parser.add_argument("--requests", type=int, default=2000, help="合成兑换请求数量")
+    parser.add_argument("--days", type=int, default=30, help="请求分布的天数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--trace", help="兑换请求序列 JSON 文件 (不指定则随机生成)")
+    parser.add_argument("--strategy", action="append", choices=list(STRATEGY_CLASSES.keys()), help="只模拟指定策略")
+    args = parser.parse_args()
+
+    simulator = SelectionSimulator(seed=args.seed)
+    print_results(simulator.run(
+        team_count=args.teams,
+        request_count=args.requests,
+        days=args.days,
+        trace=load_trace(args.trace) if args.trace else None,
+        strategies=args.strategy
+    ))
@@ -16,6 +16,8 @@ class SettingsService:
 
     def __init__(self):
         self._cache: Dict[str, str] = {}
+        # 数据库中不存在的配置项, 避免热路径上反复查询缺失的键 (写入时移除)
+        self._missing: set = set()
 
     async def get_setting(self, session: AsyncSession, key: str, default: Optional[str] = None) -> Optional[str]:
         """
@@ -32,6 +34,8 @@ class SettingsService:
         # 先从缓存获取
         if key in self._cache:
             return self._cache[key]
+        if key in self._missing:
+            return default
 
         # 从数据库获取
         result = await session.execute(
@@ -43,8 +47,30 @@ class SettingsService:
             self._cache[key] = setting.value
             return setting.value
 
+        self._missing.add(key)
         return default
 
+    async def get_int_setting(self, session: AsyncSession, key: str, default: int) -> int:
+        """
+        获取整数类型的配置项
+
+        Args:
+            session: 数据库会话
+            key: 配置项键名
+            default: 默认值 (配置缺失或无法解析时使用)
+
+        Returns:
+            配置项的整数值
+        """
+        value = await self.get_setting(session, key)
+        if value is None or str(value).strip() == "":
+            return default
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            logger.warning(f"配置项 {key} 的值 {value!r} 不是有效整数, 使用默认值 {default}")
+            return default
+
     async def get_all_settings(self, session: AsyncSession) -> Dict[str, str]:
         """
         获取所有配置项
@@ -91,6 +117,7 @@ class SettingsService:
 
             # 更新缓存
             self._cache[key] = value
+            self._missing.discard(key)
 
             logger.info(f"配置项 {key} 已更新")
             return True
@@ -128,6 +155,7 @@ class SettingsService:
 
             # 更新缓存
             self._cache.update(settings)
+            self._missing.difference_update(settings.keys())
 
             logger.info(f"批量更新了 {len(settings)} 个配置项")
             return True
@@ -140,6 +168,7 @@ class SettingsService:
     def clear_cache(self):
         """清空缓存"""
         self._cache.clear()
+        self._missing.clear()
         logger.info("配置缓存已清空")
 
     async def get_proxy_config(self, session: AsyncSession) -> Dict[str, str]:
@@ -181,6 +210,101 @@ class SettingsService:
 
         return await self.update_settings(session, settings)
 
+    async def get_rate_limit_config(self, session: AsyncSession) -> Dict[str, int]:
+        """
+        获取上游请求限流配置 (每分钟请求数, 0 表示不限制)
+
+        对应的系统设置键 (未设置时均默认为 0, 即升级后保持原有的不限流行为):
+            rate_limit_global_per_minute: 所有上游请求合计
+            rate_limit_proxy_per_minute: 每个代理出口 (或直连)
+            rate_limit_account_per_minute: 每个 Team 账号
+
+        Returns:
+            限流配置字典
+        """
+        return {
+            "global_per_minute": await self.get_int_setting(session, "rate_limit_global_per_minute", 0),
+            "proxy_per_minute": await self.get_int_setting(session, "rate_limit_proxy_per_minute", 0),
+            "account_per_minute": await self.get_int_setting(session, "rate_limit_account_per_minute", 0)
+        }
+
+    async def update_rate_limit_config(
+        self,
+        session: AsyncSession,
+        global_per_minute: int,
+        proxy_per_minute: int,
+        account_per_minute: int
+    ) -> bool:
+        """
+        更新上游请求限流配置
+
+        Args:
+            session: 数据库会话
+            global_per_minute: 全局每分钟请求数
+            proxy_per_minute: 每个代理出口每分钟请求数
+            account_per_minute: 每个账号每分钟请求数
+
+        Returns:
+            是否更新成功
+        """
+        settings = {
+            "rate_limit_global_per_minute": str(global_per_minute),
+            "rate_limit_proxy_per_minute": str(proxy_per_minute),
+            "rate_limit_account_per_minute": str(account_per_minute)
+        }
+
+        return await self.update_settings(session, settings)
+
+    async def get_team_selection_strategy(self, session: AsyncSession) -> str:
+        """
+        获取自动分配 Team 的选择策略
+
+        Returns:
+            策略名称
+        """
+        from app.services.team_selection import DEFAULT_STRATEGY
+        return await self.get_setting(session, "team_selection_strategy", DEFAULT_STRATEGY)
+
+    async def update_team_selection_strategy(self, session: AsyncSession, strategy: str) -> bool:
+        """
+        更新自动分配 Team 的选择策略
+
+        Args:
+            session: 数据库会话
+            strategy: 策略名称
+
+        Returns:
+            是否更新成功
+        """
+        from app.services.team_selection import STRATEGY_CLASSES
+        if strategy not in STRATEGY_CLASSES:
+            logger.error(f"无效的 Team 选择策略: {strategy}")
+            return False
+        return await self.update_setting(session, "team_selection_strategy", strategy)
+
+    async def is_redeem_async_enabled(self, session: AsyncSession) -> bool:
+        """
+        是否开启异步兑换 (兑换请求入队后立即返回任务 ID)
+
+        Returns:
+            是否开启
+        """
+        value = await self.get_setting(session, "redeem_async_enabled", "false")
+        return str(value).lower() == "true"
+
+    async def update_redeem_async_enabled(self, session: AsyncSession, enabled: bool) -> bool:
+        """
+        更新异步兑换开关
+
+        Args:
+            session: 数据库会话
+            enabled: 是否开启
+
+        Returns:
+            是否更新成功
+        """
+        return await self.update_setting(session, "redeem_async_enabled", str(enabled).lower())
+
     async def get_log_level(self, session: AsyncSession) -> str:
         """
         获取日志级别
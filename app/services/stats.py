@@ -0,0 +1,97 @@
+"""
+统计服务
+通过 GROUP BY 在数据库中汇总 Team 和兑换码数量, 结果短暂缓存, 供管理页面展示
+"""
+import logging
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Team, RedemptionCode
+
+logger = logging.getLogger(__name__)
+
+
+class StatsService:
+    """统计服务类"""
+
+    # 统计结果缓存时间 (秒)
+    CACHE_SECONDS = 10
+
+    def __init__(self):
+        """初始化统计服务"""
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def _get_cached(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < self.CACHE_SECONDS:
+            return entry[1]
+        return None
+
+    def invalidate(self):
+        """清除统计缓存 (数据变更后需要立即反映时调用)"""
+        self._cache.clear()
+
+    async def get_team_stats(self, db_session: AsyncSession, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        按状态统计 Team 数量
+
+        Args:
+            db_session: 数据库会话
+            use_cache: 是否使用缓存
+
+        Returns:
+            统计字典,包含 total, available (active 且未满), by_status
+        """
+        if use_cache:
+            cached = self._get_cached("teams")
+            if cached is not None:
+                return cached
+
+        stmt = select(
+            Team.status,
+            func.count(Team.id),
+            func.sum(case((Team.current_members < Team.max_members, 1), else_=0))
+        ).group_by(Team.status)
+        result = await db_session.execute(stmt)
+
+        by_status = {}
+        available = 0
+        for team_status, count, not_full in result.all():
+            by_status[team_status] = count
+            if team_status == "active":
+                available = not_full or 0
+
+        stats = {"total": sum(by_status.values()), "available": available, "by_status": by_status}
+        self._cache["teams"] = (time.monotonic(), stats)
+        return stats
+
+    async def get_code_stats(self, db_session: AsyncSession, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        按状态统计兑换码数量
+
+        Args:
+            db_session: 数据库会话
+            use_cache: 是否使用缓存
+
+        Returns:
+            统计字典,包含 total, by_status
+        """
+        if use_cache:
+            cached = self._get_cached("codes")
+            if cached is not None:
+                return cached
+
+        stmt = select(RedemptionCode.status, func.count(RedemptionCode.id)).group_by(RedemptionCode.status)
+        result = await db_session.execute(stmt)
+
+        by_status = {code_status: count for code_status, count in result.all()}
+        stats = {"total": sum(by_status.values()), "by_status": by_status}
+        self._cache["codes"] = (time.monotonic(), stats)
+        return stats
+
+
+# 创建全局实例
+stats_service = StatsService()
@@ -0,0 +1,235 @@
+"""
+后台同步调度服务
+按 Team 的数据陈旧程度、状态和近期兑换活跃度定期挑选 Team 进行同步,
+并通过全局的每分钟上游请求预算限制同步速度
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import Team, RedemptionRecord
+from app.services.settings import settings_service
+from app.services.team import team_service
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+
+class SyncScheduler:
+    """后台同步调度器"""
+
+    # 调度循环间隔 (秒)
+    TICK_SECONDS = 30
+
+    # 默认配置
+    DEFAULT_INTERVAL_MINUTES = 30
+    DEFAULT_CALLS_PER_MINUTE = 30
+
+    # 不同状态的同步间隔系数 (相对于基础间隔), banned 永不同步
+    STATUS_INTERVAL_FACTORS = {
+        "active": 1.0,
+        "full": 0.5,
+        "error": 0.5,
+        "expired": 2.0
+    }
+
+    # 近期有兑换活动的 Team 同步间隔系数及统计窗口
+    ACTIVITY_INTERVAL_FACTOR = 0.5
+    ACTIVITY_WINDOW_MINUTES = 60
+
+    # 单次同步的上游请求数估算: 账户信息 + 成员首页 + 邀请列表
+    BASE_CALLS_PER_SYNC = 3
+
+    def __init__(self):
+        """初始化后台同步调度器"""
+        self._task: Optional[asyncio.Task] = None
+        self._window_started_at = 0.0
+        self._calls_in_window = 0
+        # 最近一次调度尝试时间 (同步失败时 last_sync 不会更新, 避免失败 Team 每轮都被重复挑选)
+        self._last_attempts: Dict[int, datetime] = {}
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """启动调度循环"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info("后台同步调度器已启动")
+
+    async def stop(self):
+        """停止调度循环"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("后台同步调度器已停止")
+
+    async def _run_loop(self):
+        """调度主循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"后台同步调度执行失败: {e}")
+            await asyncio.sleep(self.TICK_SECONDS)
+
+    def _remaining_budget(self, calls_per_minute: int) -> int:
+        """获取当前一分钟窗口内剩余的上游请求预算"""
+        now = time.monotonic()
+        if now - self._window_started_at >= 60:
+            self._window_started_at = now
+            self._calls_in_window = 0
+        return max(0, calls_per_minute - self._calls_in_window)
+
+    def _estimate_calls(self, current_members: Optional[int]) -> int:
+        """估算同步一个 Team 需要的上游请求数"""
+        extra_pages = max(0, ((current_members or 0) - 1) // max(1, settings.chatgpt_members_page_size))
+        return self.BASE_CALLS_PER_SYNC + extra_pages
+
+    async def _get_recent_activity(self, db_session: AsyncSession, now: datetime) -> Dict[int, int]:
+        """统计近期每个 Team 的兑换次数"""
+        since = now - timedelta(minutes=self.ACTIVITY_WINDOW_MINUTES)
+        stmt = select(
+            RedemptionRecord.team_id, func.count(RedemptionRecord.id)
+        ).where(
+            RedemptionRecord.redeemed_at >= since
+        ).group_by(RedemptionRecord.team_id)
+        result = await db_session.execute(stmt)
+        return {team_id: count for team_id, count in result.all()}
+
+    async def select_due_teams(
+        self,
+        db_session: AsyncSession,
+        interval_minutes: int,
+        budget: int
+    ) -> List[Dict[str, Any]]:
+        """
+        挑选需要同步的 Team (按陈旧程度排序, 受请求预算限制)
+
+        Args:
+            db_session: 数据库会话
+            interval_minutes: active Team 的基础同步间隔 (分钟)
+            budget: 本次可用的上游请求数
+
+        Returns:
+            待同步 Team 列表, 每项包含 team_id, email, score, cost
+        """
+        now = get_now()
+        activity = await self._get_recent_activity(db_session, now)
+
+        stmt = select(
+            Team.id, Team.email, Team.status, Team.last_sync, Team.current_members
+        ).where(Team.status != "banned")
+        result = await db_session.execute(stmt)
+        rows = result.all()
+
+        # 清理已删除 (或已封禁, 不再调度) 的 Team 的尝试记录
+        team_ids = {row[0] for row in rows}
+        self._last_attempts = {
+            team_id: attempted_at
+            for team_id, attempted_at in self._last_attempts.items()
+            if team_id in team_ids
+        }
+
+        candidates = []
+        base_seconds = max(1, interval_minutes) * 60
+        for team_id, email, team_status, last_sync, current_members in rows:
+            factor = self.STATUS_INTERVAL_FACTORS.get(team_status or "active", 1.0)
+            if activity.get(team_id):
+                factor *= self.ACTIVITY_INTERVAL_FACTOR
+            target_seconds = base_seconds * factor
+
+            last_attempt = self._last_attempts.get(team_id)
+            if last_attempt and (last_sync is None or last_attempt > last_sync):
+                last_sync = last_attempt
+
+            # 从未同步过的 Team 优先级最高
+            if last_sync is None:
+                score = float("inf")
+            else:
+                score = (now - last_sync).total_seconds() / target_seconds
+
+            if score >= 1:
+                candidates.append({
+                    "team_id": team_id,
+                    "email": email,
+                    "score": score,
+                    "cost": self._estimate_calls(current_members)
+                })
+
+        candidates.sort(key=lambda c: c["score"], reverse=True)
+
+        selected = []
+        for candidate in candidates:
+            # 预算不足时跳过该 Team, 排在后面的小 Team 仍可使用剩余预算
+            if candidate["cost"] > budget:
+                continue
+            budget -= candidate["cost"]
+            selected.append(candidate)
+        return selected
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        执行一轮调度
+
+        Returns:
+            结果字典,包含 success, enabled, selected, success_count, failed_count, error
+        """
+        async with AsyncSessionLocal() as db_session:
+            enabled = await settings_service.get_setting(db_session, "sync_scheduler_enabled", "true")
+            if str(enabled).lower() != "true":
+                return {"success": True, "enabled": False, "selected": 0, "success_count": 0, "failed_count": 0, "error": None}
+
+            interval_minutes = await settings_service.get_int_setting(
+                db_session, "sync_scheduler_interval_minutes", self.DEFAULT_INTERVAL_MINUTES
+            )
+            calls_per_minute = await settings_service.get_int_setting(
+                db_session, "sync_scheduler_calls_per_minute", self.DEFAULT_CALLS_PER_MINUTE
+            )
+
+            budget = self._remaining_budget(calls_per_minute)
+            if budget <= 0:
+                return {"success": True, "enabled": True, "selected": 0, "success_count": 0, "failed_count": 0, "error": None}
+
+            due_teams = await self.select_due_teams(db_session, interval_minutes, budget)
+            if not due_teams:
+                return {"success": True, "enabled": True, "selected": 0, "success_count": 0, "failed_count": 0, "error": None}
+
+            self._calls_in_window += sum(t["cost"] for t in due_teams)
+            attempted_at = get_now()
+            for t in due_teams:
+                self._last_attempts[t["team_id"]] = attempted_at
+            logger.info(f"后台同步调度: 本轮同步 {len(due_teams)} 个 Team (剩余预算 {budget})")
+
+            sync_result = await team_service.sync_teams(
+                [(t["team_id"], t["email"]) for t in due_teams],
+                db_session
+            )
+
+        self.last_run = {
+            "success": sync_result["success"],
+            "enabled": True,
+            "selected": len(due_teams),
+            "success_count": sync_result["success_count"],
+            "failed_count": sync_result["failed_count"],
+            "finished_at": get_now().isoformat(),
+            "error": sync_result["error"]
+        }
+        return self.last_run
+
+
+# 创建全局实例
+sync_scheduler = SyncScheduler()
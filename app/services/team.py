@@ -2,42 +2,93 @@
 Team 管理服务
 用于管理 Team 账号的导入、同步、成员管理等功能
 """
+import asyncio
+import contextvars
 import logging
+import time
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from sqlalchemy import select, update, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.database import AsyncSessionLocal
 from app.models import Team, TeamAccount, RedemptionCode
 from app.services.chatgpt import ChatGPTService
 from app.services.encryption import encryption_service
+from app.services.search_index import search_index_service
+from app.services.settings import settings_service
 from app.utils.token_parser import TokenParser
 from app.utils.jwt_parser import JWTParser
+from app.utils.pagination import CountCache, decode_cursor, encode_cursor, keyset_condition
+from app.utils.single_flight import SingleFlight
 from app.utils.time_utils import get_now
+from app.utils.token_cache import TokenCache
 
 logger = logging.getLogger(__name__)
 
+# 同一 Team 的并发 Token 刷新只执行一次, 其余调用方等待其结果
+# (存在多个 TeamService 实例, 因此放在模块级共享)
+_token_refresh_flight = SingleFlight()
+# 最近一次成功刷新的结果: team_id -> (刷新时间, 新 AT)
+_recent_token_refreshes: Dict[int, tuple] = {}
+# 已解密的 AT 及其过期时间, 按密文哈希校验, 密文变更后自动失效
+_token_cache = TokenCache()
+# 当前任务正在刷新的 team_id (防止刷新失败处理中再次触发刷新导致等待自身)
+_refreshing_team_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("refreshing_team_id", default=None)
+
 
 class TeamService:
     """Team 管理服务类"""
 
+    # 批量同步并发配置
+    DEFAULT_SYNC_CONCURRENCY = 5
+    MAX_SYNC_CONCURRENCY = 32
+
+    # 刚刷新过的 AT 在该时间 (秒) 内直接复用, 避免稍晚到达的调用方再次刷新
+    TOKEN_REFRESH_REUSE_SECONDS = 30
+    # Token 相关字段 (其他调用方刷新后需要重新加载)
+    TOKEN_FIELDS = [
+        "access_token_encrypted",
+        "access_token_expires_at",
+        "session_token_encrypted",
+        "refresh_token_encrypted",
+        "status",
+        "error_count"
+    ]
+
     def __init__(self):
         """初始化 Team 管理服务"""
         from app.services.chatgpt import chatgpt_service
         self.chatgpt_service = chatgpt_service
         self.token_parser = TokenParser()
         self.jwt_parser = JWTParser()
+        # 列表总数缓存 (游标翻页时使用)
+        self._count_cache = CountCache()
 
-    async def _handle_api_error(self, result: Dict[str, Any], team: Team, db_session: AsyncSession) -> bool:
+    async def _handle_api_error(
+        self,
+        result: Dict[str, Any],
+        team: Team,
+        db_session: AsyncSession,
+        count_error: bool = True
+    ) -> bool:
         """
         检查结果是否表示账号被封禁、Token 失效或 Team 已满,如果是则更新状态
+
+        Args:
+            count_error: 非致命错误是否累加错误次数 (主动刷新时当前 AT 仍有效, 不应影响 Team 状态)
         
         Returns:
             bool: 是否已处理致命错误
         """
         error_code = result.get("error_code")
         error_msg = str(result.get("error", "")).lower()
+
+        # 0. 熔断期间请求未实际发出, 失败已在熔断前计入, 不再重复累加错误次数
+        if result.get("circuit_open"):
+            logger.info(f"Team {team.id} ({team.email}) 处于熔断期, 跳过错误处理")
+            return True
         
         # 1. 判定是否为“封号/永久失效”类致命错误
         # 明确的错误码匹配
@@ -96,6 +147,8 @@ class TeamService:
         # 4. 处理其他所有非致命错误 (累加错误次数)
         # 只要走到这里，说明不是封号也不是满员，统统记录错误
         logger.warning(f"Team {team.id} ({team.email}) 请求出错 (code={error_code}, msg={error_msg})")
+        if not count_error:
+            return True
         
         team.error_count = (team.error_count or 0) + 1
         if team.error_count >= 3:
@@ -126,7 +179,13 @@ class TeamService:
             team.status = "active"
         await db_session.commit()
 
-    async def ensure_access_token(self, team: Team, db_session: AsyncSession, force_refresh: bool = False) -> Optional[str]:
+    async def ensure_access_token(
+        self,
+        team: Team,
+        db_session: AsyncSession,
+        force_refresh: bool = False,
+        proactive: bool = False
+    ) -> Optional[str]:
         """
         确保 AT Token 有效,如果过期则尝试刷新
         
@@ -134,16 +193,17 @@ class TeamService:
             team: Team 对象
             db_session: 数据库会话
             force_refresh: 是否强制刷新 (忽略过期检查)
+            proactive: 是否为过期前的主动刷新 (当前 AT 未过期时刷新失败不降级 Team 状态)
             
         Returns:
             有效的 AT Token, 刷新失败返回 None
         """
         try:
-            # 1. 解密当前 Token
-            access_token = encryption_service.decrypt_token(team.access_token_encrypted)
+            # 1. 解密当前 Token (优先使用缓存)
+            access_token, expires_at = self._get_cached_access_token(team)
             
             # 2. 检查是否过期 (如果不强制刷新且未过期，则返回)
-            if not force_refresh and not self.jwt_parser.is_token_expired(access_token):
+            if not force_refresh and expires_at and get_now() <= expires_at:
                 return access_token
                 
             if force_refresh:
@@ -154,6 +214,111 @@ class TeamService:
             logger.error(f"解密或验证 Token 失败: {e}")
             access_token = None # 可能是解密失败，强制走刷新流程
 
+        return await self._refresh_access_token_once(team, db_session, force_refresh, proactive)
+
+    def _get_cached_access_token(self, team: Team) -> tuple:
+        """
+        获取 Team 的明文 AT 及其过期时间
+        缓存按 (team_id, 密文哈希) 校验, 存储的密文变更后自动重新解密
+
+        Returns:
+            (明文 AT, 过期时间), 无法解析过期时间时过期时间为 None
+        """
+        ciphertext = team.access_token_encrypted
+        if team.id is not None:
+            cached = _token_cache.get(team.id, ciphertext)
+            if cached is not None:
+                return cached
+
+        access_token = encryption_service.decrypt_token(ciphertext)
+        expires_at = self.jwt_parser.get_expiration_time(access_token)
+        if team.id is not None:
+            _token_cache.put(team.id, ciphertext, access_token, expires_at)
+        return access_token, expires_at
+
+    def get_token_cache_stats(self) -> Dict[str, Any]:
+        """获取 Token 缓存统计信息"""
+        return _token_cache.stats()
+
+    def _set_access_token(self, team: Team, access_token: str) -> None:
+        """加密写入 AT, 并同步记录其过期时间 (供主动刷新任务按索引查询)"""
+        team.access_token_encrypted = encryption_service.encrypt_token(access_token)
+        team.access_token_expires_at = self.jwt_parser.get_expiration_time(access_token)
+        if team.id is not None:
+            _token_cache.put(team.id, team.access_token_encrypted, access_token, team.access_token_expires_at)
+
+    async def _reload_token_fields(self, team: Team, db_session: AsyncSession) -> None:
+        """从数据库重新加载 Team 的 Token 相关字段 (其他调用方已完成刷新)"""
+        try:
+            await db_session.refresh(team, attribute_names=self.TOKEN_FIELDS)
+        except Exception as e:
+            logger.debug(f"重新加载 Team {team.id} Token 字段失败: {e}")
+
+    async def _refresh_access_token_once(
+        self,
+        team: Team,
+        db_session: AsyncSession,
+        force_refresh: bool = False,
+        proactive: bool = False
+    ) -> Optional[str]:
+        """
+        刷新 AT (同一 Team 的并发刷新合并为一次)
+        由第一个调用方执行刷新并写库, 其余调用方等待结果后重新加载 Token 字段
+
+        Returns:
+            新的 AT Token, 刷新失败返回 None
+        """
+        team_id = team.id
+        if _refreshing_team_id.get() == team_id:
+            logger.warning(f"Team {team_id} 正在刷新 Token, 跳过嵌套刷新")
+            return None
+
+        recent = _recent_token_refreshes.get(team_id)
+        if recent and not force_refresh:
+            refreshed_at, new_at = recent
+            if time.monotonic() - refreshed_at < self.TOKEN_REFRESH_REUSE_SECONDS:
+                logger.info(f"Team {team_id} 的 Token 刚刚已被刷新, 直接复用")
+                await self._reload_token_fields(team, db_session)
+                return new_at
+
+        is_leader = False
+
+        async def do_refresh() -> Optional[str]:
+            nonlocal is_leader
+            is_leader = True
+            _refreshing_team_id.set(team_id)
+            new_at = await self._refresh_access_token(team, db_session, proactive)
+            if new_at:
+                _recent_token_refreshes[team_id] = (time.monotonic(), new_at)
+            return new_at
+
+        try:
+            new_at = await _token_refresh_flight.do(team_id, do_refresh)
+        except Exception as e:
+            if is_leader:
+                raise
+            logger.error(f"等待 Team {team_id} Token 刷新结果失败: {e}")
+            return None
+
+        if not is_leader:
+            logger.info(f"Team {team_id} 的 Token 由其他请求刷新, 复用刷新结果")
+            await self._reload_token_fields(team, db_session)
+        return new_at
+
+    async def _refresh_access_token(self, team: Team, db_session: AsyncSession, proactive: bool = False) -> Optional[str]:
+        """
+        依次尝试使用 session_token 和 refresh_token 刷新 AT, 并写入数据库
+
+        Args:
+            proactive: 是否为过期前的主动刷新
+
+        Returns:
+            新的 AT Token, 刷新失败返回 None
+        """
+        # 主动刷新时当前 AT 仍未过期: 失败只记录日志, 由调度器稍后重试, Team 继续正常使用
+        expires_at = team.access_token_expires_at
+        keep_status = proactive and expires_at is not None and expires_at > get_now()
+
         # 3. 尝试使用 session_token 刷新
         if team.session_token_encrypted:
             session_token = encryption_service.decrypt_token(team.session_token_encrypted)
@@ -164,19 +329,20 @@ class TeamService:
                 new_at = refresh_result["access_token"]
                 new_st = refresh_result.get("session_token")
                 logger.info(f"Team {team.id} 通过 session_token 成功刷新 AT")
-                team.access_token_encrypted = encryption_service.encrypt_token(new_at)
+                self._set_access_token(team, new_at)
                 
                 # 如果返回了新的 session_token,予以更新
                 if new_st and new_st != session_token:
                     logger.info(f"Team {team.id} Session Token 已更新")
                     team.session_token_encrypted = encryption_service.encrypt_token(new_st)
                 
-                # 成功刷新，重置错误状态
+                # 成功刷新，重置错误状态; 新 Token 可用, 由旧 Token 失败打开的熔断器一并重置
+                self.chatgpt_service.reset_circuit(team.account_id)
                 await self._reset_error_status(team, db_session)
                 return new_at
             else:
                 # 检查是否为致命错误 (如 token_invalidated)
-                if await self._handle_api_error(refresh_result, team, db_session):
+                if await self._handle_api_error(refresh_result, team, db_session, count_error=not keep_status):
                     return None
 
         # 4. 尝试使用 refresh_token 刷新
@@ -189,18 +355,21 @@ class TeamService:
                 new_at = refresh_result["access_token"]
                 new_rt = refresh_result.get("refresh_token")
                 logger.info(f"Team {team.id} 通过 refresh_token 成功刷新 AT")
-                team.access_token_encrypted = encryption_service.encrypt_token(new_at)
+                self._set_access_token(team, new_at)
                 if new_rt:
                     team.refresh_token_encrypted = encryption_service.encrypt_token(new_rt)
-                # 成功刷新，重置错误状态
+                # 成功刷新，重置错误状态; 新 Token 可用, 由旧 Token 失败打开的熔断器一并重置
+                self.chatgpt_service.reset_circuit(team.account_id)
                 await self._reset_error_status(team, db_session)
                 return new_at
             else:
                 # 检查是否为致命错误 (如 account_deactivated)
-                if await self._handle_api_error(refresh_result, team, db_session):
+                if await self._handle_api_error(refresh_result, team, db_session, count_error=not keep_status):
                     return None
         
-        if team.status != "banned":
+        if keep_status:
+            logger.warning(f"Team {team.id} 主动刷新 Token 失败, 当前 AT 有效至 {expires_at}, 保持现有状态")
+        elif team.status != "banned":
             logger.error(f"Team {team.id} Token 已过期且无法刷新，标记为 expired")
             team.status = "expired"
             team.error_count = (team.error_count or 0) + 1
@@ -429,6 +598,7 @@ class TeamService:
                 team = Team(
                     email=email,
                     access_token_encrypted=encrypted_token,
+                    access_token_expires_at=self.jwt_parser.get_expiration_time(access_token),
                     refresh_token_encrypted=encrypted_rt,
                     session_token_encrypted=encrypted_st,
                     client_id=client_id,
@@ -569,7 +739,10 @@ class TeamService:
 
             # 3. 更新 Token
             if access_token:
-                team.access_token_encrypted = encryption_service.encrypt_token(access_token)
+                self._set_access_token(team, access_token)
+                # Token 已更换, 之前的失败不再代表账号当前状态
+                self.chatgpt_service.reset_circuit(team.account_id)
+                _recent_token_refreshes.pop(team.id, None)
             if refresh_token:
                 team.refresh_token_encrypted = encryption_service.encrypt_token(refresh_token)
             if session_token:
@@ -901,19 +1074,20 @@ class TeamService:
                     "error": "该 Token 没有关联任何 Team 账户"
                 }
 
-            # 5. 获取成员列表 (包含已加入和待加入)
-            members_result = await self.chatgpt_service.get_members(
-                access_token,
-                current_account["account_id"],
-                db_session,
-                identifier=team.email
-            )
-            
-            invites_result = await self.chatgpt_service.get_invites(
-                access_token,
-                current_account["account_id"],
-                db_session,
-                identifier=team.email
+            # 5. 获取成员列表 (包含已加入和待加入, 两个请求并发发起)
+            members_result, invites_result = await asyncio.gather(
+                self.chatgpt_service.get_members(
+                    access_token,
+                    current_account["account_id"],
+                    db_session,
+                    identifier=team.email
+                ),
+                self.chatgpt_service.get_invites(
+                    access_token,
+                    current_account["account_id"],
+                    db_session,
+                    identifier=team.email
+                )
             )
 
             current_members = 0
@@ -999,23 +1173,57 @@ class TeamService:
 
     async def sync_all_teams(
         self,
-        db_session: AsyncSession
+        db_session: AsyncSession,
+        concurrency: Optional[int] = None
     ) -> Dict[str, Any]:
         """
-        同步所有 Team 的信息
+        同步所有 Team 的信息 (多个 worker 并发同步)
 
         Args:
-            db_session: 数据库会话
+            db_session: 数据库会话 (仅用于读取 Team 列表和配置)
+            concurrency: 并发 worker 数量 (可选, 默认读取 sync_concurrency 配置)
 
         Returns:
-            结果字典,包含 success, total, success_count, failed_count, results
+            结果字典,包含 success, total, success_count, failed_count, results, elapsed
         """
         try:
-            # 1. 查询所有 Team
-            stmt = select(Team)
+            # 查询所有 Team (只取 ID 和邮箱, 具体同步由各 worker 使用独立会话完成)
+            stmt = select(Team.id, Team.email).order_by(Team.id)
             result = await db_session.execute(stmt)
-            teams = result.scalars().all()
+            teams = [(team_id, team_email) for team_id, team_email in result.all()]
+
+            return await self.sync_teams(teams, db_session, concurrency=concurrency)
+
+        except Exception as e:
+            logger.error(f"批量同步失败: {e}")
+            return {
+                "success": False,
+                "total": 0,
+                "success_count": 0,
+                "failed_count": 0,
+                "results": [],
+                "elapsed": 0.0,
+                "error": f"批量同步失败: {str(e)}"
+            }
+
+    async def sync_teams(
+        self,
+        teams: List[tuple],
+        db_session: AsyncSession,
+        concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        并发同步指定的 Team 列表
 
+        Args:
+            teams: (team_id, email) 列表, 结果按此顺序返回
+            db_session: 数据库会话 (仅用于读取配置)
+            concurrency: 并发 worker 数量 (可选, 默认读取 sync_concurrency 配置)
+
+        Returns:
+            结果字典,包含 success, total, success_count, failed_count, results, elapsed
+        """
+        try:
             if not teams:
                 return {
                     "success": True,
@@ -1023,31 +1231,63 @@ class TeamService:
                     "success_count": 0,
                     "failed_count": 0,
                     "results": [],
+                    "elapsed": 0.0,
                     "error": None
                 }
 
-            # 2. 逐个同步
-            results = []
-            success_count = 0
-            failed_count = 0
+            # 1. 确定并发数
+            if concurrency is None:
+                concurrency = await settings_service.get_int_setting(
+                    db_session, "sync_concurrency", self.DEFAULT_SYNC_CONCURRENCY
+                )
+            concurrency = max(1, min(concurrency, self.MAX_SYNC_CONCURRENCY, len(teams)))
+
+            # 2. 启动 worker 并发同步
+            queue: asyncio.Queue = asyncio.Queue()
+            for index, (team_id, team_email) in enumerate(teams):
+                queue.put_nowait((index, team_id, team_email))
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(teams)
+            started_at = time.monotonic()
+
+            async def worker():
+                # 每个 worker 使用独立的数据库会话, 避免并发共用同一个会话
+                async with AsyncSessionLocal() as worker_session:
+                    while True:
+                        try:
+                            index, team_id, team_email = queue.get_nowait()
+                        except asyncio.QueueEmpty:
+                            return
+
+                        try:
+                            sync_result = await self.sync_team_info(team_id, worker_session)
+                        except Exception as e:
+                            logger.error(f"同步 Team {team_id} 时发生异常: {e}")
+                            sync_result = {"success": False, "message": None, "error": str(e)}
+                        finally:
+                            # 释放已同步 Team 的对象, 防止 identity map 随 Team 数量增长
+                            if worker_session.in_transaction():
+                                await worker_session.rollback()
+                            worker_session.expunge_all()
+
+                        results[index] = {
+                            "team_id": team_id,
+                            "email": team_email,
+                            "success": sync_result["success"],
+                            "message": sync_result["message"],
+                            "error": sync_result["error"]
+                        }
 
-            for team in teams:
-                result = await self.sync_team_info(team.id, db_session)
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
 
-                if result["success"]:
-                    success_count += 1
-                else:
-                    failed_count += 1
-
-                results.append({
-                    "team_id": team.id,
-                    "email": team.email,
-                    "success": result["success"],
-                    "message": result["message"],
-                    "error": result["error"]
-                })
+            elapsed = round(time.monotonic() - started_at, 2)
+            success_count = sum(1 for r in results if r and r["success"])
+            failed_count = len(teams) - success_count
 
-            logger.info(f"批量同步完成: 总数 {len(teams)}, 成功 {success_count}, 失败 {failed_count}")
+            logger.info(
+                f"批量同步完成: 总数 {len(teams)}, 成功 {success_count}, 失败 {failed_count}, "
+                f"并发 {concurrency}, 耗时 {elapsed}s"
+            )
 
             return {
                 "success": True,
@@ -1055,6 +1295,7 @@ class TeamService:
                 "success_count": success_count,
                 "failed_count": failed_count,
                 "results": results,
+                "elapsed": elapsed,
                 "error": None
             }
 
@@ -1066,6 +1307,7 @@ class TeamService:
                 "success_count": 0,
                 "failed_count": 0,
                 "results": [],
+                "elapsed": 0.0,
                 "error": f"批量同步失败: {str(e)}"
             }
 
@@ -1699,41 +1941,53 @@ class TeamService:
         db_session: AsyncSession,
         page: int = 1,
         per_page: int = 20,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取所有 Team 列表 (用于管理员页面)
 
         Args:
             db_session: 数据库会话
-            page: 页码
+            page: 页码 (提供游标时仅用于显示)
             per_page: 每页数量
             search: 搜索关键词
+            cursor: 上一页返回的 next_cursor, 提供时从该位置继续查询 (不使用 OFFSET)
 
         Returns:
-            结果字典,包含 success, teams, total, total_pages, current_page, error
+            结果字典,包含 success, teams, total, total_pages, current_page, next_cursor, error
         """
         try:
             # 1. 构建查询语句
             stmt = select(Team)
-            
+            count_stmt = select(func.count(Team.id))
+
             # 2. 如果有搜索词,添加过滤条件
             if search:
                 from sqlalchemy import or_, cast, String
-                search_filter = f"%{search}%"
-                stmt = stmt.where(
-                    or_(
+                # 优先使用全文搜索索引, 不可用或关键词过短时回退到 LIKE
+                search_condition = search_index_service.match("teams", Team.id, search)
+                if search_condition is None:
+                    search_filter = f"%{search}%"
+                    search_condition = or_(
                         Team.email.ilike(search_filter),
                         Team.account_id.ilike(search_filter),
                         Team.team_name.ilike(search_filter),
                         cast(Team.id, String).ilike(search_filter)
                     )
-                )
+                stmt = stmt.where(search_condition)
+                count_stmt = count_stmt.where(search_condition)
+
+            # 3. 获取总数 (游标翻页时使用缓存的总数)
+            async def count_total() -> int:
+                count_result = await db_session.execute(count_stmt)
+                return count_result.scalar() or 0
 
-            # 3. 获取总数
-            count_stmt = select(func.count()).select_from(stmt.subquery())
-            count_result = await db_session.execute(count_stmt)
-            total = count_result.scalar() or 0
+            position = decode_cursor(cursor)
+            if position:
+                total = await self._count_cache.get_or_count(("teams", search or ""), count_total)
+            else:
+                total = await count_total()
 
             # 4. 计算分页
             import math
@@ -1742,13 +1996,17 @@ class TeamService:
                 page = 1
             if total_pages > 0 and page > total_pages:
                 page = total_pages
-            
-            offset = (page - 1) * per_page
 
-            # 5. 查询分页数据
-            final_stmt = stmt.order_by(Team.created_at.desc()).limit(per_page).offset(offset)
+            # 5. 查询分页数据 (多取一行用于判断是否有下一页)
+            final_stmt = stmt.order_by(Team.created_at.desc(), Team.id.desc()).limit(per_page + 1)
+            if position:
+                final_stmt = final_stmt.where(keyset_condition(Team.created_at, Team.id, position))
+            else:
+                final_stmt = final_stmt.offset((page - 1) * per_page)
             result = await db_session.execute(final_stmt)
             teams = result.scalars().all()
+            next_cursor = encode_cursor(teams[per_page - 1].created_at, teams[per_page - 1].id) if len(teams) > per_page else None
+            teams = teams[:per_page]
 
             # 构建返回数据
             team_list = []
@@ -1776,6 +2034,7 @@ class TeamService:
                 "total": total,
                 "total_pages": total_pages,
                 "current_page": page,
+                "next_cursor": next_cursor,
                 "error": None
             }
 
@@ -1867,6 +2126,8 @@ class TeamService:
             # 2. 删除 Team (级联删除 team_accounts 和 redemption_records)
             await db_session.delete(team)
             await db_session.commit()
+            _token_cache.invalidate(team_id)
+            _recent_token_refreshes.pop(team_id, None)
 
             logger.info(f"删除 Team {team_id} 成功")
 
@@ -0,0 +1,173 @@
+"""
+Team 选择策略
+自动分配 Team 时使用的可插拔选择策略, 通过系统设置 team_selection_strategy 切换
+"""
+import random
+from datetime import datetime
+from typing import Optional, Dict, Iterable, List
+
+
+class TeamCandidate:
+    """候选 Team 快照"""
+
+    __slots__ = ("team_id", "expires_at", "free", "max_members", "error_count")
+
+    def __init__(
+        self,
+        team_id: int,
+        expires_at: Optional[datetime],
+        free: int,
+        max_members: int,
+        error_count: int = 0
+    ):
+        self.team_id = team_id
+        self.expires_at = expires_at
+        self.free = free
+        self.max_members = max_members
+        self.error_count = error_count
+
+    def remaining_days(self, now: datetime) -> float:
+        """剩余有效天数 (过期时间未知时视为 0)"""
+        if self.expires_at is None:
+            return 0.0
+        return max(0.0, (self.expires_at - now).total_seconds() / 86400)
+
+
+class SelectionStrategy:
+    """选择策略基类, 候选 Team 按过期时间升序传入"""
+
+    name = ""
+    label = ""
+    # 是否可按 index_key 维护有序索引 (结果等同于 choose 选出排序键最小的候选)
+    indexed = False
+
+    def choose(self, candidates: Iterable[TeamCandidate], now: datetime) -> Optional[TeamCandidate]:
+        raise NotImplementedError
+
+    def index_key(self, candidate: TeamCandidate) -> tuple:
+        """候选 Team 的排序键, 越小越优先 (只依赖候选快照, 不随时间变化)"""
+        raise NotImplementedError
+
+
+def _expiry_key(candidate: TeamCandidate) -> tuple:
+    # 与 SQLite 升序排序一致, 过期时间为空的排在最前
+    return (candidate.expires_at or datetime.min, candidate.team_id)
+
+
+class EarliestExpiryStrategy(SelectionStrategy):
+    """过期时间最早优先 (优先用完即将过期的 Team)"""
+
+    name = "earliest_expiry"
+    label = "过期时间最早优先"
+    indexed = True
+
+    def choose(self, candidates: Iterable[TeamCandidate], now: datetime) -> Optional[TeamCandidate]:
+        return next(iter(candidates), None)
+
+    def index_key(self, candidate: TeamCandidate) -> tuple:
+        return _expiry_key(candidate)
+
+
+class LeastLoadedStrategy(SelectionStrategy):
+    """空位比例最高优先 (分散负载)"""
+
+    name = "least_loaded"
+    label = "负载最低优先"
+    indexed = True
+
+    def choose(self, candidates: Iterable[TeamCandidate], now: datetime) -> Optional[TeamCandidate]:
+        best = None
+        best_ratio = -1.0
+        for candidate in candidates:
+            ratio = candidate.free / max(1, candidate.max_members)
+            # 严格大于: 比例相同时保留过期时间更早的
+            if ratio > best_ratio:
+                best, best_ratio = candidate, ratio
+        return best
+
+    def index_key(self, candidate: TeamCandidate) -> tuple:
+        return (-(candidate.free / max(1, candidate.max_members)),) + _expiry_key(candidate)
+
+
+class MostRemainingLifetimeStrategy(SelectionStrategy):
+    """剩余有效期最长优先 (用户获得的可用时间最长)"""
+
+    name = "most_remaining_lifetime"
+    label = "剩余有效期最长优先"
+    indexed = True
+
+    def choose(self, candidates: Iterable[TeamCandidate], now: datetime) -> Optional[TeamCandidate]:
+        best = None
+        best_days = -1.0
+        for candidate in candidates:
+            days = candidate.remaining_days(now)
+            if days >= best_days:
+                best, best_days = candidate, days
+        return best
+
+    def index_key(self, candidate: TeamCandidate) -> tuple:
+        # 剩余天数随过期时间单调递增 (已过期的均为 0, 并列时 choose 保留排在最后即过期时间最晚的)
+        expires_at = candidate.expires_at
+        return (-expires_at.timestamp() if expires_at else float("inf"), -candidate.team_id)
+
+
+class WeightedHealthStrategy(SelectionStrategy):
+    """按空位数、健康度和剩余有效期加权随机选择"""
+
+    name = "weighted_health"
+    label = "按健康度加权"
+
+    # 剩余有效期达到该天数后不再加分
+    LIFETIME_FULL_DAYS = 30
+    # 剩余有效期权重下限, 避免即将过期的 Team 完全无法被选中
+    MIN_LIFETIME_WEIGHT = 0.05
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+
+    def weight(self, candidate: TeamCandidate, now: datetime) -> float:
+        health = 1 / (1 + max(0, candidate.error_count or 0))
+        lifetime = min(1.0, candidate.remaining_days(now) / self.LIFETIME_FULL_DAYS)
+        return candidate.free * health * max(self.MIN_LIFETIME_WEIGHT, lifetime)
+
+    def choose(self, candidates: Iterable[TeamCandidate], now: datetime) -> Optional[TeamCandidate]:
+        pool: List[TeamCandidate] = list(candidates)
+        if not pool:
+            return None
+        weights = [self.weight(candidate, now) for candidate in pool]
+        if sum(weights) <= 0:
+            return pool[0]
+        return self.rng.choices(pool, weights=weights, k=1)[0]
+
+
+DEFAULT_STRATEGY = EarliestExpiryStrategy.name
+
+STRATEGY_CLASSES = {
+    cls.name: cls
+    for cls in (EarliestExpiryStrategy, LeastLoadedStrategy, MostRemainingLifetimeStrategy, WeightedHealthStrategy)
+}
+
+_instances: Dict[str, SelectionStrategy] = {}
+
+
+def get_strategy(name: Optional[str]) -> SelectionStrategy:
+    """
+    获取选择策略实例 (未知名称时回退到默认策略)
+
+    Args:
+        name: 策略名称
+
+    Returns:
+        策略实例
+    """
+    if name not in STRATEGY_CLASSES:
+        name = DEFAULT_STRATEGY
+    strategy = _instances.get(name)
+    if strategy is None:
+        strategy = _instances[name] = STRATEGY_CLASSES[name]()
+    return strategy
+
+
+def list_strategies() -> List[Dict[str, str]]:
+    """获取所有可用策略 (用于设置页面)"""
+    return [{"name": name, "label": cls.label} for name, cls in STRATEGY_CLASSES.items()]
@@ -0,0 +1,220 @@
+"""
+Token 主动刷新服务
+按 teams.access_token_expires_at 索引定期挑选即将过期的 Team, 在过期前分批刷新 AT,
+使兑换等用户请求路径几乎不需要同步刷新 Token
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import Team
+from app.services.encryption import encryption_service
+from app.services.settings import settings_service
+from app.services.team import team_service
+from app.utils.jwt_parser import JWTParser
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefreshScheduler:
+    """Token 主动刷新调度器"""
+
+    # 调度循环间隔 (秒)
+    TICK_SECONDS = 60
+
+    # 默认配置
+    DEFAULT_MARGIN_MINUTES = 10
+    DEFAULT_BATCH_SIZE = 20
+
+    # 同时刷新的 Team 数
+    CONCURRENCY = 3
+    # 刷新失败后再次尝试的间隔 (分钟)
+    RETRY_MINUTES = 10
+    # 每轮回填过期时间的最大 Team 数 (升级前导入的 Team 该字段为空)
+    BACKFILL_BATCH_SIZE = 200
+
+    def __init__(self):
+        """初始化 Token 主动刷新调度器"""
+        self._task: Optional[asyncio.Task] = None
+        self.jwt_parser = JWTParser()
+        # 最近一次刷新尝试时间, 避免刷新失败 (或上游返回未更新的 Token) 的 Team 每轮都被重复挑选
+        self._last_attempts: Dict[int, datetime] = {}
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """启动调度循环"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info("Token 主动刷新调度器已启动")
+
+    async def stop(self):
+        """停止调度循环"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Token 主动刷新调度器已停止")
+
+    async def _run_loop(self):
+        """调度主循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Token 主动刷新执行失败: {e}")
+            await asyncio.sleep(self.TICK_SECONDS)
+
+    async def backfill_expires_at(self, db_session: AsyncSession) -> int:
+        """
+        为过期时间为空的 Team 解析并回填 AT 过期时间
+
+        Returns:
+            本次回填的 Team 数
+        """
+        stmt = select(Team.id, Team.access_token_encrypted).where(
+            Team.access_token_expires_at.is_(None),
+            Team.status != "banned"
+        ).limit(self.BACKFILL_BATCH_SIZE)
+        result = await db_session.execute(stmt)
+
+        filled = 0
+        for team_id, access_token_encrypted in result.all():
+            try:
+                access_token = encryption_service.decrypt_token(access_token_encrypted)
+                expires_at = self.jwt_parser.get_expiration_time(access_token)
+            except Exception as e:
+                logger.warning(f"解析 Team {team_id} 的 AT 过期时间失败: {e}")
+                expires_at = None
+            # 无法解析的 Token 视为已过期, 交由刷新流程处理
+            await db_session.execute(
+                update(Team).where(Team.id == team_id).values(access_token_expires_at=expires_at or datetime.min)
+            )
+            filled += 1
+
+        if filled:
+            await db_session.commit()
+            logger.info(f"已回填 {filled} 个 Team 的 AT 过期时间")
+        return filled
+
+    async def select_expiring_teams(
+        self,
+        db_session: AsyncSession,
+        margin_minutes: int,
+        batch_size: int
+    ) -> List[int]:
+        """
+        挑选即将过期且可以刷新的 Team (按过期时间升序)
+
+        Args:
+            db_session: 数据库会话
+            margin_minutes: 提前刷新的时间 (分钟)
+            batch_size: 本轮最多刷新的 Team 数
+
+        Returns:
+            Team ID 列表
+        """
+        now = get_now()
+        deadline = now + timedelta(minutes=margin_minutes)
+        retry_before = now - timedelta(minutes=self.RETRY_MINUTES)
+
+        # 退避已结束的记录不再需要 (已删除 Team 的记录也随之清理), 其余 Team 直接在查询中排除
+        self._last_attempts = {
+            team_id: attempted_at
+            for team_id, attempted_at in self._last_attempts.items()
+            if attempted_at > retry_before
+        }
+
+        stmt = select(Team.id).where(
+            Team.status != "banned",
+            Team.access_token_expires_at <= deadline,
+            or_(
+                Team.session_token_encrypted.isnot(None),
+                and_(Team.refresh_token_encrypted.isnot(None), Team.client_id.isnot(None))
+            )
+        )
+        if self._last_attempts:
+            stmt = stmt.where(Team.id.notin_(list(self._last_attempts)))
+        stmt = stmt.order_by(Team.access_token_expires_at.asc()).limit(batch_size)
+        result = await db_session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def _refresh_team(self, team_id: int) -> bool:
+        """使用独立的数据库会话刷新单个 Team 的 AT"""
+        async with AsyncSessionLocal() as db_session:
+            result = await db_session.execute(select(Team).where(Team.id == team_id))
+            team = result.scalar_one_or_none()
+            if not team:
+                return False
+            access_token = await team_service.ensure_access_token(team, db_session, force_refresh=True, proactive=True)
+            return access_token is not None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        执行一轮主动刷新
+
+        Returns:
+            结果字典,包含 success, enabled, selected, success_count, failed_count, error
+        """
+        async with AsyncSessionLocal() as db_session:
+            enabled = await settings_service.get_setting(db_session, "token_refresh_enabled", "true")
+            if str(enabled).lower() != "true":
+                return {"success": True, "enabled": False, "selected": 0, "success_count": 0, "failed_count": 0, "error": None}
+
+            margin_minutes = await settings_service.get_int_setting(
+                db_session, "token_refresh_margin_minutes", self.DEFAULT_MARGIN_MINUTES
+            )
+            batch_size = await settings_service.get_int_setting(
+                db_session, "token_refresh_batch_size", self.DEFAULT_BATCH_SIZE
+            )
+
+            await self.backfill_expires_at(db_session)
+            team_ids = await self.select_expiring_teams(db_session, margin_minutes, max(1, batch_size))
+
+        if not team_ids:
+            return {"success": True, "enabled": True, "selected": 0, "success_count": 0, "failed_count": 0, "error": None}
+
+        attempted_at = get_now()
+        for team_id in team_ids:
+            self._last_attempts[team_id] = attempted_at
+        logger.info(f"Token 主动刷新: 本轮刷新 {len(team_ids)} 个即将过期的 Team")
+
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def refresh(team_id: int) -> bool:
+            async with semaphore:
+                try:
+                    return await self._refresh_team(team_id)
+                except Exception as e:
+                    logger.error(f"主动刷新 Team {team_id} Token 失败: {e}")
+                    return False
+
+        results = await asyncio.gather(*(refresh(team_id) for team_id in team_ids))
+        success_count = sum(1 for ok in results if ok)
+
+        self.last_run = {
+            "success": True,
+            "enabled": True,
+            "selected": len(team_ids),
+            "success_count": success_count,
+            "failed_count": len(team_ids) - success_count,
+            "finished_at": get_now().isoformat(),
+            "error": None
+        }
+        return self.last_run
+
+
+# 创建全局实例
+token_refresh_scheduler = TokenRefreshScheduler()
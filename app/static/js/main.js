@@ -381,9 +381,10 @@ async function generateBatch(event) {
     const expiresDays = form.expiresDays.value;
     const hasWarranty = form.hasWarranty.checked;
     const warrantyDays = form.warrantyDays ? form.warrantyDays.value : 30;
+    const submitButton = form.querySelector('button[type="submit"]');
 
-    if (count < 1 || count > 1000) {
-        showToast('生成数量必须在1-1000之间', 'error');
+    if (count < 1 || count > 200000) {
+        showToast('生成数量必须在1-200000之间', 'error');
         return;
     }
 
@@ -395,22 +396,150 @@ async function generateBatch(event) {
     };
     if (expiresDays) data.expires_days = parseInt(expiresDays);
 
-    const result = await apiCall('/admin/codes/generate', {
-        method: 'POST',
-        body: JSON.stringify(data)
-    });
+    // UI 元素
+    const progressContainer = document.getElementById('generateProgressContainer');
+    const progressBar = document.getElementById('generateProgressBar');
+    const progressStage = document.getElementById('generateProgressStage');
+    const progressPercent = document.getElementById('generateProgressPercent');
 
-    if (result.success) {
-        document.getElementById('batchTotal').textContent = result.data.total;
-        document.getElementById('batchCodes').value = result.data.codes.join('\n');
+    progressContainer.style.display = 'block';
+    document.getElementById('batchResult').style.display = 'none';
+    progressBar.style.width = '0%';
+    progressStage.textContent = '准备生成...';
+    progressPercent.textContent = '0%';
+    submitButton.disabled = true;
+    submitButton.textContent = '生成中...';
+
+    const codes = [];
+    let finished = null;
+
+    try {
+        const response = await fetch('/admin/codes/generate', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(data)
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || errorData.detail || '请求失败');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop(); // 最后一个可能是残缺的
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                try {
+                    const item = JSON.parse(line);
+
+                    if (item.type === 'start') {
+                        progressStage.textContent = `开始生成 (共 ${item.total} 个)...`;
+                    } else if (item.type === 'progress') {
+                        codes.push(...item.codes);
+                        const percent = Math.round((item.current / item.total) * 100);
+                        progressBar.style.width = `${percent}%`;
+                        progressPercent.textContent = `${percent}%`;
+                        progressStage.textContent = `正在生成 ${item.current}/${item.total}...`;
+                    } else if (item.type === 'finish') {
+                        finished = item;
+                        progressStage.textContent = '生成完成';
+                    } else if (item.type === 'error') {
+                        showToast(item.error, 'error');
+                    }
+                } catch (e) {
+                    console.error('解析流数据失败:', e, line);
+                }
+            }
+        }
+    } catch (error) {
+        showToast(error.message || '网络错误', 'error');
+    } finally {
+        submitButton.disabled = false;
+        submitButton.textContent = '批量生成';
+    }
+
+    // 中途出错时已生成的兑换码同样有效, 一并展示
+    if (codes.length > 0) {
+        document.getElementById('batchTotal').textContent = codes.length;
+        document.getElementById('batchCodes').value = codes.join('\n');
         document.getElementById('batchResult').style.display = 'block';
         form.reset();
-        showToast(`成功生成 ${result.data.total} 个兑换码`, 'success');
+        if (finished) {
+            showToast(`成功生成 ${codes.length} 个兑换码`, finished.failed_count === 0 ? 'success' : 'warning');
+        }
         if (window.location.pathname === '/admin/codes') {
             setTimeout(() => location.reload(), 3000);
         }
-    } else {
-        showToast(result.error || '生成失败', 'error');
+    }
+}
+
+async function importCodes(event) {
+    event.preventDefault();
+    const form = event.target;
+    const file = form.file.files[0];
+    const submitButton = form.querySelector('button[type="submit"]');
+
+    if (!file) {
+        showToast('请选择要导入的文件', 'error');
+        return;
+    }
+
+    // 文件内容直接作为请求体上传, 由服务端流式解析
+    const isNdjson = /\.(ndjson|jsonl)$/i.test(file.name);
+    const params = new URLSearchParams({
+        format: isNdjson ? 'ndjson' : 'csv',
+        has_warranty: form.hasWarranty.checked,
+        warranty_days: parseInt(form.warrantyDays.value || 30)
+    });
+    if (form.expiresDays.value) params.set('expires_days', parseInt(form.expiresDays.value));
+
+    document.getElementById('importCodesResult').style.display = 'none';
+    submitButton.disabled = true;
+    submitButton.textContent = '导入中...';
+
+    try {
+        const response = await fetch(`/admin/codes/import?${params.toString()}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': isNdjson ? 'application/x-ndjson' : 'text/csv'
+            },
+            body: file
+        });
+        const data = await response.json();
+
+        if (response.ok && data.success) {
+            document.getElementById('importCodesInserted').textContent = data.inserted;
+            document.getElementById('importCodesDuplicates').textContent = data.duplicates;
+            document.getElementById('importCodesInvalid').textContent = data.invalid;
+            const errorsBox = document.getElementById('importCodesErrors');
+            errorsBox.value = (data.errors || []).join('\n');
+            errorsBox.style.display = data.errors && data.errors.length ? 'block' : 'none';
+            document.getElementById('importCodesResult').style.display = 'block';
+            form.reset();
+            showToast(`成功导入 ${data.inserted} 个兑换码`, data.invalid === 0 ? 'success' : 'warning');
+            if (data.inserted > 0 && window.location.pathname === '/admin/codes') {
+                setTimeout(() => location.reload(), 3000);
+            }
+        } else {
+            showToast(data.error || data.detail || '导入失败', 'error');
+        }
+    } catch (error) {
+        showToast('网络错误', 'error');
+    } finally {
+        submitButton.disabled = false;
+        submitButton.textContent = '开始导入';
     }
 }
 
@@ -480,6 +609,15 @@ function copyBatchCodes() {
     copyToClipboard(codes);
 }
 
+// 按当前页面的筛选条件导出列表 (浏览器直接下载服务端流式输出的文件)
+function exportList(path, format) {
+    const params = new URLSearchParams(window.location.search);
+    ['page', 'per_page', 'cursor'].forEach(key => params.delete(key));
+    params.set('format', format);
+    window.location.href = `${path}?${params.toString()}`;
+    document.querySelectorAll('.dropdown-menu').forEach(d => d.classList.remove('show'));
+}
+
 function downloadCodes() {
     const codes = document.getElementById('batchCodes').value;
     const blob = new Blob([codes], { type: 'text/plain' });
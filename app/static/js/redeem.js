@@ -180,6 +180,18 @@ async function confirmRedeem(teamId) {
             throw new Error('服务器响应格式错误');
         }
 
+        if (response.status === 202 && data.job) {
+            // 异步兑换: 等待任务结束
+            const job = await waitForRedeemJob(data.job);
+            const result = job.result || {};
+            if (result.success) {
+                showSuccessResult(result);
+            } else {
+                showErrorResult(result.error || '兑换失败');
+            }
+            return;
+        }
+
         if (response.ok && data.success) {
             // 兑换成功
             console.log('Redemption success');
@@ -212,6 +224,74 @@ async function confirmRedeem(teamId) {
     }
 }
 
+// 异步兑换任务阶段说明
+const REDEEM_JOB_STAGES = {
+    validating: '正在验证兑换码...',
+    claiming: '正在分配 Team...',
+    token: '正在准备 Team 账号...',
+    inviting: '正在发送邀请...'
+};
+
+// 显示异步兑换任务进度
+function showRedeemJobProgress(job) {
+    const verifyBtn = document.getElementById('verifyBtn');
+    if (!verifyBtn) return;
+
+    if (job.status === 'queued') {
+        verifyBtn.textContent = job.position ? `排队中 (第 ${job.position} 位)...` : '排队中...';
+    } else if (job.status === 'running') {
+        verifyBtn.textContent = REDEEM_JOB_STAGES[job.stage] || '正在兑换...';
+    }
+}
+
+// 等待异步兑换任务结束 (优先使用 SSE, 不支持或连接失败时轮询)
+function waitForRedeemJob(job) {
+    showRedeemJobProgress(job);
+
+    return new Promise((resolve) => {
+        const isDone = (item) => item.status === 'succeeded' || item.status === 'failed';
+
+        const poll = async () => {
+            try {
+                const response = await fetch(`/redeem/jobs/${job.job_id}`);
+                const data = await response.json();
+                if (!response.ok) {
+                    resolve({ status: 'failed', result: { success: false, error: data.detail || '查询兑换结果失败' } });
+                    return;
+                }
+                showRedeemJobProgress(data.job);
+                if (isDone(data.job)) {
+                    resolve(data.job);
+                    return;
+                }
+            } catch (error) {
+                console.error('Poll redeem job error:', error);
+            }
+            setTimeout(poll, 2000);
+        };
+
+        if (!window.EventSource) {
+            poll();
+            return;
+        }
+
+        const source = new EventSource(`/redeem/jobs/${job.job_id}/events`);
+        source.onmessage = (event) => {
+            const item = JSON.parse(event.data);
+            showRedeemJobProgress(item);
+            if (isDone(item)) {
+                source.close();
+                resolve(item);
+            }
+        };
+        source.onerror = () => {
+            // 连接中断 (含服务端超时关闭) 时改为轮询
+            source.close();
+            poll();
+        };
+    });
+}
+
 // 显示成功结果
 function showSuccessResult(data) {
     const resultContent = document.getElementById('resultContent');
@@ -0,0 +1,152 @@
+"""
+请求合并发送工具
+相同键在短时间窗口内提交的多个条目合并为一批, 由一次调用处理后将结果分发给各提交方
+同一键的批次串行执行, 上一批执行期间到达的条目会积累到下一批
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+BatchFn = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+class _Batch:
+    """积累中的批次"""
+
+    __slots__ = ("fn", "items", "futures", "full", "closed")
+
+    def __init__(self, fn: BatchFn):
+        self.fn = fn
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.full = asyncio.Event()
+        self.closed = False
+
+
+class KeyedBatcher:
+    """按键合并条目并批量执行"""
+
+    def __init__(self, window: float, max_size: int):
+        """
+        初始化批量合并器
+
+        Args:
+            window: 合并窗口 (秒), 批次中第一个条目到达后最多等待的时间
+            max_size: 单批最大条目数, 达到后立即执行
+        """
+        self.window = max(0.0, window)
+        self.max_size = max(1, max_size)
+        self._pending: Dict[Hashable, _Batch] = {}
+        # 每个键的执行锁, 保证同一键的批次串行执行
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._lock_users: Dict[Hashable, int] = {}
+        # 执行中的批次任务 (事件循环只弱引用任务, 需持有引用防止合并窗口内被回收)
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, key: Hashable, item: Any, fn: BatchFn) -> Any:
+        """
+        提交条目并等待所在批次的结果
+
+        Args:
+            key: 合并键
+            item: 条目
+            fn: 批量处理函数, 接收条目列表并返回等长的结果列表
+                (由创建批次的提交方提供, 会替同一批的其他提交方执行, 不应依赖该提交方的请求级资源)
+
+        Returns:
+            该条目对应的结果 (批量处理抛出的异常会传递给批次内所有提交方)
+        """
+        batch = self._pending.get(key)
+        if batch is None or batch.closed or len(batch.items) >= self.max_size:
+            batch = _Batch(fn)
+            self._pending[key] = batch
+            self._lock_users[key] = self._lock_users.get(key, 0) + 1
+            task = asyncio.ensure_future(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        self.items += 1
+        if len(batch.items) >= self.max_size:
+            batch.full.set()
+        return await future
+
+    async def _run(self, key: Hashable, batch: _Batch):
+        """等待合并窗口结束后执行批次"""
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = asyncio.Lock()
+            async with lock:
+                # 等待上一批期间仍可继续积累条目, 获得锁后才关闭批次
+                batch.closed = True
+                if self._pending.get(key) is batch:
+                    del self._pending[key]
+                await self._execute(batch)
+        except BaseException as e:
+            # 批次尚未执行就被取消 (如停机): 不再接收新条目, 并唤醒已提交的等待方
+            batch.closed = True
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+            self._fail_pending(batch, e)
+            raise
+        finally:
+            self._lock_users[key] -= 1
+            if self._lock_users[key] == 0:
+                del self._lock_users[key]
+                self._locks.pop(key, None)
+
+    @staticmethod
+    def _fail_pending(batch: _Batch, error: BaseException):
+        """将异常传递给尚未得到结果的提交方 (取消时同样取消等待方)"""
+        for future in batch.futures:
+            if future.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    async def _execute(self, batch: _Batch):
+        """执行批量处理函数并分发结果"""
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch.items))
+        results: Optional[List[Any]] = None
+        error: Optional[BaseException] = None
+        try:
+            results = await batch.fn(list(batch.items))
+            if len(results) != len(batch.items):
+                raise ValueError(f"批量处理结果数量不匹配: {len(results)} != {len(batch.items)}")
+        except Exception as e:
+            # 执行中被取消 (CancelledError) 时由 _run 唤醒等待方后继续抛出
+            error = e
+
+        for index, future in enumerate(batch.futures):
+            # 提交方已取消时跳过
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[index])
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计信息"""
+        return {
+            "window": self.window,
+            "max_size": self.max_size,
+            "pending": sum(len(batch.items) for batch in self._pending.values()),
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,146 @@
+"""
+熔断器工具
+按键 (如 Team 的 account_id) 维护 closed / open / half_open 三态熔断器,
+熔断期间直接拒绝请求, 避免对已失效账号反复发起网络请求和重试
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """单个键的熔断器"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    __slots__ = ("state", "failures", "opened_at", "open_seconds", "probe_in_flight", "last_error")
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_seconds = 0.0
+        self.probe_in_flight = False
+        self.last_error: Optional[str] = None
+
+
+class CircuitBreakerRegistry:
+    """熔断器集合"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        open_seconds: float = 60,
+        fatal_open_seconds: float = 600,
+        fatal_error_codes: Optional[set] = None
+    ):
+        """
+        初始化熔断器集合
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            open_seconds: 普通失败熔断时长 (秒), 之后进入半开状态放行一个探测请求
+            fatal_error_codes: 命中后立即熔断的错误码 (如账号封禁)
+            fatal_open_seconds: 命中致命错误码时的熔断时长 (秒)
+        """
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.fatal_open_seconds = fatal_open_seconds
+        self.fatal_error_codes = fatal_error_codes or set()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.rejected = 0
+
+    def allow(self, key: str) -> bool:
+        """
+        判断是否允许对该键发起请求
+        半开状态下只放行一个探测请求, 其余请求直接拒绝
+        """
+        breaker = self._breakers.get(key)
+        if breaker is None or breaker.state == CircuitBreaker.CLOSED:
+            return True
+
+        if breaker.state == CircuitBreaker.OPEN:
+            if time.monotonic() - breaker.opened_at < breaker.open_seconds:
+                self.rejected += 1
+                return False
+            breaker.state = CircuitBreaker.HALF_OPEN
+            breaker.probe_in_flight = False
+
+        if breaker.probe_in_flight:
+            self.rejected += 1
+            return False
+        breaker.probe_in_flight = True
+        return True
+
+    def record_success(self, key: str):
+        """记录成功, 熔断器恢复为 closed"""
+        breaker = self._breakers.pop(key, None)
+        if breaker and breaker.state != CircuitBreaker.CLOSED:
+            logger.info(f"熔断器恢复: {key}")
+
+    def record_failure(self, key: str, error_code: Optional[str] = None, error: Optional[str] = None):
+        """
+        记录失败, 连续失败达到阈值或命中致命错误码时熔断
+        """
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker()
+
+        breaker.failures += 1
+        breaker.last_error = error_code or (error[:200] if error else None)
+        breaker.probe_in_flight = False
+
+        is_fatal = error_code in self.fatal_error_codes
+        if is_fatal or breaker.state == CircuitBreaker.HALF_OPEN or breaker.failures >= self.failure_threshold:
+            if breaker.state != CircuitBreaker.OPEN:
+                logger.warning(f"熔断器打开: {key} (连续失败 {breaker.failures} 次, 错误: {breaker.last_error})")
+            breaker.state = CircuitBreaker.OPEN
+            breaker.opened_at = time.monotonic()
+            breaker.open_seconds = self.fatal_open_seconds if is_fatal else self.open_seconds
+
+    def record_ignored(self, key: str):
+        """请求结果与账号健康无关 (如参数错误), 仅释放半开状态的探测名额"""
+        breaker = self._breakers.get(key)
+        if breaker:
+            breaker.probe_in_flight = False
+
+    def reset(self, key: str):
+        """手动重置熔断器 (如更新了 Token)"""
+        self._breakers.pop(key, None)
+
+    def is_open(self, key: str) -> bool:
+        """判断该键当前是否处于熔断期 (不改变状态)"""
+        breaker = self._breakers.get(key)
+        if breaker is None or breaker.state == CircuitBreaker.CLOSED:
+            return False
+        if breaker.state == CircuitBreaker.OPEN:
+            return time.monotonic() - breaker.opened_at < breaker.open_seconds
+        return breaker.probe_in_flight
+
+    def open_keys(self) -> List[str]:
+        """获取当前处于熔断期的所有键"""
+        return [key for key in self._breakers if self.is_open(key)]
+
+    def stats(self) -> Dict[str, Any]:
+        """获取熔断器统计信息"""
+        now = time.monotonic()
+        breakers = []
+        for key, breaker in self._breakers.items():
+            breakers.append({
+                "key": key,
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "last_error": breaker.last_error,
+                "retry_in": round(max(0.0, breaker.open_seconds - (now - breaker.opened_at)), 1)
+                if breaker.state == CircuitBreaker.OPEN else 0.0
+            })
+        return {
+            "tracked": len(self._breakers),
+            "open": len(self.open_keys()),
+            "rejected": self.rejected,
+            "breakers": breakers
+        }
@@ -6,7 +6,7 @@ import jwt
 from typing import Optional, Dict, Any
 from datetime import datetime
 import logging
-from app.utils.time_utils import get_now
+from app.utils.time_utils import get_now, from_timestamp
 
 logger = logging.getLogger(__name__)
 
@@ -114,7 +114,7 @@ class JWTParser:
         try:
             exp_timestamp = payload.get("exp")
             if exp_timestamp:
-                return datetime.fromtimestamp(exp_timestamp)
+                return from_timestamp(exp_timestamp)
             return None
         except Exception as e:
             logger.error(f"获取过期时间失败: {e}")
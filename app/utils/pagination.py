@@ -0,0 +1,106 @@
+"""
+游标分页工具
+按 (排序时间, id) 倒序分页: 下一页从上一页最后一行之后继续, 与 OFFSET 不同, 翻页耗时不随页数增加
+"""
+import base64
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Awaitable, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    """
+    生成游标
+
+    Args:
+        sort_value: 当前页最后一行的排序时间
+        row_id: 当前页最后一行的 ID
+
+    Returns:
+        URL 安全的游标字符串
+    """
+    raw = f"{sort_value.isoformat() if sort_value else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    """
+    解析游标
+
+    Returns:
+        (排序时间, ID), 游标为空或格式无效时返回 None
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_text, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit("|", 1)
+        return (datetime.fromisoformat(sort_text) if sort_text else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_condition(sort_column, id_column, position: Tuple[Optional[datetime], int]):
+    """
+    生成 "位于游标之后" 的筛选条件 (对应 ORDER BY sort_column DESC, id_column DESC, 空值排在最后)
+
+    Args:
+        sort_column: 排序时间列
+        id_column: ID 列
+        position: 解析后的游标
+
+    Returns:
+        SQLAlchemy 条件表达式
+    """
+    sort_value, row_id = position
+    if sort_value is None:
+        return and_(sort_column.is_(None), id_column < row_id)
+    return or_(
+        sort_column < sort_value,
+        and_(sort_column == sort_value, id_column < row_id),
+        sort_column.is_(None)
+    )
+
+
+class CountCache:
+    """缓存列表总数, 游标翻页时不必每页重新执行 count(*)"""
+
+    def __init__(self, max_size: int = 256, ttl: float = 30):
+        """
+        初始化总数缓存
+
+        Args:
+            max_size: 最大缓存条目数 (不同筛选条件分别缓存)
+            ttl: 缓存有效期 (秒)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        # 缓存键 -> (总数, 缓存时间)
+        self._entries: "OrderedDict[Any, Tuple[int, float]]" = OrderedDict()
+
+    async def get_or_count(self, key: Any, count: Callable[[], Awaitable[int]]) -> int:
+        """
+        获取缓存的总数, 未命中或已过期时执行 count 并缓存
+
+        Args:
+            key: 缓存键 (通常为筛选条件)
+            count: 执行计数查询的函数
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        total = await count()
+        self._entries[key] = (total, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return total
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
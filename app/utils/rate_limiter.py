@@ -0,0 +1,167 @@
+"""
+限流工具
+基于令牌桶的分层限流器 (全局 / 代理 / 账号), 等待中的请求按先来后到排队
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶 (按 FIFO 顺序发放令牌)"""
+
+    def __init__(self, rate_per_minute: int, capacity: Optional[int] = None):
+        """
+        初始化令牌桶
+
+        Args:
+            rate_per_minute: 每分钟发放的令牌数, <= 0 表示不限流
+            capacity: 桶容量 (允许的突发请求数), 默认为 10 秒的发放量
+        """
+        # asyncio.Lock 按等待顺序唤醒, 保证排队公平
+        self._lock = asyncio.Lock()
+        self.configure(rate_per_minute, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self.last_used = self._updated_at
+
+    def configure(self, rate_per_minute: int, capacity: Optional[int] = None):
+        """更新令牌桶速率和容量"""
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity else max(1, rate_per_minute // 6)
+        if hasattr(self, "_tokens"):
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate_per_minute <= 0
+
+    def _refill(self, now: float):
+        rate_per_second = self.rate_per_minute / 60
+        self._tokens = min(float(self.capacity), self._tokens + (now - self._updated_at) * rate_per_second)
+        self._updated_at = now
+
+    async def acquire(self) -> float:
+        """
+        获取一个令牌, 令牌不足时排队等待
+
+        Returns:
+            本次等待的秒数
+        """
+        if self.unlimited:
+            return 0.0
+
+        started_at = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.last_used = now
+                    return now - started_at
+                if self.unlimited:
+                    return now - started_at
+                await asyncio.sleep((1 - self._tokens) * 60 / self.rate_per_minute)
+
+
+class HierarchicalRateLimiter:
+    """分层限流器: 请求需依次通过账号级、代理级和全局令牌桶"""
+
+    # 账号级令牌桶数量上限, 超出后淘汰最久未使用的
+    MAX_ACCOUNT_BUCKETS = 5000
+
+    def __init__(
+        self,
+        global_per_minute: int = 0,
+        proxy_per_minute: int = 0,
+        account_per_minute: int = 0
+    ):
+        self.global_per_minute = global_per_minute
+        self.proxy_per_minute = proxy_per_minute
+        self.account_per_minute = account_per_minute
+        self._global = TokenBucket(global_per_minute)
+        self._proxies: Dict[str, TokenBucket] = {}
+        self._accounts: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+        # 统计信息
+        self.waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def configure(self, global_per_minute: int, proxy_per_minute: int, account_per_minute: int):
+        """更新各层级的速率 (已有令牌桶同步更新)"""
+        self.global_per_minute = global_per_minute
+        self.proxy_per_minute = proxy_per_minute
+        self.account_per_minute = account_per_minute
+        self._global.configure(global_per_minute)
+        for bucket in self._proxies.values():
+            bucket.configure(proxy_per_minute)
+        for bucket in self._accounts.values():
+            bucket.configure(account_per_minute)
+
+    def _proxy_bucket(self, proxy: str) -> TokenBucket:
+        bucket = self._proxies.get(proxy)
+        if bucket is None:
+            bucket = self._proxies[proxy] = TokenBucket(self.proxy_per_minute)
+        return bucket
+
+    def _account_bucket(self, identifier: str) -> TokenBucket:
+        bucket = self._accounts.get(identifier)
+        if bucket is None:
+            bucket = self._accounts[identifier] = TokenBucket(self.account_per_minute)
+            # 淘汰最久未使用且空闲的令牌桶, 防止标识符无限增长
+            while len(self._accounts) > self.MAX_ACCOUNT_BUCKETS:
+                oldest_key, oldest = next(iter(self._accounts.items()))
+                if oldest._lock.locked():
+                    break
+                del self._accounts[oldest_key]
+        else:
+            self._accounts.move_to_end(identifier)
+        return bucket
+
+    async def acquire(self, identifier: str, proxy: Optional[str] = None) -> float:
+        """
+        依次获取账号级、代理级和全局令牌
+
+        Args:
+            identifier: 账号/会话标识符
+            proxy: 出口代理地址 (未使用代理时为 None, 视为直连出口)
+
+        Returns:
+            总等待秒数
+        """
+        self.waiting += 1
+        try:
+            waited = await self._account_bucket(identifier).acquire()
+            waited += await self._proxy_bucket(proxy or "direct").acquire()
+            waited += await self._global.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.acquired += 1
+        self.total_wait += waited
+        if waited > 0.001:
+            self.delayed += 1
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计信息"""
+        return {
+            "global_per_minute": self.global_per_minute,
+            "proxy_per_minute": self.proxy_per_minute,
+            "account_per_minute": self.account_per_minute,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "total_wait": round(self.total_wait, 3),
+            "avg_wait": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait": round(self.max_wait, 3)
+        }
@@ -0,0 +1,180 @@
+"""
+会话池工具
+按标识符缓存 HTTP 会话, 支持最大容量 (LRU 淘汰) 和空闲超时淘汰, 淘汰时关闭会话
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolEntry:
+    """会话池条目"""
+
+    __slots__ = ("session", "last_used", "leases")
+
+    def __init__(self, session: Any):
+        self.session = session
+        self.last_used = time.monotonic()
+        self.leases = 0
+
+
+class SessionPool:
+    """LRU + 空闲超时的会话池"""
+
+    def __init__(self, max_size: int = 500, idle_ttl: float = 900):
+        """
+        初始化会话池
+
+        Args:
+            max_size: 最大会话数, 超出时淘汰最久未使用的会话
+            idle_ttl: 空闲超时 (秒), 超时未使用的会话会被关闭
+        """
+        self.max_size = max(1, max_size)
+        self.idle_ttl = idle_ttl
+        # 按最近使用时间排序, 最久未使用的在最前面
+        self._entries: "OrderedDict[str, _PoolEntry]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        # 同一标识符的并发创建合并为一次; 创建在池锁之外进行, 不阻塞其他标识符的租用
+        self._create_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _close(self, key: str, session: Any):
+        """关闭会话 (忽略关闭异常)"""
+        try:
+            await session.close()
+        except Exception as e:
+            logger.debug(f"关闭会话 {key} 失败: {e}")
+
+    def _collect_evictions(self) -> list:
+        """
+        挑出需要淘汰的会话 (调用方需持有锁)
+        正在使用中的会话不会被淘汰, 必要时允许暂时超出容量
+        """
+        now = time.monotonic()
+        evicted = []
+
+        # 1. 空闲超时淘汰 (从最久未使用的开始检查)
+        for key in list(self._entries.keys()):
+            entry = self._entries[key]
+            if now - entry.last_used < self.idle_ttl:
+                break
+            if entry.leases == 0:
+                evicted.append((key, self._entries.pop(key).session))
+                self.idle_evictions += 1
+
+        # 2. 容量淘汰 (LRU)
+        if len(self._entries) > self.max_size:
+            for key in list(self._entries.keys()):
+                if len(self._entries) <= self.max_size:
+                    break
+                if self._entries[key].leases == 0:
+                    evicted.append((key, self._entries.pop(key).session))
+                    self.evictions += 1
+
+        return evicted
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[Any]]):
+        """创建会话并放入池中 (不持有池锁执行 factory)"""
+        self.misses += 1
+        logger.info(f"为标识符 {key} 创建新会话")
+        session = await factory()
+        async with self._lock:
+            if key not in self._entries:
+                self._entries[key] = _PoolEntry(session)
+                return
+        # 创建期间已有其他会话放入池中 (如 remove 后重新创建), 使用已有会话
+        await self._close(key, session)
+
+    @asynccontextmanager
+    async def lease(self, key: str, factory: Callable[[], Awaitable[Any]]):
+        """
+        租用指定标识符的会话, 不存在时通过 factory 创建
+        租用期间会话不会被淘汰
+
+        Args:
+            key: 会话标识符
+            factory: 创建会话的异步函数
+        """
+        created = False
+        while True:
+            async with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if not created:
+                        self.hits += 1
+                    self._entries.move_to_end(key)
+                    entry.leases += 1
+                    entry.last_used = time.monotonic()
+                    evicted = self._collect_evictions()
+                    break
+            await self._create_flight.do(key, lambda: self._create(key, factory))
+            created = True
+
+        for evicted_key, session in evicted:
+            logger.info(f"会话池淘汰会话: {evicted_key}")
+            await self._close(evicted_key, session)
+
+        try:
+            yield entry.session
+        finally:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+
+    async def remove(self, key: str):
+        """移除并关闭指定标识符的会话"""
+        async with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            await self._close(key, entry.session)
+
+    async def clear(self):
+        """关闭并清空所有会话"""
+        async with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+        for key, entry in entries:
+            await self._close(key, entry.session)
+
+    async def evict_idle(self) -> int:
+        """
+        主动淘汰空闲超时的会话
+
+        Returns:
+            本次淘汰的会话数
+        """
+        async with self._lock:
+            evicted = self._collect_evictions()
+        for key, session in evicted:
+            await self._close(key, session)
+        return len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取会话池统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "in_use": sum(1 for e in self._entries.values() if e.leases > 0),
+            "max_size": self.max_size,
+            "idle_ttl": self.idle_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions
+        }
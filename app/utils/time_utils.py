@@ -6,3 +6,8 @@ def get_now() -> datetime:
     """获取当前时区的当前时间 (返回 naive datetime 以保持数据库兼容性)"""
     tz = pytz.timezone(settings.timezone)
     return datetime.now(tz).replace(tzinfo=None)
+
+def from_timestamp(timestamp: float) -> datetime:
+    """将 Unix 时间戳转换为当前时区的时间 (naive datetime, 与 get_now 可直接比较)"""
+    tz = pytz.timezone(settings.timezone)
+    return datetime.fromtimestamp(timestamp, tz).replace(tzinfo=None)
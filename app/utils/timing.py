@@ -0,0 +1,151 @@
+"""
+耗时统计工具
+按阶段记录耗时样本并计算分位数, 单次请求的各阶段耗时可通过请求 ID 关联并写入追踪文件
+"""
+import json
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+from app.utils.time_utils import get_now
+
+logger = logging.getLogger(__name__)
+
+# 追踪文件写入线程 (单线程按提交顺序追加, 文件 IO 不阻塞事件循环)
+_trace_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+
+
+def _append_line(path: str, text: str):
+    """追加一行到追踪文件"""
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+    except Exception as e:
+        logger.warning(f"写入追踪文件失败: {e}")
+
+
+class _PhaseStats:
+    """单个阶段的耗时统计 (保留最近的样本用于计算分位数)"""
+
+    __slots__ = ("samples", "count", "total", "max")
+
+    def __init__(self, max_samples: int):
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @staticmethod
+    def _percentile(ordered: List[float], percent: float) -> float:
+        if not ordered:
+            return 0.0
+        # 最近秩法
+        index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self._percentile(ordered, 50) * 1000, 1),
+            "p95_ms": round(self._percentile(ordered, 95) * 1000, 1),
+            "p99_ms": round(self._percentile(ordered, 99) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1)
+        }
+
+
+class TimingRegistry:
+    """按阶段名称汇总耗时"""
+
+    def __init__(self, max_samples: int = 2048):
+        """
+        初始化耗时统计
+
+        Args:
+            max_samples: 每个阶段保留的最近样本数 (分位数基于这些样本计算)
+        """
+        self.max_samples = max(1, max_samples)
+        self._phases: Dict[str, _PhaseStats] = {}
+
+    def record(self, name: str, seconds: float):
+        """记录一次耗时"""
+        stats = self._phases.get(name)
+        if stats is None:
+            stats = self._phases[name] = _PhaseStats(self.max_samples)
+        stats.add(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """获取各阶段的次数、平均值和 p50/p95/p99 (毫秒)"""
+        return {name: stats.summary() for name, stats in sorted(self._phases.items())}
+
+    def reset(self):
+        """清空统计"""
+        self._phases.clear()
+
+
+class RequestTrace:
+    """单次请求的阶段耗时追踪"""
+
+    def __init__(self, registry: TimingRegistry, request_id: str, trace_file: Optional[str] = None):
+        """
+        初始化请求追踪
+
+        Args:
+            registry: 汇总耗时的统计对象
+            request_id: 请求 ID (写入追踪文件, 用于关联同一请求的各阶段)
+            trace_file: 追踪文件路径 (为空时不写入)
+        """
+        self.registry = registry
+        self.request_id = request_id
+        self.trace_file = trace_file
+        self.started_at = get_now()
+        self._start = time.perf_counter()
+        self._mark = self._start
+        self.spans: List[Dict[str, Any]] = []
+        # 尝试次数 (由调用方更新)
+        self.attempts = 0
+
+    def lap(self, name: str):
+        """记录上一个标记点到现在的耗时, 归入指定阶段"""
+        now = time.perf_counter()
+        seconds = now - self._mark
+        self._mark = now
+        self.registry.record(name, seconds)
+        self.spans.append({
+            "name": name,
+            "start_ms": round((now - seconds - self._start) * 1000, 1),
+            "duration_ms": round(seconds * 1000, 1)
+        })
+
+    def finish(self, outcome: str, **fields):
+        """
+        结束追踪: 记录总耗时并写入追踪文件 (在后台线程中写入)
+
+        Args:
+            outcome: 请求结果 (如 success/failed/error)
+            fields: 追踪文件中额外记录的字段
+        """
+        total = time.perf_counter() - self._start
+        self.registry.record("total", total)
+        self.registry.record(f"total.{outcome}", total)
+        if not self.trace_file:
+            return
+        line = {
+            "request_id": self.request_id,
+            "started_at": self.started_at.isoformat(),
+            "outcome": outcome,
+            "total_ms": round(total * 1000, 1),
+            "spans": self.spans,
+            **fields
+        }
+        _trace_writer.submit(_append_line, self.trace_file, json.dumps(line, ensure_ascii=False, default=str) + "\n")
@@ -0,0 +1,82 @@
+"""
+Token 缓存工具
+缓存已解密的 AT 及其过期时间, 避免每次操作都执行解密和 JWT 解析
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+class TokenCache:
+    """按 (team_id, 密文哈希) 缓存明文 Token 的 LRU + TTL 缓存"""
+
+    def __init__(self, max_size: int = 2000, ttl: float = 300):
+        """
+        初始化 Token 缓存
+
+        Args:
+            max_size: 最大缓存条目数, 超出时淘汰最久未使用的
+            ttl: 缓存有效期 (秒)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        # team_id -> (密文哈希, 明文 Token, 过期时间, 缓存时间)
+        self._entries: "OrderedDict[int, Tuple[str, str, Optional[datetime], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _fingerprint(ciphertext: str) -> str:
+        return hashlib.sha256(ciphertext.encode("utf-8")).hexdigest()
+
+    def get(self, team_id: int, ciphertext: str) -> Optional[Tuple[str, Optional[datetime]]]:
+        """
+        获取缓存的明文 Token
+
+        Args:
+            team_id: Team ID
+            ciphertext: 当前存储的 Token 密文 (与缓存时不一致则视为失效)
+
+        Returns:
+            (明文 Token, 过期时间), 未命中返回 None
+        """
+        entry = self._entries.get(team_id)
+        if entry is not None:
+            fingerprint, token, expires_at, cached_at = entry
+            if fingerprint == self._fingerprint(ciphertext) and time.monotonic() - cached_at < self.ttl:
+                self._entries.move_to_end(team_id)
+                self.hits += 1
+                return token, expires_at
+            # 密文已变更或缓存过期
+            del self._entries[team_id]
+        self.misses += 1
+        return None
+
+    def put(self, team_id: int, ciphertext: str, token: str, expires_at: Optional[datetime]):
+        """缓存明文 Token 及其过期时间"""
+        self._entries[team_id] = (self._fingerprint(ciphertext), token, expires_at, time.monotonic())
+        self._entries.move_to_end(team_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, team_id: int):
+        """移除指定 Team 的缓存"""
+        self._entries.pop(team_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }